@@ -1,9 +1,62 @@
 # ReFrame Configuration for NCAR's Casper, Derecho, and Gust
 
+import os
+
+# Registers the 'openmetrics' performance log handler
+import reframe_ncar.openmetrics
+
+# Registers the 'pbs-adaptive' and 'pbs-bundle' schedulers
+import reframe_ncar.bundle
+import reframe_ncar.pbs
+
+# Ties the age of the exported series to that of the cached results
+import reframe_ncar.resultcache
+
+# Stamps the start of the job scripts for the startup timings
+import reframe_ncar.timing
+
 # Modify these to quickly change required submission parameters like project code and queue
 access_project_casper = ['-A SCSG0001', '-q casper']
 access_project_derecho = ['-A SCSG0001', '-q main']
 
+# Performance variables are exported to this OpenMetrics textfile, shared by
+# all sessions whatever their working directory. Set RFM_NCAR_TEXTFILE_DIR to
+# the node_exporter textfile collector directory to have them scraped
+openmetrics_textfile = os.path.join(
+    os.environ.get('RFM_NCAR_TEXTFILE_DIR', '${HOME}/.reframe_ncar'),
+    'reframe.prom'
+)
+
+# PBS jobs are polled at intervals growing with their age (see
+# reframe_ncar/pbs.py). Set RFM_NCAR_BUNDLE=1 to also pack the small jobs of
+# the CPU partitions into shared PBS jobs (see reframe_ncar/bundle.py);
+# larger jobs are submitted as usual
+casper_cpu_scheduler = 'pbs-bundle' if os.environ.get('RFM_NCAR_BUNDLE') == '1' else 'pbs-adaptive'
+pbs_sched_options = {
+    'poll_min_interval': 1,
+    'poll_max_interval': 60,
+    'poll_backoff': 0.1,
+    'bundle_max_cpus': 36,
+    'bundle_max_jobs': 16,
+    'bundle_max_time_limit': 1800,
+    'bundle_gather_time': 10,
+    'bundle_mode': 'concurrent'
+}
+
+# PBS chunk resources added to the select statement of the job scripts; tests
+# request them through extra_resources (see reframe_ncar/nodetype.py).
+# '_rfm_gpu' is filled by ReFrame from num_gpus_per_node
+pbs_node_resources = [
+    {'name': '_rfm_gpu', 'options': ['ngpus={num_gpus_per_node}']},
+    {'name': 'gpu_type', 'options': ['gpu_type={gpu_type}']},
+    {'name': 'cpu_type', 'options': ['cpu_type={cpu_type}']},
+    {'name': 'mem', 'options': ['mem={mem}']}
+]
+
+# Run first by every job script, before the modules are loaded, so that the
+# time the module stacks take to load is reported (see reframe_ncar/timing.py)
+job_prepare_cmds = [reframe_ncar.timing.JOB_START_CMD]
+
 # A collection of module stacks for easy updating of future stacks
 # Format: <system>_<modules_type>_<compiler>_<mpi_version>
 #
@@ -18,74 +71,209 @@ casper_devmodules_default = ['ncarenv/25.10', 'intel/2025.2.1', 'openmpi/5.0.8',
 casper_currentmodules_intel = ['ncarenv/24.12', 'intel/2024.2.1', 'openmpi/5.0.6', 'ncarcompilers/1.0.0', 'cuda/12.3.2', 'netcdf/4.9.2', 'hdf5/1.12.3', 'ucx/1.17.0']
 casper_currentmodules_gnu = ['ncarenv/24.12', 'gcc/12.4.0', 'openmpi/5.0.6', 'ncarcompilers/1.0.0', 'cuda/12.3.2', 'netcdf/4.9.2', 'hdf5/1.12.3', 'ucx/1.17.0']
 
+derecho_currentmodules_gnu = ['ncarenv/24.12', 'craype/2.7.31', 'gcc/12.4.0', 'cray-mpich/8.1.29', 'ncarcompilers/1.0.0', 'netcdf/4.9.2', 'hdf5/1.12.3']
+derecho_currentmodules_intel = ['ncarenv/24.12', 'craype/2.7.31', 'intel/2024.2.1', 'cray-mpich/8.1.29', 'ncarcompilers/1.0.0', 'netcdf/4.9.2', 'hdf5/1.12.3']
+derecho_currentmodules_cuda = ['ncarenv/24.12', 'craype/2.7.31', 'nvhpc/24.11', 'cuda/12.3.2', 'cray-mpich/8.1.29', 'ncarcompilers/1.0.0', 'netcdf/4.9.2', 'hdf5/1.12.3']
+
 # Archived stacks
 #casper_2310_stack = []
 
+# The module system can be overridden to generate job scripts off the
+# systems, e.g. RFM_NCAR_MODULES_SYSTEM=nomod with --system derecho --dry-run
+modules_system = os.environ.get('RFM_NCAR_MODULES_SYSTEM', 'lmod')
+
 site_configuration = {
     'systems': [
         {
             'name': 'casper',
             'descr': 'HPC Cluster',
             'hostnames': ['casper-login*'],
-            'modules_system': 'lmod',
+            'modules_system': modules_system,
             'partitions': [
                 {
                     'name': 'compute',
                     'descr': 'Compute nodes',
-                    'scheduler': 'pbs',
+                    'scheduler': casper_cpu_scheduler,
+                    'sched_options': pbs_sched_options,
                     'launcher': 'mpirun',
                     'access': access_project_casper,
+                    'prepare_cmds': job_prepare_cmds,
                     'environs': ['gnu', 'intel'],
-                    'max_jobs': 100
+                    'max_jobs': 100,
+                    'processor': {
+                        'arch': 'skylake_avx512',
+                        'num_cpus': 36,
+                        'num_cpus_per_core': 1,
+                        'num_sockets': 2,
+                        'num_cpus_per_socket': 18
+                    },
+                    'resources': pbs_node_resources,
+                    # Largest multi-node jobs of the scaling tests and the
+                    # node type benchmarks run on unless they declare one
+                    'extras': {
+                        'max_nodes': 4,
+                        'node_type': {'cpu_type': 'skylake'}
+                    }
                 },
                                 {
                     'name': 'compute-serial',
                     'descr': 'Compute nodes',
-                    'scheduler': 'pbs',
+                    'scheduler': casper_cpu_scheduler,
+                    'sched_options': pbs_sched_options,
                     'launcher': 'local',
                     'access': ['-A SCSG0001', '-q casper'],
+                    'prepare_cmds': job_prepare_cmds,
                     'environs': ['gnu-serial'],
-                    'max_jobs': 100
+                    'max_jobs': 100,
+                    'resources': pbs_node_resources
                 },
 
                 {
                     'name': 'gpu',
                     'descr': 'Single GPU, Single Node',
-                    'scheduler': 'pbs',
+                    'scheduler': 'pbs-adaptive',
+                    'sched_options': pbs_sched_options,
                     'launcher': 'local',
                     'access': access_project_casper,
+                    'prepare_cmds': job_prepare_cmds,
                     'environs': ['cuda', 'cuda-last', 'cuda-dev'],
                     'max_jobs': 10,
-                    'resources': [
-                        {
-                            'name': 'gpu',
-                            'options': [':ngpus={num_gpus}'],
-                            'name': 'gpu_type',
-                            'options': [':gpu_type={gpu_type}']
-                        }
-                    ]
+                    'resources': pbs_node_resources
                 },
                 {
                     'name': 'gpu-mpi',
                     'descr': 'Multi-GPU',
-                    'scheduler': 'pbs',
+                    'scheduler': 'pbs-adaptive',
+                    'sched_options': pbs_sched_options,
                     'launcher': 'mpirun',
                     'access': access_project_casper,
+                    'prepare_cmds': job_prepare_cmds,
                     'environs': ['cuda', 'cuda-last', 'cuda-dev'],
                     'max_jobs': 10,
-                    'resources': [
-                        {
-                            'name': 'gpu',
-                            'options': [':ngpus={num_gpus}'],
-                            'name': 'gputype',
-                            'options': [':gpu_type={gpu_type}']
-                        }
-                    ]
+                    'resources': pbs_node_resources
+                }
+            ]
+        },
+        {
+            'name': 'derecho',
+            'descr': 'HPE Cray EX cluster',
+            'hostnames': ['derecho*', 'dec[0-9]+'],
+            'modules_system': modules_system,
+            'partitions': [
+                {
+                    'name': 'compute',
+                    'descr': 'CPU nodes',
+                    'scheduler': 'pbs-adaptive',
+                    'sched_options': pbs_sched_options,
+                    'launcher': 'mpiexec',
+                    'access': access_project_derecho,
+                    'prepare_cmds': job_prepare_cmds,
+                    'environs': ['gnu', 'gnu-serial', 'intel'],
+                    'max_jobs': 100,
+                    'time_limit': '12h',
+                    'processor': {
+                        'arch': 'zen3',
+                        'num_cpus': 128,
+                        'num_cpus_per_core': 1,
+                        'num_sockets': 2,
+                        'num_cpus_per_socket': 64
+                    },
+                    'resources': pbs_node_resources,
+                    'extras': {'max_nodes': 64}
+                },
+                {
+                    'name': 'gpu',
+                    'descr': 'GPU nodes, 4 A100 each',
+                    'scheduler': 'pbs-adaptive',
+                    'sched_options': pbs_sched_options,
+                    'launcher': 'mpiexec',
+                    'access': access_project_derecho,
+                    'prepare_cmds': job_prepare_cmds,
+                    'environs': ['cuda'],
+                    'max_jobs': 10,
+                    'time_limit': '12h',
+                    'processor': {
+                        'arch': 'zen3',
+                        'num_cpus': 64,
+                        'num_cpus_per_core': 1,
+                        'num_sockets': 1,
+                        'num_cpus_per_socket': 64
+                    },
+                    'devices': [
+                        {'type': 'gpu', 'arch': 'sm_80', 'num_devices': 4}
+                    ],
+                    'resources': pbs_node_resources,
+                    'extras': {'max_nodes': 16}
+                }
+            ]
+        },
+        {
+            # Local stand-in for PBS to try out scheduler features; select it
+            # with --system mockpbs and put launchers/mockpbs first in PATH
+            'name': 'mockpbs',
+            'descr': 'Mock PBS on the local host',
+            'hostnames': ['^$'],
+            'modules_system': 'nomod',
+            'partitions': [
+                {
+                    'name': 'compute',
+                    'descr': 'Jobs submitted one by one',
+                    'scheduler': 'pbs-adaptive',
+                    'sched_options': pbs_sched_options,
+                    'launcher': 'local',
+                    'access': ['-A TEST0001', '-q casper'],
+                    'prepare_cmds': job_prepare_cmds,
+                    'environs': ['builtin'],
+                    'max_jobs': 100
+                },
+                {
+                    'name': 'bundle',
+                    'descr': 'Small jobs bundled',
+                    'scheduler': 'pbs-bundle',
+                    'sched_options': pbs_sched_options,
+                    'launcher': 'local',
+                    'access': ['-A TEST0001', '-q casper'],
+                    'prepare_cmds': job_prepare_cmds,
+                    'environs': ['builtin'],
+                    'max_jobs': 100
                 }
             ]
         }
     ],
     'environments': [
+        # Derecho: the Cray compiler wrappers on top of the same named stacks
+        {
+            'name': 'gnu',
+            'target_systems': ['derecho'],
+            'cc': 'cc',
+            'cxx': 'CC',
+            'ftn': 'ftn',
+            'modules': derecho_currentmodules_gnu
+        },
+        {
+            'name': 'gnu-serial',
+            'target_systems': ['derecho'],
+            'cc': 'gcc',
+            'cxx': 'g++',
+            'ftn': 'gfortran',
+            'modules': ['ncarenv/24.12', 'gcc/12.4.0']
+        },
+        {
+            'name': 'intel',
+            'target_systems': ['derecho'],
+            'cc': 'cc',
+            'cxx': 'CC',
+            'ftn': 'ftn',
+            'modules': derecho_currentmodules_intel
+        },
+        {
+            'name': 'cuda',
+            'target_systems': ['derecho'],
+            'cc': 'cc',
+            'cxx': 'CC',
+            'ftn': 'ftn',
+            'modules': derecho_currentmodules_cuda
+        },
         {
             'name': 'gnu',
             'cc': 'mpicc',
@@ -172,6 +360,15 @@ site_configuration = {
                     'level': 'info',
                     'format': '%(message)s'
                 }
+            ],
+            'handlers_perflog': [
+                {
+                    'type': 'openmetrics',
+                    'name': openmetrics_textfile,
+                    'level': 'info',
+                    'flush_interval': 10,
+                    'max_age': reframe_ncar.resultcache.MAX_AGE
+                }
             ]
         }
     ],
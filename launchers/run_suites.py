@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Run several ReFrame suites concurrently
+
+Each suite of the manifest runs as its own reframe session with its own
+stage, output and perflog directories, log file and run report under
+<prefix>/<timestamp>/<suite>. When all sessions have finished, their
+reports are aggregated into a summary.
+
+Usage:
+    python launchers/run_suites.py [-m launchers/suites.yaml] [-s SUITE ...]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+import yaml
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(basedir)
+from reframe_ncar.reports import Report
+
+
+def load_manifest(filename):
+    """Load a YAML (or JSON) suite manifest"""
+    with open(filename) as fp:
+        manifest = yaml.safe_load(fp)
+
+    manifest.setdefault('reframe', 'reframe')
+    manifest.setdefault('config', 'config.py')
+    manifest.setdefault('prefix', 'sessions')
+    manifest.setdefault('basedir', basedir)
+    manifest.setdefault('ordering', 'runtime')
+    for suite in manifest['suites']:
+        for key in ('checks', 'names', 'tags', 'environs', 'options'):
+            value = suite.get(key, [])
+            suite[key] = [value] if isinstance(value, str) else value
+
+    return manifest
+
+
+def _path(manifest, path):
+    path = os.path.expandvars(os.path.expanduser(path))
+    return os.path.join(manifest['basedir'], path)
+
+
+def reframe_cmd(manifest, suite, sessiondir):
+    """Build the reframe command line of a suite"""
+    reframe = os.path.expandvars(manifest['reframe'])
+    if manifest['ordering'] == 'runtime':
+        # Order the tests by their runtimes in all previous sessions
+        cmd = [sys.executable, '-m', 'reframe_ncar.runner',
+               '--reframe', reframe,
+               '--history', _path(manifest, manifest['prefix']), '--']
+    else:
+        cmd = [reframe]
+
+    cmd += ['-C', _path(manifest, manifest['config'])]
+    for check in suite['checks']:
+        cmd += ['-c', _path(manifest, check)]
+
+    for name in suite['names']:
+        cmd += ['-n', name]
+
+    for tag in suite['tags']:
+        cmd += ['-t', tag]
+
+    for environ in suite['environs']:
+        cmd += ['-p', environ]
+
+    if 'system' in suite:
+        cmd += ['--system', suite['system']]
+
+    cmd += ['--prefix', sessiondir,
+            '--perflogdir', os.path.join(sessiondir, 'perflogs'),
+            '--report-file', os.path.join(sessiondir, 'report.json')]
+    return cmd + suite['options'] + ['-r']
+
+
+def run_suite(manifest, suite, sessiondir):
+    """Run one suite; returns (exit code, elapsed time)"""
+    os.makedirs(sessiondir, exist_ok=True)
+    cmd = reframe_cmd(manifest, suite, sessiondir)
+    start = time.time()
+    with open(os.path.join(sessiondir, 'reframe.out'), 'w') as out:
+        print(f"[{suite['name']}] started: {shlex.join(cmd)}", flush=True)
+
+        # The log file of the configuration is relative, so running from
+        # the session directory keeps the logs of the suites apart
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [manifest['basedir'], env.get('PYTHONPATH')])
+        )
+        proc = subprocess.run(cmd, cwd=sessiondir, env=env, stdout=out,
+                              stderr=subprocess.STDOUT)
+
+    elapsed = time.time() - start
+    print(f"[{suite['name']}] finished with exit code {proc.returncode} "
+          f"in {elapsed:.0f}s", flush=True)
+    return proc.returncode, elapsed
+
+
+def aggregate(results, sessions, filename):
+    """Print a summary of all sessions and write it to filename"""
+    summary = {'suites': []}
+    print(f"\n{'suite':<12} {'exit':>4} {'time':>8} {'cases':>6} "
+          f"{'pass':>5} {'fail':>5}")
+    for name, (returncode, elapsed) in results.items():
+        entry = {'name': name, 'exitcode': returncode,
+                 'elapsed': elapsed, 'testcases': []}
+        try:
+            report = Report(os.path.join(sessions[name], 'report.json'))
+            cases = report.testcases().values()
+        except (OSError, ValueError):
+            cases = []
+
+        for case in cases:
+            entry['testcases'].append({
+                'name': case.name,
+                'system': case.system,
+                'environ': case.environ,
+                'result': case.result,
+                'perfvalues': {var: perf._asdict()
+                               for var, perf in case.perf.items()}
+            })
+
+        num_pass = sum(c['result'] == 'pass' for c in entry['testcases'])
+        num_cases = len(entry['testcases'])
+        print(f'{name:<12} {returncode:>4} {elapsed:>7.0f}s {num_cases:>6} '
+              f'{num_pass:>5} {num_cases - num_pass:>5}')
+        summary['suites'].append(entry)
+
+    with open(filename, 'w') as fp:
+        json.dump(summary, fp, indent=2)
+
+    print(f'\nSummary written to {filename}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run ReFrame suites concurrently in isolated sessions'
+    )
+    parser.add_argument('-m', '--manifest',
+                        default=os.path.join(basedir, 'launchers',
+                                             'suites.yaml'),
+                        help='suite manifest (default: %(default)s)')
+    parser.add_argument('-s', '--suite', action='append', default=[],
+                        help='only run this suite (may be repeated)')
+    parser.add_argument('-j', '--max-parallel', type=int, default=0,
+                        help='maximum number of concurrent sessions '
+                             '(default: all)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the reframe commands and exit')
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    suites = [s for s in manifest['suites']
+              if not args.suite or s['name'] in args.suite]
+    if not suites:
+        parser.error('no suites selected')
+
+    prefix = os.path.join(_path(manifest, manifest['prefix']),
+                          time.strftime('%Y%m%dT%H%M%S'))
+    sessions = {s['name']: os.path.join(prefix, s['name']) for s in suites}
+    if args.dry_run:
+        for s in suites:
+            print(shlex.join(reframe_cmd(manifest, s, sessions[s['name']])))
+
+        return 0
+
+    max_workers = args.max_parallel or len(suites)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = {
+            s['name']: executor.submit(run_suite, manifest, s,
+                                       sessions[s['name']])
+            for s in suites
+        }
+        results = {name: f.result() for name, f in futures.items()}
+
+    aggregate(results, sessions, os.path.join(prefix, 'summary.json'))
+    return max(abs(rc) for rc, _ in results.values())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,10 @@
+#!/bin/bash
+
+reframe_configdir=/glade/work/bneuman/reframe_ncar
+
+reframe_condaenv=/glade/work/bneuman/conda-envs/reframe
+
+ml conda
+conda activate ${reframe_condaenv}
+
+python ${reframe_configdir}/launchers/run_suites.py -m ${reframe_configdir}/launchers/suites.yaml "$@"
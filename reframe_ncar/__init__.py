@@ -0,0 +1,11 @@
+"""
+NCAR helpers for the ReFrame test suite
+
+Shared sanity functions, mixins and command line tools used by the checks
+under tests/. Check files add the repository root to sys.path and import
+the modules they need, e.g. ``import reframe_ncar.sanity as nsn``.
+
+The drivers the jobs run as scripts, reframe_ncar/watchdog.py and
+reframe_ncar/autotune.py, only use the standard library, so that they run
+with the system python of the compute nodes.
+"""
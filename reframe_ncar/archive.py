@@ -0,0 +1,269 @@
+"""
+Archive and prune ReFrame stage directories
+
+Usage:
+    python -m reframe_ncar.archive -d ARCHIVE_DIR [REPORT ...] [--stage DIR]
+
+Each test case's stage directory is streamed into a zstd-compressed tar
+file (stage.tar.zst), while the files the sanity and performance functions
+read (job scripts, stdout/stderr, keep_files and any --keep patterns) are
+also copied next to it uncompressed, so they can be inspected without
+unpacking. Stage directories are taken from run reports or found under a
+stage prefix, and are processed in a thread pool.
+
+After archiving, the archive directory is trimmed to the retention budget:
+entries older than --max-age days are removed first, then the oldest ones
+until the total size is below --max-size.
+"""
+
+import argparse
+import concurrent.futures
+import fnmatch
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import time
+
+from reframe_ncar.reports import load_reports
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Files produced by ReFrame that the sanity and performance functions read
+KEEP_PATTERNS = ['rfm_*']
+
+ARCHIVE_NAMES = ('stage.tar.zst', 'stage.tar.gz')
+
+
+class _ZstdCLI:
+    """Writable stream compressing through the zstd command"""
+
+    def __init__(self, filename, level):
+        self._fp = open(filename, 'wb')
+        self._proc = subprocess.Popen(['zstd', '-q', f'-{level}', '-c'],
+                                      stdin=subprocess.PIPE, stdout=self._fp)
+
+    def write(self, data):
+        return self._proc.stdin.write(data)
+
+    def close(self):
+        self._proc.stdin.close()
+        returncode = self._proc.wait()
+        self._fp.close()
+        if returncode:
+            raise OSError(f'zstd failed with exit code {returncode}')
+
+
+def _open_archive(dirname, level):
+    """Return (stream, filename) for a new compressed stage archive"""
+    if zstandard:
+        filename = os.path.join(dirname, 'stage.tar.zst')
+        cctx = zstandard.ZstdCompressor(level=level, threads=-1)
+        return cctx.stream_writer(open(filename, 'wb')), filename
+
+    if shutil.which('zstd'):
+        filename = os.path.join(dirname, 'stage.tar.zst')
+        return _ZstdCLI(filename, level), filename
+
+    return None, os.path.join(dirname, 'stage.tar.gz')
+
+
+def archive_stage(stagedir, destdir, keep=None, level=3):
+    """Stream stagedir into destdir/stage.tar.zst and copy the files to keep
+
+    :returns: the size of the archive in bytes.
+    """
+    keep = KEEP_PATTERNS + (keep or [])
+    os.makedirs(destdir, exist_ok=True)
+    stream, filename = _open_archive(destdir, level)
+    arcname = os.path.basename(stagedir)
+    if stream is None:
+        with tarfile.open(filename, 'w:gz') as tar:
+            tar.add(stagedir, arcname)
+    else:
+        try:
+            with tarfile.open(fileobj=stream, mode='w|') as tar:
+                tar.add(stagedir, arcname)
+        finally:
+            stream.close()
+
+    for root, dirs, files in os.walk(stagedir):
+        for name in files:
+            relpath = os.path.relpath(os.path.join(root, name), stagedir)
+            if any(fnmatch.fnmatch(relpath, patt) for patt in keep):
+                dest = os.path.join(destdir, relpath)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.copy2(os.path.join(root, name), dest)
+
+    return os.path.getsize(filename)
+
+
+def stages_from_reports(reports):
+    """Yield (stagedir, relative destination, keep patterns) of the test
+    cases in reports"""
+    for report in reports:
+        session = (report.session_info.get('time_start') or
+                   report.label).split('+')[0]
+        for case in report.testcases().values():
+            stagedir = case.get('stagedir')
+            if not stagedir:
+                continue
+
+            keep = list(case.get('keep_files') or [])
+            for key in ('job_stdout', 'job_stderr',
+                        'build_stdout', 'build_stderr'):
+                if case.get(key):
+                    keep.append(case.get(key))
+
+            relpath = os.path.join(session, *case.system.split(':'),
+                                   case.environ, os.path.basename(stagedir))
+            yield stagedir, relpath, keep
+
+
+def stages_from_prefix(prefix):
+    """Yield the test stage directories under a stage prefix, laid out as
+    <system>/<partition>/<environ>/<test>"""
+    session = time.strftime('%Y%m%dT%H%M%S')
+    prefix = os.path.abspath(prefix)
+    for root, dirs, files in os.walk(prefix):
+        relpath = os.path.relpath(root, prefix)
+        if relpath.count(os.sep) == 3:
+            dirs.clear()
+            yield root, os.path.join(session, relpath), []
+
+
+def _entries(archive_dir):
+    """Return [(mtime, size, path)] of the archived test cases"""
+    entries = []
+    for root, dirs, files in os.walk(archive_dir):
+        for name in ARCHIVE_NAMES:
+            if name in files:
+                size = sum(os.path.getsize(os.path.join(r, f))
+                           for r, _, fs in os.walk(root) for f in fs)
+                mtime = os.path.getmtime(os.path.join(root, name))
+                entries.append((mtime, size, root))
+                dirs.clear()
+                break
+
+    return sorted(entries)
+
+
+def _remove_entry(path, archive_dir):
+    shutil.rmtree(path)
+    parent = os.path.dirname(path)
+    while parent != archive_dir and not os.listdir(parent):
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
+
+
+def enforce_retention(archive_dir, max_age=None, max_size=None):
+    """Remove archived entries by age, then oldest first by total size
+
+    :returns: the list of removed entries.
+    """
+    archive_dir = os.path.abspath(archive_dir)
+    entries = _entries(archive_dir)
+    removed = []
+    now = time.time()
+    if max_age is not None:
+        for entry in list(entries):
+            if now - entry[0] > max_age*86400:
+                entries.remove(entry)
+                removed.append(entry[2])
+
+    if max_size is not None:
+        total = sum(e[1] for e in entries)
+        while entries and total > max_size:
+            _, size, path = entries.pop(0)
+            total -= size
+            removed.append(path)
+
+    for path in removed:
+        _remove_entry(path, archive_dir)
+
+    return removed
+
+
+def parse_size(size):
+    """Convert sizes like 500G or 2T to bytes"""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+
+    return int(size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='archive',
+        description='Archive and prune ReFrame stage directories'
+    )
+    parser.add_argument('reports', nargs='*', metavar='REPORT',
+                        help='run reports (or directories of them) whose '
+                             'test cases to archive')
+    parser.add_argument('-d', '--archive-dir', required=True,
+                        help='archive directory')
+    parser.add_argument('--stage', metavar='DIR',
+                        help='archive all test stage directories under DIR')
+    parser.add_argument('--keep', action='append', default=[],
+                        help='also keep files matching this pattern '
+                             'uncompressed (may be repeated)')
+    parser.add_argument('--prune', action='store_true',
+                        help='remove stage directories once archived')
+    parser.add_argument('--max-age', type=float, metavar='DAYS',
+                        help='remove archives older than DAYS')
+    parser.add_argument('--max-size', type=parse_size, metavar='SIZE',
+                        help='keep the archive directory below SIZE '
+                             '(e.g. 500G)')
+    parser.add_argument('-l', '--level', type=int, default=3,
+                        help='zstd compression level (default: 3)')
+    parser.add_argument('-j', '--jobs', type=int, default=8,
+                        help='number of parallel archivers (default: 8)')
+    args = parser.parse_args(argv)
+
+    stages = list(stages_from_reports(load_reports(args.reports)))
+    if args.stage:
+        stages += list(stages_from_prefix(args.stage))
+
+    stages = [s for s in stages if os.path.isdir(s[0])]
+
+    def _archive(stage):
+        stagedir, relpath, keep = stage
+        size = archive_stage(stagedir,
+                             os.path.join(args.archive_dir, relpath),
+                             keep + args.keep, args.level)
+        if args.prune:
+            shutil.rmtree(stagedir)
+
+        return size
+
+    failures = 0
+    total = 0
+    with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+        futures = {executor.submit(_archive, s): s[0] for s in stages}
+        for f in concurrent.futures.as_completed(futures):
+            try:
+                total += f.result()
+            except (OSError, tarfile.TarError) as e:
+                failures += 1
+                print(f'could not archive {futures[f]}: {e}',
+                      file=sys.stderr)
+
+    print(f'Archived {len(stages) - failures} stage directories '
+          f'({total / (1 << 20):.1f} MiB)')
+    if args.max_age is not None or args.max_size is not None:
+        removed = enforce_retention(args.archive_dir, args.max_age,
+                                    args.max_size)
+        print(f'Removed {len(removed)} archived entries')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
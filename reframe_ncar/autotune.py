@@ -0,0 +1,166 @@
+"""
+Compiler flag autotuning by successive halving
+
+Runs inside a single job: builds every configuration of a flag space in
+parallel, then runs the survivors in rounds. Every round runs each survivor
+a growing number of times, drops the configurations that fail verification
+and keeps the best 1/eta of the rest by the median of the metric, until one
+is left. Cheap single runs thereby weed out most of the space and the
+repeated runs, which tell the close contenders apart, are spent on few
+configurations.
+
+Usage:
+    python3 -m reframe_ncar.autotune SPEC.json
+
+The spec is written by the test (see Mg2AutotuneTest in tests/mg2):
+
+    {
+        "configs": {"baseline": "-O2", "c1": "-O3 -fma", ...},
+        "source": "/path/to/sources",     # copied once per configuration
+        "workdir": "/path/to/autotune",
+        "build": "make FCFLAGS='{flags}'",     # run in the copy
+        "run": "mpirun -np 16 ./kernel.exe",   # run in the copy
+        "verify": "PASSED verification",       # regex every run must match
+        "metric": "columns per sec :\\\\s+(\\\\S+)",  # higher is better
+        "eta": 3, "min_runs": 1, "max_runs": 9, "jobs": 16
+    }
+
+The results are printed to stdout and written to results.json in the work
+directory.
+"""
+
+import concurrent.futures
+import json
+import math
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+
+
+def _shell(cmd, cwd, output):
+    with open(output, 'w') as fp:
+        return subprocess.run(cmd, shell=True, cwd=cwd, stdout=fp,
+                              stderr=subprocess.STDOUT).returncode
+
+
+def build(name, spec):
+    """Copy the sources and build configuration name; True on success"""
+    builddir = os.path.join(spec['workdir'], name)
+    shutil.rmtree(builddir, ignore_errors=True)
+    shutil.copytree(spec['source'], builddir, symlinks=True)
+    cmd = spec['build'].replace('{flags}', spec['configs'][name])
+    output = os.path.join(builddir, 'autotune_build.out')
+    return _shell(cmd, builddir, output) == 0
+
+
+def run(name, spec, index):
+    """Run configuration name once; the metric or None if the run failed"""
+    builddir = os.path.join(spec['workdir'], name)
+    output = os.path.join(builddir, f'autotune_run{index}.out')
+    if _shell(spec['run'], builddir, output) != 0:
+        return None
+
+    with open(output) as fp:
+        text = fp.read()
+
+    values = re.findall(spec['metric'], text, re.MULTILINE)
+    if not re.search(spec['verify'], text, re.MULTILINE) or not values:
+        return None
+
+    return float(values[-1])
+
+
+def successive_halving(spec, log=print):
+    """Tune the configurations of spec
+
+    :returns: the results by configuration, with the metric values of its
+        runs and the round it was dropped in
+    """
+    results = {name: {'flags': flags, 'values': [], 'status': 'built'}
+               for name, flags in spec['configs'].items()}
+    os.makedirs(spec['workdir'], exist_ok=True)
+    with concurrent.futures.ThreadPoolExecutor(spec.get('jobs', 1)) as pool:
+        built = dict(zip(results, pool.map(lambda n: build(n, spec),
+                                           results)))
+
+    survivors = []
+    for name, ok in built.items():
+        if ok:
+            survivors.append(name)
+        else:
+            results[name]['status'] = 'build failed'
+            log(f'config {name}: build failed: {results[name]["flags"]}')
+
+    eta = spec.get('eta', 3)
+    runs = spec.get('min_runs', 1)
+    round_ = 0
+    while survivors:
+        log(f'round {round_}: {len(survivors)} config(s), {runs} run(s) each')
+        scores = {}
+        for name in survivors:
+            values = results[name]['values']
+            while len(values) < runs:
+                value = run(name, spec, len(values))
+                if value is None:
+                    results[name]['status'] = f'failed in round {round_}'
+                    break
+
+                values.append(value)
+            else:
+                scores[name] = statistics.median(values)
+                log(f'config {name}: {scores[name]:g} '
+                    f'({len(values)} run(s)): {results[name]["flags"]}')
+                continue
+
+            log(f'config {name}: run failed: {results[name]["flags"]}')
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        survivors = ranked[:math.ceil(len(ranked) / eta)]
+        for name in ranked[len(survivors):]:
+            results[name]['status'] = f'dropped in round {round_}'
+
+        if len(survivors) <= 1:
+            break
+
+        runs = min(runs * eta, spec.get('max_runs', 9))
+        round_ += 1
+
+    for name in survivors:
+        results[name]['status'] = 'best'
+
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__, file=sys.stderr)
+        return 2
+
+    with open(argv[0]) as fp:
+        spec = json.load(fp)
+
+    results = successive_halving(spec)
+    with open(os.path.join(spec['workdir'], 'results.json'), 'w') as fp:
+        json.dump(results, fp, indent=2)
+
+    best = [name for name, r in results.items() if r['status'] == 'best']
+    for label, name in (('baseline', 'baseline'), ('best', best and best[0])):
+        r = results.get(name)
+        if r and r['values']:
+            value = statistics.median(r['values'])
+            print(f'{label}: {value:g}: {r["flags"]}')
+
+    if not best:
+        print('no configuration passed verification')
+        return 1
+
+    print(f'best configuration: {best[0]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
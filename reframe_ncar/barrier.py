@@ -0,0 +1,113 @@
+"""
+Filesystem completion barrier
+
+Output written on the compute nodes can show up on GLADE some time after
+the scheduler reports the job as finished. Instead of sleeping for a fixed
+time, wait until the expected files exist and have stopped growing, polling
+with exponential backoff up to a timeout.
+"""
+
+import glob
+import os
+import time
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, variable
+from reframe.core.logging import getlogger
+
+from reframe_ncar.sanity import contains
+
+
+def _snapshot(basedir, patterns):
+    """Return {path: (size, mtime)} for all files matching patterns or None
+    if any of the patterns has no match yet"""
+    files = {}
+    for patt in patterns:
+        matches = glob.glob(os.path.join(basedir, patt))
+        if not matches:
+            return None
+
+        for path in matches:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+
+            files[path] = (st.st_size, st.st_mtime_ns)
+
+    return files
+
+
+def wait_for_files(patterns, basedir='.', markers=None, timeout=120,
+                   interval=0.5, max_interval=10):
+    """Wait for files to appear and become size-stable
+
+    :arg patterns: glob patterns relative to basedir; each must match at
+        least one file.
+    :arg markers: list of (filename, regex) pairs; each regex must be found
+        in its file, e.g. a completion message in the job's stdout.
+    :arg timeout: give up after this many seconds.
+    :returns: True if the barrier was passed, False on timeout.
+    """
+    markers = markers or []
+    deadline = time.monotonic() + timeout
+    delay, last = interval, None
+    while True:
+        files = _snapshot(basedir, list(patterns) +
+                          [filename for filename, _ in markers])
+        ready = (files is not None and
+                 all(contains(patt, os.path.join(basedir, filename))
+                     for filename, patt in markers))
+
+        # Require two identical consecutive snapshots, so that files that
+        # are still being written out are not picked up half-way
+        if ready and files == last:
+            return True
+
+        if ready and last is None:
+            # Everything is there; confirm quickly that it is complete
+            delay = interval
+
+        last = files if ready else None
+        if time.monotonic() + delay > deadline:
+            return False
+
+        time.sleep(delay)
+        delay = min(2*delay, max_interval)
+
+
+class CompletionBarrierMixin(rfm.RegressionMixin):
+    """Wait for the test's output to land before sanity checking"""
+
+    # Glob patterns, relative to the stage directory, of files the run
+    # must produce
+    completion_files = variable(typ.List[str], value=[])
+
+    # Regex patterns that must appear in the job's stdout
+    completion_markers = variable(typ.List[str], value=[])
+
+    # Maximum time to wait in seconds
+    completion_timeout = variable(float, int, value=120)
+
+    @run_after('run')
+    def wait_for_completion(self):
+        """Block until the expected output is present and complete"""
+        if self.job.exitcode:
+            # Failed runs will not produce their output
+            return
+
+        stdout = sn.evaluate(self.stdout)
+        markers = [(stdout, patt) for patt in self.completion_markers]
+        start = time.monotonic()
+        if wait_for_files(self.completion_files, self.stagedir, markers,
+                          self.completion_timeout):
+            getlogger().debug(f'{self.name}: output complete after '
+                              f'{time.monotonic() - start:.1f}s')
+        else:
+            # Let the sanity functions report what is missing
+            getlogger().warning(
+                f'{self.name}: output not complete after '
+                f'{self.completion_timeout}s'
+            )
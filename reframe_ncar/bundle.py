@@ -0,0 +1,287 @@
+"""
+Job bundling for PBS
+
+Small tests each pay a full queue wait for a few cores and a few minutes.
+The 'pbs-bundle' scheduler gathers the small jobs submitted to a partition
+and submits them together as one PBS job, which runs their job scripts
+concurrently (or back-to-back) inside the one allocation. Every job script
+writes its stdout and stderr to its stage directory as usual and its exit
+code next to them, so sanity and performance checking are unchanged.
+
+Bundled job scripts are stopped at their own time limit. Concurrent ones
+are each bound to their own cpus of the allocation, so that they do not
+compete for cores; launchers binding their ranks have to keep to the cpus
+they inherit. Serial bundles suit benchmarks that need whole nodes.
+
+A job is small if it fits on one node within bundle_max_cpus and its time
+limit is at most bundle_max_time_limit; other jobs are submitted on their
+own. Only jobs with the same job options are bundled together. Jobs are
+gathered until a bundle is full or for bundle_gather_time seconds after
+the first one. All settings are partition sched_options:
+
+    'scheduler': 'pbs-bundle',
+    'sched_options': {
+        'bundle_max_cpus': 36,
+        'bundle_max_jobs': 16,
+        'bundle_max_time_limit': 1800,
+        'bundle_gather_time': 10,
+        'bundle_mode': 'concurrent'      # or 'serial'
+    }
+
+Jobs and bundles are polled like with the 'pbs-adaptive' scheduler.
+Importing this module registers the scheduler.
+"""
+
+import itertools
+import os
+import time
+
+import reframe.core.runtime as rt
+from reframe.core.backends import register_scheduler
+from reframe.core.exceptions import JobSchedulerError
+
+from reframe_ncar.pbs import AdaptivePbsScheduler
+
+DEFAULTS = {
+    'bundle_max_cpus': 36,
+    'bundle_max_jobs': 16,
+    'bundle_max_time_limit': 1800,
+    'bundle_gather_time': 10,
+    'bundle_mode': 'concurrent'
+}
+
+_bundle_ids = itertools.count(1)
+
+# Seconds between terminating a job script at its time limit and killing it
+KILL_GRACE = 10
+
+
+def _cpus(job):
+    return (job.num_tasks or 1) * (job.num_cpus_per_task or 1)
+
+
+def exit_file(job):
+    """The file holding the exit code of a bundled job"""
+    basename, _ = os.path.splitext(job.script_filename)
+    return os.path.join(job.workdir, f'{basename}.exit')
+
+
+class _Bundle:
+    """Jobs sharing one PBS job"""
+
+    def __init__(self, options):
+        self.id = next(_bundle_ids)
+        self.options = options
+        self.members = []
+        self.created = time.time()
+        self.job = None
+
+    def cpus(self, mode, job=None):
+        """The cpus needed to run the members and job"""
+        cpus = [_cpus(j) for j in self.members + ([job] if job else [])]
+        return sum(cpus) if mode == 'concurrent' else max(cpus)
+
+    @property
+    def done(self):
+        return all(job.completed for job in self.members)
+
+
+@register_scheduler('pbs-bundle')
+class PbsBundleScheduler(AdaptivePbsScheduler):
+    """PBS scheduler packing small jobs into shared PBS jobs"""
+
+    def __init__(self):
+        super().__init__()
+        for name, value in DEFAULTS.items():
+            setattr(self, f'_{name}', self.get_option(name) or value)
+
+        if self._bundle_mode not in ('concurrent', 'serial'):
+            raise JobSchedulerError(
+                f'invalid bundle_mode: {self._bundle_mode!r}'
+            )
+
+        # Bundles still gathering jobs by job options and submitted bundles
+        # with unfinished members
+        self._pending = {}
+        self._submitted = []
+
+    def _bundled(self, job):
+        return getattr(job, '_rfm_bundle', None)
+
+    def _small(self, job):
+        tasks_per_node = job.num_tasks_per_node or job.num_tasks or 1
+        return ((job.num_tasks or 1) <= tasks_per_node and
+                _cpus(job) <= self._bundle_max_cpus and
+                job.time_limit is not None and
+                job.time_limit <= self._bundle_max_time_limit)
+
+    def submit(self, job):
+        if not self._small(job):
+            return super().submit(job)
+
+        options = tuple(job.options + job.cli_options)
+        bundle = self._pending.get(options)
+        if bundle and (len(bundle.members) >= self._bundle_max_jobs or
+                       bundle.cpus(self._bundle_mode, job) >
+                       self._bundle_max_cpus):
+            self._submit_bundle(bundle)
+            bundle = None
+
+        if bundle is None:
+            bundle = self._pending[options] = _Bundle(options)
+
+        bundle.members.append(job)
+        job._rfm_bundle = bundle
+        job._jobid = f'bundle{bundle.id}.{len(bundle.members) - 1}'
+        job._submit_time = time.time()
+        job._state = 'QUEUED'
+        self.log(f'job {job.name} gathered into bundle {bundle.id}')
+
+    def _bundle_script(self, bundle, job):
+        preamble = self.emit_preamble(job)
+        lines = ['#!/bin/bash'] + preamble
+        concurrent = self._bundle_mode == 'concurrent'
+        if concurrent:
+            # The cpus of the allocation, handed out to the members in turn;
+            # they are shared round robin if the allocation has fewer
+            lines += [
+                "rfm_cpus=($(python3 -c 'import os; "
+                "print(*sorted(os.sched_getaffinity(0)))'))",
+                'rfm_cpuset() { local i s=; '
+                'for ((i = $1; i < $1 + $2; i++)); do '
+                's+=${s:+,}${rfm_cpus[i % ${#rfm_cpus[@]}]}; done; echo $s; }'
+            ]
+
+        offset = 0
+        for member in bundle.members:
+            exitfile = exit_file(member)
+            cmd = (f'timeout -k {KILL_GRACE} {int(member.time_limit)} '
+                   f'bash {member.script_filename}')
+            if concurrent:
+                cpus = _cpus(member)
+                cmd = f'taskset -c $(rfm_cpuset {offset} {cpus}) {cmd}'
+                offset += cpus
+
+            lines.append(
+                f'(cd {member.workdir} && {cmd} '
+                f'> {member.stdout} 2> {member.stderr}; '
+                f'echo $? > {exitfile}.tmp && mv {exitfile}.tmp {exitfile})'
+                + (' &' if concurrent else '')
+            )
+
+        lines.append('wait')
+        return '\n'.join(lines) + '\n'
+
+    def _submit_bundle(self, bundle):
+        del self._pending[bundle.options]
+        members = bundle.members
+        if self._bundle_mode == 'concurrent':
+            time_limit = max(job.time_limit for job in members)
+        else:
+            time_limit = sum(job.time_limit for job in members)
+
+        workdir = os.path.join(rt.runtime().stage_prefix, '_bundles')
+        os.makedirs(workdir, exist_ok=True)
+        name = f'rfm_bundle_{bundle.id}'
+        job = self.make_job(
+            name, workdir=workdir,
+            script_filename=os.path.join(workdir, f'{name}.sh'),
+            stdout=os.path.join(workdir, f'{name}.out'),
+            stderr=os.path.join(workdir, f'{name}.err'),
+            sched_access=members[0].sched_access
+        )
+        job._scheduler = self
+        job.num_tasks = job.num_tasks_per_node = bundle.cpus(
+            self._bundle_mode
+        )
+        job.time_limit = time_limit
+        job.options = list(bundle.options)
+        with open(job.script_filename, 'w') as fp:
+            fp.write(self._bundle_script(bundle, job))
+
+        for member in members:
+            # A retried test reuses its stage directory
+            try:
+                os.remove(exit_file(member))
+            except FileNotFoundError:
+                pass
+
+        super().submit(job)
+        bundle.job = job
+        self._submitted.append(bundle)
+        for i, member in enumerate(members):
+            member._jobid = f'{job.jobid}/{i}'
+
+        self.log(f'bundle {bundle.id} submitted as job {job.jobid} with '
+                 f'{len(members)} job(s): '
+                 f'{", ".join(m.name for m in members)}')
+
+    def _submit_due(self, force=()):
+        now = time.time()
+        for bundle in list(self._pending.values()):
+            if (now - bundle.created >= self._bundle_gather_time or
+                any(job in bundle.members for job in force)):
+                self._submit_bundle(bundle)
+
+    def _update_members(self, bundle):
+        for member in bundle.members:
+            if member.completed:
+                continue
+
+            member._state = bundle.job.state
+            member._nodelist = bundle.job.nodelist
+            try:
+                with open(exit_file(member)) as fp:
+                    member._exitcode = int(fp.read())
+            except (OSError, ValueError):
+                if not bundle.job.completed:
+                    continue
+
+                # The bundle ended before the job did, e.g. on its time limit
+                member._exitcode = bundle.job.exitcode
+
+            member._state = 'COMPLETED'
+            member._completed = True
+
+    def poll(self, *jobs):
+        jobs = [job for job in jobs if job is not None]
+        self._submit_due()
+
+        # Query the unbundled jobs and the bundles in a single qstat
+        direct = [job for job in jobs if not self._bundled(job)]
+        bundles = [b.job for b in self._submitted if not b.job.completed]
+        num_queries = self.num_queries
+        if direct or bundles:
+            super().poll(*direct, *bundles)
+
+        # Bundles may also be queried by the scheduler of another partition
+        queried = self.num_queries != num_queries
+        for bundle in list(self._submitted):
+            if not queried and not bundle.job.completed:
+                continue
+
+            self._update_members(bundle)
+            if bundle.done:
+                self._submitted.remove(bundle)
+
+    def wait(self, job):
+        if self._bundled(job):
+            # Nothing else is going to join the bundle
+            self._submit_due(force=[job])
+
+        super().wait(job)
+
+    def cancel(self, job):
+        bundle = self._bundled(job)
+        if not bundle:
+            return super().cancel(job)
+
+        job._cancelled = True
+        job._state = 'COMPLETED'
+        job._completed = True
+        if bundle.job is None:
+            bundle.members.remove(job)
+            if not bundle.members:
+                del self._pending[bundle.options]
+        elif bundle.done and not bundle.job.completed:
+            super().cancel(bundle.job)
@@ -0,0 +1,119 @@
+"""
+Simulation throughput and cost to solution
+
+Applications report their speed in their own terms: time steps per second,
+seconds per step or the total time of a run. Tests using SimulationCostMixin
+declare the size of the simulated problem, from which metrics are derived
+that compare across applications and between CPU and GPU runs:
+
+    sim_speed                 simulated seconds per wall clock second
+    resource_hours_per_sim_hour
+                              core-hours, or GPU-hours on partitions the
+                              test requests GPUs on, per simulated hour
+    cost_per_point_step       core- or GPU-microseconds per grid point and
+                              time step
+
+    class MyTest(rfm.RegressionTest, SimulationCostMixin):
+        simulated_time = 3600.0
+        grid_points = 256 * 256 * 64
+        time_steps_pattern = r'Total time steps:\\s+(\\d+)'
+
+The wall clock time is taken from the first performance variable of
+WALL_TIME_METRICS the test reports (or wall_time_metric), else from the job
+runtime recorded by JobTimingMixin. Metrics whose inputs are not declared
+are not reported.
+"""
+
+import math
+import os
+import re
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+from reframe.core.builtins import run_before, variable
+
+# Performance variables holding the wall clock time of a run, in order of
+# preference
+WALL_TIME_METRICS = ('walltime', 'total_runtime', 'simulation_time',
+                     'total_time')
+
+
+class SimulationCostMixin(rfm.RegressionMixin):
+    """Report simulated throughput and cost metrics"""
+
+    # Simulated seconds per run
+    simulated_time = variable(float, type(None), value=None)
+
+    # Grid points of the simulated domain
+    grid_points = variable(int, type(None), value=None)
+
+    # Time steps per run, or a pattern extracting them from the stdout
+    time_steps = variable(int, type(None), value=None)
+    time_steps_pattern = variable(str, type(None), value=None)
+
+    # Performance variable holding the wall clock time of a run; None to
+    # pick it from WALL_TIME_METRICS
+    wall_time_metric = variable(str, type(None), value=None)
+
+    def _wall_time(self):
+        names = ([self.wall_time_metric] if self.wall_time_metric
+                 else WALL_TIME_METRICS)
+        for name in names:
+            if name in self.perf_variables:
+                return self.perf_variables[name]
+
+        if getattr(self, 'job_runtime', None):
+            return sn.defer(self.job_runtime)
+
+        return None
+
+    def _resources(self):
+        """The resources charged for the run and their unit"""
+        if self.num_gpus_per_node:
+            per_node = self.num_tasks_per_node or self.num_tasks
+            nodes = math.ceil(self.num_tasks / per_node)
+            return nodes * self.num_gpus_per_node, 'GPU'
+
+        return self.num_tasks * (self.num_cpus_per_task or 1), 'core'
+
+    def _steps(self):
+        if self.time_steps:
+            return self.time_steps
+
+        if not self.time_steps_pattern:
+            return None
+
+        try:
+            with open(os.path.join(self.stagedir, self.job.stdout)) as fp:
+                found = re.findall(self.time_steps_pattern, fp.read(),
+                                   re.MULTILINE)
+        except OSError:
+            return None
+
+        return int(found[-1]) if found else None
+
+    @run_before('performance', always_last=True)
+    def add_cost_perf_variables(self):
+        wall = self._wall_time()
+        if wall is None:
+            return
+
+        resources, unit = self._resources()
+        if self.simulated_time:
+            self.perf_variables['sim_speed'] = sn.make_performance_function(
+                self.simulated_time / wall, 's/s'
+            )
+            self.perf_variables['resource_hours_per_sim_hour'] = (
+                sn.make_performance_function(
+                    resources * wall / self.simulated_time, f'{unit}-h/h'
+                )
+            )
+
+        steps = self._steps()
+        if self.grid_points and steps:
+            self.perf_variables['cost_per_point_step'] = (
+                sn.make_performance_function(
+                    1e6 * resources * wall / (self.grid_points * steps),
+                    f'{unit}-us'
+                )
+            )
@@ -0,0 +1,116 @@
+"""
+Runtime history of past test cases
+
+Collects how long every test case ran in previous sessions from their run
+reports. Test cases are keyed like the reports, by display name,
+system:partition and environment, so the history is kept per partition.
+"""
+
+import collections
+import functools
+import os
+
+from reframe_ncar.reports import load_reports
+
+# Failures in these phases still ran the test to completion
+COMPLETE_PHASES = ('sanity', 'performance')
+
+
+def runtime(case):
+    """The run time of a report test case in seconds, or None if the test
+    did not run to completion
+
+    This is the wall clock time of the job script if it was recorded (see
+    reframe_ncar.timing), else the time of the run phase, which includes
+    the queue wait.
+    """
+    if case.result != 'pass' and case.get('fail_phase') not in COMPLETE_PHASES:
+        return None
+
+    if case.get('result_cached'):
+        # Taken from the result cache (see reframe_ncar.resultcache)
+        return None
+
+    if case.get('short_window_stopped'):
+        # Stopped after a window of steps (see reframe_ncar.monitor)
+        return None
+
+    if (case.get('repeat') or 1) > 1:
+        # Several runs in one job (see reframe_ncar.repeat)
+        return None
+
+    return case.get('job_runtime') or case.get('time_run')
+
+
+def quantile(values, q):
+    """The q-quantile of values, interpolating between the closest ranks"""
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+class History:
+    """The runtimes of the last window sessions of every test case"""
+
+    def __init__(self, reports, window=10):
+        self.window = window
+        self._samples = collections.defaultdict(list)
+        for report in reports:
+            for key, case in report.testcases().items():
+                value = runtime(case)
+                if value is not None:
+                    self._samples[key].append(value)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def samples(self, name, system, environ):
+        return self._samples.get((name, system, environ), [])[-self.window:]
+
+    def expected(self, name, system, environ, q=0.5):
+        """The expected runtime of a test case, or None if it never ran"""
+        samples = self.samples(name, system, environ)
+        if not samples:
+            return None
+
+        return quantile(samples, q)
+
+
+def load_history(paths, window=10):
+    """Build the history of the reports found under paths"""
+    return History(load_reports(paths, recursive=True), window)
+
+
+@functools.lru_cache()
+def _cached_history(paths, window):
+    return load_history(paths, window)
+
+
+def history_paths(paths=None):
+    """The locations of the past run reports
+
+    Without paths, the directories of RFM_NCAR_HISTORY are used, else the
+    directory of the session's report file.
+    """
+    if not paths:
+        paths = os.environ.get('RFM_NCAR_HISTORY', '').split(os.pathsep)
+        paths = [p for p in paths if p]
+
+    if not paths:
+        import reframe.core.runtime as rt
+
+        report_file = rt.runtime().get_option('general/0/report_file')
+        paths = [os.path.dirname(os.path.expandvars(report_file)) or '.']
+
+    return tuple(paths)
+
+
+def session_history(paths=None, window=10):
+    """The history shared by all tests of a session
+
+    The reports are only loaded once per session; see history_paths() for
+    where they are looked for.
+    """
+    return _cached_history(history_paths(paths), window)
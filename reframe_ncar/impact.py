@@ -0,0 +1,185 @@
+"""
+Change-impact test selection
+
+A test case can only change its outcome if one of its inputs changed: the
+modules and environment variables of its system, partition and programming
+environment, the application source trees, the check file, which holds the
+build options and namelist overrides, and the values of the test's
+variables, including those set with -S. With -S change_impact=1, test
+cases using ChangeImpactMixin record a fingerprint of these inputs in the
+run report, and a test case is skipped if it passed in a past session with
+the same fingerprint less than change_max_age ago:
+
+    reframe -C config.py -c tests/ -r -S change_impact=1
+
+Hashing the source trees takes a while, so the fingerprint is only computed
+with change_impact set, or with -S change_record=1 to record it without
+skipping anything.
+
+Source trees are the directories named by variables ending in _source_dir,
+the sourcesdir of the test and the paths in change_inputs. Past sessions are
+looked for like the runtime history (see reframe_ncar.history).
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import time
+
+import reframe as rfm
+import reframe.core.runtime as rt
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, variable
+
+from reframe_ncar.history import history_paths
+from reframe_ncar.reports import load_reports
+
+# Variables of the framework that change what a test runs. Variables of the
+# test itself are all included, those of ReFrame and of the mixins of this
+# package, which control how a test is run, only if listed here.
+FRAMEWORK_INPUTS = ('executable', 'executable_opts', 'env_vars', 'modules',
+                    'num_tasks', 'num_tasks_per_node', 'num_cpus_per_task',
+                    'num_gpus_per_node', 'extra_resources', 'sourcepath')
+
+# Directories never part of a source tree
+IGNORED_DIRS = ('.git', '__pycache__')
+
+
+@functools.lru_cache()
+def tree_hash(path):
+    """A hash of the file names and contents under path"""
+    digest = hashlib.sha256()
+    if os.path.isfile(path):
+        with open(path, 'rb') as fp:
+            digest.update(fp.read())
+
+        return digest.hexdigest()
+
+    if not os.path.isdir(path):
+        return 'missing'
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS)
+        for filename in sorted(filenames):
+            filepath = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(filepath, path).encode())
+            try:
+                with open(filepath, 'rb') as fp:
+                    for chunk in iter(lambda: fp.read(1 << 20), b''):
+                        digest.update(chunk)
+            except OSError:
+                # Dangling links and unreadable files
+                digest.update(b'unreadable')
+
+    return digest.hexdigest()
+
+
+def _environ_inputs(environ):
+    return [environ.name, sorted(environ.modules),
+            sorted(environ.env_vars.items())]
+
+
+@functools.lru_cache()
+def _last_passed(paths):
+    """The fingerprint and completion time of the last passed run of every
+    test case of the reports under paths"""
+    last = {}
+    for report in load_reports(paths, recursive=True):
+        for case in report.testcases().values():
+            fingerprint = case.get('change_fingerprint')
+            if case.result == 'pass' and fingerprint:
+                last[case.key] = (
+                    fingerprint,
+                    case.get('job_completion_time_unix') or report.time_start
+                )
+
+    return last
+
+
+class ChangeImpactMixin(rfm.RegressionMixin):
+    """Skip test cases whose inputs did not change since they last passed"""
+
+    # Skip unchanged test cases
+    change_impact = variable(typ.Bool, value=False)
+
+    # Record the fingerprint without skipping unchanged test cases
+    change_record = variable(typ.Bool, value=False)
+
+    # Rerun unchanged test cases that last passed longer ago than this
+    change_max_age = variable(typ.Duration, value='7d', allow_implicit=True)
+
+    # Further files or directories the outcome of the test depends on
+    change_inputs = variable(typ.List[str], value=[])
+
+    # Directories of past run reports (default: see history_paths())
+    change_history = variable(typ.List[str], value=[])
+
+    # Fingerprint of the inputs of the test case
+    change_fingerprint = variable(str, type(None), value=None)
+
+    def _source_paths(self):
+        names = [name for name in self._rfm_var_space
+                 if name.endswith('_source_dir')]
+        paths = [getattr(self, name) for name in names] + self.change_inputs
+        if self.sourcesdir and not self.sourcesdir.startswith(
+                ('http://', 'https://', 'git@')):
+            paths.append(os.path.join(self.prefix, self.sourcesdir))
+
+        return sorted(os.path.expandvars(p) for p in paths)
+
+    def _variable_inputs(self):
+        framework = set()
+        for cls in type(self).__mro__:
+            if (cls.__module__.startswith(('reframe.', 'reframe_ncar.')) and
+                hasattr(cls, '_rfm_var_space')):
+                framework.update(cls._rfm_var_space)
+
+        values = []
+        for name in sorted(self._rfm_var_space):
+            if name in framework and name not in FRAMEWORK_INPUTS:
+                continue
+
+            try:
+                values.append((name, repr(getattr(self, name))))
+            except AttributeError:
+                # Required variables without a value
+                continue
+
+        return values
+
+    def fingerprint(self):
+        """The hash of the inputs of the test case"""
+        system = rt.runtime().system
+        inputs = [
+            self.display_name,
+            _environ_inputs(system.preload_environ),
+            _environ_inputs(self.current_partition.local_env),
+            _environ_inputs(self.current_environ),
+            tree_hash(inspect.getfile(type(self))),
+            [(p, tree_hash(p)) for p in self._source_paths()],
+            self._variable_inputs()
+        ]
+        return hashlib.sha256(repr(inputs).encode()).hexdigest()
+
+    @run_after('setup', always_last=True)
+    def select_changed(self):
+        if not self.change_impact and not self.change_record:
+            return
+
+        self.change_fingerprint = self.fingerprint()
+        if not self.change_impact:
+            return
+
+        last = _last_passed(history_paths(self.change_history)).get(
+            (self.display_name, self.current_partition.fullname,
+             self.current_environ.name)
+        )
+        if last is None:
+            return
+
+        fingerprint, completed = last
+        age = time.time() - (completed or 0)
+        if fingerprint == self.change_fingerprint and age < self.change_max_age:
+            self.skip(f'inputs unchanged since it passed '
+                      f'{age / 3600:.1f}h ago')
@@ -0,0 +1,118 @@
+"""
+Queue wait and launch latency per partition
+
+Usage:
+    python -m reframe_ncar.latency [--since DAYS] REPORT|DIR [...]
+
+Aggregates the job timings recorded by JobTimingMixin (see
+reframe_ncar.timing) over all test cases of the given run reports by
+system:partition, so that queue waits and launcher startup can be told
+apart from changes in application performance. Use the HelloTest probe
+(tests/helloworld.py, tag 'probe') to measure the pure launch overhead.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+from reframe_ncar.history import quantile
+from reframe_ncar.reports import load_reports
+
+# The timings of reframe_ncar.timing
+TIMINGS = ('queue_wait', 'module_load_time', 'prerun_time', 'launch_latency',
+           'first_step_time', 'time_to_first_step', 'job_runtime')
+
+
+def _summary(values):
+    if not values:
+        return {'count': 0, 'median': None, 'p90': None, 'max': None}
+
+    return {'count': len(values), 'median': quantile(values, 0.5),
+            'p90': quantile(values, 0.9), 'max': max(values)}
+
+
+def aggregate(reports, tests=None):
+    """Summarise the job timings of reports by partition
+
+    :arg tests: only include test cases whose name starts with one of these
+    :returns: {partition: {timing: {'count', 'median', 'p90', 'max'}}}
+    """
+    samples = {}
+    for report in reports:
+        for case in report.testcases().values():
+            if tests and not case.name.startswith(tuple(tests)):
+                continue
+
+            part = samples.setdefault(case.system,
+                                      {name: [] for name in TIMINGS})
+            for name in TIMINGS:
+                value = case.get(name)
+                if value is not None:
+                    part[name].append(value)
+
+    return {system: {name: _summary(values)
+                     for name, values in timings.items()}
+            for system, timings in sorted(samples.items())}
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.2f}'
+
+
+def print_table(summary):
+    print(f"{'partition':<24} {'timing':<18} {'count':>6} {'median':>9} "
+          f"{'p90':>9} {'max':>9}")
+    for system, timings in summary.items():
+        for name, s in timings.items():
+            print(f"{system:<24} {name:<18} {s['count']:>6} "
+                  f"{_fmt(s['median']):>9} {_fmt(s['p90']):>9} "
+                  f"{_fmt(s['max']):>9}")
+
+
+def print_csv(summary):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['partition', 'timing', 'count', 'median', 'p90', 'max'])
+    for system, timings in summary.items():
+        for name, s in timings.items():
+            writer.writerow([system, name, s['count'], s['median'], s['p90'],
+                             s['max']])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='latency',
+        description='Summarise queue waits and launch latencies by partition'
+    )
+    parser.add_argument('reports', nargs='+', metavar='REPORT',
+                        help='run reports or directories of run reports '
+                             '(searched recursively)')
+    parser.add_argument('-f', '--format', choices=['table', 'csv', 'json'],
+                        default='table', help='output format')
+    parser.add_argument('--since', type=float, metavar='DAYS',
+                        help='only include sessions of the last DAYS days')
+    parser.add_argument('-n', '--name', action='append', default=[],
+                        help='only include tests starting with NAME '
+                             '(may be repeated), e.g. HelloTest')
+    args = parser.parse_args(argv)
+
+    reports = load_reports(args.reports, recursive=True)
+    if args.since is not None:
+        start = time.time() - args.since*86400
+        reports = [r for r in reports if (r.time_start or 0) >= start]
+
+    summary = aggregate(reports, args.name)
+    if args.format == 'csv':
+        print_csv(summary)
+    elif args.format == 'json':
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(summary)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
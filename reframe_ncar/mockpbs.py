@@ -0,0 +1,415 @@
+"""
+Local stand-in for PBS
+
+Emulates qsub, qstat and qdel closely enough for ReFrame's PBS scheduler
+backends, running the jobs as local processes. It is meant for trying out
+scheduler related features without a cluster:
+
+    PATH=$PWD/launchers/mockpbs:$PATH reframe -C config.py --system mockpbs ...
+
+Like PBS, job output is spooled and only copied to the -o/-e paths when the
+job ends, and the time limit is enforced. Finished jobs are listed by qstat
+without -x for MOCKPBS_KEEP_COMPLETED seconds (default 300). Jobs wait
+MOCKPBS_QUEUE_DELAY seconds in the queue (default 2). Job records and a log
+of all commands (commands.log) are kept in MOCKPBS_SPOOL (default
+/tmp/mockpbs-<uid>).
+
+Usage:
+    python -m reframe_ncar.mockpbs {qsub,qstat,qdel} ARGS...
+"""
+
+import fcntl
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# PBS exit status of jobs killed by a signal
+SIGNAL_EXIT_BASE = 256
+
+SERVER = 'mockpbs'
+
+
+def spooldir():
+    path = os.environ.get('MOCKPBS_SPOOL', f'/tmp/mockpbs-{os.getuid()}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _record_file(jobid):
+    return os.path.join(spooldir(), f'{jobid}.json')
+
+
+def load(jobid):
+    try:
+        with open(_record_file(jobid)) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def save(record):
+    filename = _record_file(record['id'])
+    with open(f'{filename}.tmp', 'w') as fp:
+        json.dump(record, fp)
+
+    os.replace(f'{filename}.tmp', filename)
+
+
+def _next_id():
+    with open(os.path.join(spooldir(), 'seq'), 'a+') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        fp.seek(0)
+        seq = int(fp.read() or 0) + 1
+        fp.seek(0)
+        fp.truncate()
+        fp.write(str(seq))
+
+    return f'{seq}.{SERVER}'
+
+
+def _pbs_time(timestamp):
+    return time.strftime('%a %b %d %H:%M:%S %Y', time.localtime(timestamp))
+
+
+def _seconds(walltime):
+    seconds = 0
+    for part in walltime.split(':'):
+        seconds = 60*seconds + int(part)
+
+    return seconds
+
+
+# ============================================================================
+# qsub
+# ============================================================================
+
+def _parse_options(args, opts):
+    """Parse qsub options into opts; returns the remaining arguments"""
+    args = list(args)
+    rest = []
+    while args:
+        arg = args.pop(0)
+        if not arg.startswith('-') or len(arg) < 2:
+            rest.append(arg)
+            continue
+
+        flag, value = arg[:2], arg[2:]
+        if flag in ('-V', '-h') and not value:
+            continue
+
+        if not value and args:
+            value = args.pop(0)
+
+        if flag == '-l':
+            for res in value.split(','):
+                key, _, val = res.partition('=')
+                opts['resources'][key] = val
+        elif flag == '-W':
+            key, _, val = value.partition('=')
+            opts['attributes'][key] = val
+        else:
+            opts[flag] = value
+
+    return rest
+
+
+def _ncpus(select):
+    match = re.search(r'ncpus=(\d+)', select or '')
+    nodes = re.match(r'(\d+)', select or '')
+    return int(match.group(1) if match else 1) * int(nodes.group(1)
+                                                     if nodes else 1)
+
+
+def qsub(args):
+    opts = {'resources': {}, 'attributes': {}}
+    rest = _parse_options(args, opts)
+    if len(rest) != 1:
+        print('usage: qsub [options] script', file=sys.stderr)
+        return 2
+
+    script = os.path.abspath(rest[0])
+    cmdline_opts = dict(opts)
+    opts = {'resources': {}, 'attributes': {}}
+    try:
+        with open(script) as fp:
+            directives = [line.split()[1:] for line in fp
+                          if line.startswith('#PBS')]
+    except OSError as err:
+        print(f'qsub: script file cannot be loaded - {err}', file=sys.stderr)
+        return 2
+
+    for directive in directives:
+        _parse_options(directive, opts)
+
+    resources = dict(opts['resources'], **cmdline_opts.pop('resources'))
+    attributes = dict(opts['attributes'], **cmdline_opts.pop('attributes'))
+    opts.update(cmdline_opts)
+    jobid = _next_id()
+    workdir = os.getcwd()
+    name = opts.get('-N', os.path.basename(script))
+    home = os.path.expanduser('~')
+    seq = jobid.split('.')[0]
+    record = {
+        'id': jobid,
+        'name': name,
+        'state': 'Q',
+        'script': script,
+        'workdir': workdir,
+        'home': home,
+        'stdout': os.path.join(workdir, opts.get('-o', f'{name}.o{seq}')),
+        'stderr': os.path.join(workdir, opts.get('-e', f'{name}.e{seq}')),
+        'queue': opts.get('-q', 'workq'),
+        'account': opts.get('-A'),
+        'walltime': resources.get('walltime'),
+        'select': resources.get('select'),
+        'ctime': time.time(),
+        'stime': None,
+        'mtime': time.time(),
+        'exit_status': None,
+        'pid': None
+    }
+    save(record)
+    subprocess.Popen([sys.executable, '-m', 'reframe_ncar.mockpbs',
+                      '_run', jobid],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+    print(jobid, flush=True)
+    if attributes.get('block') == 'true':
+        # Like PBS, wait for the job and exit with its exit status
+        while True:
+            record = load(jobid)
+            if record['state'] == 'F':
+                return min(record['exit_status'], 255)
+
+            time.sleep(0.5)
+
+    return 0
+
+
+def _deleted(jobid):
+    return os.path.exists(os.path.join(spooldir(), f'{jobid}.deleted'))
+
+
+def run(jobid):
+    """Run a submitted job (internal)"""
+    record = load(jobid)
+    delay = _env_float('MOCKPBS_QUEUE_DELAY', 2)
+    deadline = time.time() + delay
+    while time.time() < deadline and not _deleted(jobid):
+        time.sleep(min(0.2, delay))
+
+    spool_out = os.path.join(spooldir(), f'{jobid}.OU')
+    spool_err = os.path.join(spooldir(), f'{jobid}.ER')
+    if _deleted(jobid):
+        record.update(state='F', mtime=time.time(),
+                      exit_status=SIGNAL_EXIT_BASE + signal.SIGTERM)
+        save(record)
+        return 0
+
+    ncpus = _ncpus(record['select'])
+    host = socket.gethostname().split('.')[0]
+    nodefile = os.path.join(spooldir(), f'{jobid}.nodes')
+    with open(nodefile, 'w') as fp:
+        fp.write(f'{host}\n' * ncpus)
+
+    env = dict(os.environ, PBS_JOBID=jobid, PBS_JOBNAME=record['name'],
+               PBS_O_WORKDIR=record['workdir'], PBS_NODEFILE=nodefile,
+               PBS_QUEUE=record['queue'])
+    with open(spool_out, 'w') as out, open(spool_err, 'w') as err:
+        # PBS starts jobs in the home directory
+        proc = subprocess.Popen(['bash', record['script']], cwd=record['home'],
+                                env=env, stdin=subprocess.DEVNULL,
+                                stdout=out, stderr=err,
+                                start_new_session=True)
+        record.update(state='R', stime=time.time(), mtime=time.time(),
+                      pid=proc.pid, exec_host=f'{host}/0*{ncpus}')
+        save(record)
+        walltime = record['walltime']
+        try:
+            returncode = proc.wait(_seconds(walltime) if walltime else None)
+        except subprocess.TimeoutExpired:
+            err.write(f'=>> PBS: job killed: walltime {walltime} '
+                      f'exceeded limit\n')
+            err.flush()
+            os.killpg(proc.pid, signal.SIGTERM)
+            returncode = proc.wait()
+
+    exit_status = (returncode if returncode >= 0
+                   else SIGNAL_EXIT_BASE - returncode)
+    for spool, dest in ((spool_out, record['stdout']),
+                        (spool_err, record['stderr'])):
+        try:
+            shutil.move(spool, dest)
+        except OSError:
+            pass
+
+    os.remove(nodefile)
+    record.update(state='F', mtime=time.time(), exit_status=exit_status)
+    save(record)
+    return 0
+
+
+# ============================================================================
+# qstat
+# ============================================================================
+
+def _attributes(record):
+    attrs = {
+        'Job_Name': record['name'],
+        'job_state': record['state'],
+        'queue': record['queue'],
+        'ctime': _pbs_time(record['ctime']),
+        'qtime': _pbs_time(record['ctime']),
+        'mtime': _pbs_time(record['mtime']),
+        'Output_Path': f"{SERVER}:{record['stdout']}",
+        'Error_Path': f"{SERVER}:{record['stderr']}",
+        'Resource_List': {'walltime': record['walltime'],
+                          'select': record['select']}
+    }
+    if record['account']:
+        attrs['Account_Name'] = record['account']
+
+    if record['stime']:
+        attrs['stime'] = _pbs_time(record['stime'])
+        attrs['exec_host'] = record['exec_host']
+
+    if record['state'] == 'F':
+        attrs['Exit_status'] = record['exit_status']
+
+    return attrs
+
+
+def _format_full(jobid, attrs):
+    lines = [f'Job Id: {jobid}']
+    for key, value in attrs.items():
+        if isinstance(value, dict):
+            lines += [f'    {key}.{k} = {v}' for k, v in value.items()
+                      if v is not None]
+        else:
+            lines.append(f'    {key} = {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _all_jobs():
+    return sorted((f[:-len('.json')] for f in os.listdir(spooldir())
+                   if f.endswith('.json')),
+                  key=lambda jobid: int(jobid.split('.')[0]))
+
+
+def qstat(args):
+    history = full = as_json = False
+    jobids = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '-F':
+            as_json = args.pop(0) == 'json'
+        elif arg.startswith('-') and not arg.startswith('-F'):
+            history |= 'x' in arg
+            full |= 'f' in arg
+        elif arg.startswith('-F'):
+            as_json = arg[2:] == 'json'
+        else:
+            jobids.append(arg)
+
+    keep = _env_float('MOCKPBS_KEEP_COMPLETED', 300)
+    returncode = 0
+    jobs = {}
+    for jobid in jobids or _all_jobs():
+        record = load(jobid)
+        if record is None:
+            print(f'qstat: Unknown Job Id {jobid}', file=sys.stderr)
+            returncode = 153
+            continue
+
+        if (record['state'] == 'F' and not history and
+            time.time() - record['mtime'] > keep):
+            if jobids:
+                print(f'qstat: {jobid} Job has finished, use -x or -H to '
+                      f'obtain historical job information', file=sys.stderr)
+                returncode = returncode or 35
+
+            continue
+
+        jobs[jobid] = _attributes(record)
+
+    if as_json:
+        print(json.dumps({'timestamp': int(time.time()),
+                          'pbs_version': 'mock',
+                          'pbs_server': SERVER,
+                          'Jobs': jobs}, indent=4))
+    elif full:
+        print('\n'.join(_format_full(jobid, attrs)
+                        for jobid, attrs in jobs.items()), end='')
+    elif jobs:
+        print(f"{'Job id':<17} {'Name':<16} {'User':<16} S Queue")
+        for jobid, attrs in jobs.items():
+            print(f"{jobid:<17} {attrs['Job_Name'][:16]:<16} "
+                  f"{os.environ.get('USER', ''):<16} "
+                  f"{attrs['job_state']} {attrs['queue']}")
+
+    return returncode
+
+
+# ============================================================================
+# qdel
+# ============================================================================
+
+def qdel(args):
+    returncode = 0
+    for jobid in (a for a in args if not a.startswith('-')):
+        record = load(jobid)
+        if record is None:
+            print(f'qdel: Unknown Job Id {jobid}', file=sys.stderr)
+            returncode = 153
+            continue
+
+        if record['state'] == 'F':
+            print(f'qdel: Job has finished {jobid}', file=sys.stderr)
+            returncode = 35
+            continue
+
+        open(os.path.join(spooldir(), f'{jobid}.deleted'), 'w').close()
+        if record['pid']:
+            try:
+                os.killpg(record['pid'], signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    return returncode
+
+
+COMMANDS = {'qsub': qsub, 'qstat': qstat, 'qdel': qdel}
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '_run':
+        return run(sys.argv[2])
+
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(__doc__, file=sys.stderr)
+        return 2
+
+    # Keep a log of the commands, e.g. to count the qstat calls
+    with open(os.path.join(spooldir(), 'commands.log'), 'a') as fp:
+        fp.write(f"{time.time():.3f} {' '.join(sys.argv[1:])}\n")
+
+    return COMMANDS[sys.argv[1]](sys.argv[2:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Run monitoring and short-window runs
+
+A badly regressed run otherwise runs to its time limit. Tests using
+RunMonitorMixin launch through reframe_ncar/watchdog.py, which follows the
+progress the application prints and kills the launch as soon as its
+projected runtime exceeds monitor_factor times the median runtime of the
+past runs of the test case, for the same parameters, partition and
+environment. The test then fails with a 'projected regression' error in the
+run phase, so its runtime is not taken into the history of past runs.
+
+    class MyTest(rfm.RegressionTest, RunMonitorMixin):
+        monitor_pattern = r'mtime\\s*[=:]\\s*(\\d+\\.?\\d*)'
+        monitor_total = 7200.0
+
+Runtimes are the job script wall clock times recorded by JobTimingMixin,
+as for the adaptive time limits. monitor_limit sets the limit in seconds
+instead. Otherwise, test cases with fewer than monitor_min_samples past
+runs are not monitored, nor are tests without a progress pattern or total;
+-S monitor_factor=0 turns the monitoring off. The watchdog also stamps the
+first progress line as the first time step (see reframe_ncar/timing.py).
+Since it pipes the output of the run, it is not put in front of launches
+without a limit or window unless -S measure_first_step=1 is given.
+
+With -S short_window=1, the run is stopped once short_window_steps steps
+past the warmup were timed. The runtime metric of the test is then the
+runtime extrapolated from these steps, next to
+
+    window_step_time    seconds per step in the window
+    warmup_time         seconds from the launch to the end of the warmup
+
+and the other performance variables of the test, which need a complete run,
+are not reported. The sanity function of the test returns its checks through
+short_window_sanity(), which replaces them for stopped runs:
+
+    @sanity_function
+    def validate(self):
+        return self.short_window_sanity(
+            sn.assert_found(r'completed successfully', self.stdout)
+        )
+
+Every short_window_calibrate_every days, judged by the past run reports, a
+test case runs to completion instead and reports the extrapolation_ratio of
+the extrapolated to the actual runtime, which has to be within
+short_window_tolerance of 1.
+"""
+
+import functools
+import os
+import re
+import shlex
+import time
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, run_before, variable
+from reframe.core.exceptions import PerformanceError
+
+import reframe_ncar.sanity as nsn
+from reframe_ncar import watchdog
+from reframe_ncar.cost import WALL_TIME_METRICS
+from reframe_ncar.history import history_paths, session_history
+from reframe_ncar.reports import load_reports
+from reframe_ncar.timing import TIMES_FILE, JobTimingMixin
+
+# Performance variable of the calibration runs
+CALIBRATION_METRIC = 'extrapolation_ratio'
+
+
+@functools.lru_cache()
+def _last_calibrations(paths):
+    """Start times of the last calibration run of every test case"""
+    last = {}
+    for report in load_reports(paths, recursive=True):
+        for key, case in report.testcases().items():
+            if CALIBRATION_METRIC in case.perf:
+                last[key] = report.time_start or 0
+
+    return last
+
+
+class RunMonitorMixin(rfm.RegressionMixin):
+    """Abort runs whose projected runtime exceeds their past runtimes"""
+
+    # Pattern of the progress lines; group 1 is the model time or step
+    monitor_pattern = variable(str, type(None), value=None)
+
+    # Progress at the end of the run; None for the simulated_time of the
+    # test
+    monitor_total = variable(float, type(None), value=None)
+
+    # Largest projected runtime as a multiple of the median past runtime; 0
+    # to turn the monitoring off
+    monitor_factor = variable(float, value=2.0)
+
+    # Largest projected runtime in seconds instead of the one from the
+    # history
+    monitor_limit = variable(float, type(None), value=None)
+
+    # Number of past runs needed to monitor a test case
+    monitor_min_samples = variable(int, value=3)
+
+    # Directories of past run reports, for the limits and the calibrations
+    # (default: see history_paths())
+    monitor_history = variable(typ.List[str], value=[])
+
+    # Performance variable of the runtime, replaced by the extrapolated
+    # runtime in short-window runs
+    monitor_metric = variable(str, type(None), value=None)
+
+    # Run the watchdog only to stamp the first time step, without a limit
+    # or window
+    measure_first_step = variable(typ.Bool, value=False)
+
+    # Fraction of the run done before projecting, skipping the warmup
+    monitor_min_progress = variable(float, value=0.05)
+
+    # Stop the run after timing a window of steps past the warmup
+    short_window = variable(typ.Bool, value=False)
+    short_window_steps = variable(int, value=100)
+
+    # The warmup ends when the time of the last short_window_stable_steps
+    # steps varies by at most short_window_stable_cv
+    short_window_stable_steps = variable(int, value=10)
+    short_window_stable_cv = variable(float, value=0.05)
+
+    # Days between calibration runs, 0 for none; set short_window_calibrate
+    # to force or skip the calibration
+    short_window_calibrate_every = variable(float, value=7.0)
+    short_window_calibrate = variable(typ.Bool, type(None), value=None)
+
+    # Largest relative error of the extrapolated runtime
+    short_window_tolerance = variable(float, value=0.1)
+
+    # Whether the run was stopped after the window; the runtimes of such
+    # runs are left out of the history
+    short_window_stopped = variable(typ.Bool, value=False)
+
+    def _runtime_metric(self):
+        if self.monitor_metric:
+            return self.monitor_metric
+
+        for name in WALL_TIME_METRICS:
+            if name in self.perf_variables:
+                return name
+
+        return 'walltime'
+
+    def _runtime_limit(self):
+        """The largest projected runtime, or None if the test case is not
+        monitored"""
+        if not self.monitor_factor:
+            return None
+
+        if self.monitor_limit is not None:
+            return self.monitor_limit
+
+        # A reference is shared by all parameters of a test, but the
+        # runtime depends on them
+        history = session_history(self.monitor_history)
+        key = (self.display_name, self.current_partition.fullname,
+               self.current_environ.name)
+        if len(history.samples(*key)) < self.monitor_min_samples:
+            return None
+
+        return self.monitor_factor * history.expected(*key)
+
+    def _calibration_due(self):
+        if self.short_window_calibrate is not None:
+            return self.short_window_calibrate
+
+        if not self.short_window_calibrate_every:
+            return False
+
+        key = (self.display_name, self.current_partition.fullname,
+               self.current_environ.name)
+        last = _last_calibrations(
+            history_paths(self.monitor_history)
+        ).get(key, 0)
+        return time.time() - last >= self.short_window_calibrate_every * 86400
+
+    @run_before('run', always_last=True)
+    def monitor_launch(self):
+        if not self.monitor_pattern:
+            return
+
+        # Projections need the progress at the end of the run
+        total = self.monitor_total or getattr(self, 'simulated_time', None)
+        projections = []
+        limit = self._runtime_limit()
+        if limit is not None:
+            projections += ['--limit', str(limit),
+                            '--min-progress', str(self.monitor_min_progress)]
+
+        if self.short_window:
+            projections += [
+                '--window', str(self.short_window_steps),
+                '--stable-steps', str(self.short_window_stable_steps),
+                '--stable-cv', str(self.short_window_stable_cv)
+            ]
+            if self._calibration_due():
+                projections.append('--calibrate')
+
+        options = []
+        if total and projections:
+            options += ['--total', str(total), *projections]
+        elif not self.measure_first_step:
+            # The watchdog pipes the output of the run, so it is only put in
+            # front of the launch when needed
+            return
+
+        if isinstance(self, JobTimingMixin):
+            # Stamp the first time step for the startup timings
+            options += ['--times', os.path.join(self.stagedir, TIMES_FILE)]
+
+        if not options:
+            return
+
+        self.job.launcher.modifier = 'python3'
+        self.job.launcher.modifier_options = [
+            watchdog.__file__,
+            '--pattern', shlex.quote(self.monitor_pattern), *options, '--'
+        ]
+
+    @run_after('run')
+    def check_projected_regression(self):
+        try:
+            with open(os.path.join(self.stagedir, self.job.stdout)) as fp:
+                found = re.findall(rf'^{re.escape(watchdog.MARKER)}: (.*)$',
+                                   fp.read(), re.MULTILINE)
+        except OSError:
+            return
+
+        if found:
+            raise PerformanceError(f'projected regression: {found[-1]}')
+
+    def _window_value(self, name):
+        return nsn.extractlast(
+            rf'^{re.escape(watchdog.WINDOW_MARKER)}:.*\b{name}=(\S+)',
+            self.stdout, 1, float
+        )
+
+    @run_after('run')
+    def set_short_window_perf_variables(self):
+        if not self.short_window:
+            return
+
+        try:
+            with open(os.path.join(self.stagedir, self.job.stdout)) as fp:
+                output = fp.read()
+        except OSError:
+            return
+
+        if watchdog.WINDOW_MARKER not in output:
+            # The run ended before the window; it is a complete run
+            return
+
+        projected = sn.make_performance_function(
+            self._window_value('projected'), 's'
+        )
+        if watchdog.FINISHED_MARKER in output:
+            elapsed = nsn.extractlast(
+                rf'^{re.escape(watchdog.FINISHED_MARKER)}: elapsed=(\S+)',
+                self.stdout, 1, float
+            )
+            self.perf_variables['projected_runtime'] = projected
+            self.perf_variables[CALIBRATION_METRIC] = (
+                sn.make_performance_function(
+                    self._window_value('projected') / elapsed, ''
+                )
+            )
+            self.reference[
+                f'{self.current_partition.fullname}:{CALIBRATION_METRIC}'
+            ] = (1.0, -self.short_window_tolerance,
+                 self.short_window_tolerance, '')
+            return
+
+        self.short_window_stopped = True
+        self.perf_variables = {
+            self._runtime_metric(): projected,
+            'window_step_time': sn.make_performance_function(
+                self._window_value('step'), 's'
+            ),
+            'warmup_time': sn.make_performance_function(
+                self._window_value('warmup'), 's'
+            )
+        }
+
+    def short_window_sanity(self, sanity):
+        """The sanity of the test, or the checks of a run stopped after the
+        window, to which the checks of a complete run do not apply"""
+        if not self.short_window_stopped:
+            return sanity
+
+        return sn.all([
+            sn.assert_eq(self.job.exitcode, 0,
+                         msg='the short-window run failed'),
+            sn.assert_found(rf'^{re.escape(watchdog.WINDOW_MARKER)}:',
+                            self.stdout, msg='no window was timed')
+        ])
@@ -0,0 +1,56 @@
+"""
+Node types of benchmarks
+
+Casper mixes nodes of several CPU and GPU generations in its partitions, and
+timings taken on different node types do not compare. Tests using
+NodeTypeMixin declare the node type they run on, which is requested as PBS
+chunk resources through extra_resources:
+
+    class MyTest(rfm.RegressionTest, NodeTypeMixin):
+        num_gpus_per_node = 4
+        gpu_type = 'a100'
+        mem = '100GB'
+
+Tests that do not declare a node type get the 'node_type' extra of the
+partition, e.g. {'cpu_type': 'skylake'}. A node type the partition does not
+define a resource for cannot be requested, so such test cases are skipped
+rather than run on whatever node PBS picks. The requested node type is
+recorded in the node_type variable, and thereby in the run report.
+"""
+
+import reframe as rfm
+from reframe.core.builtins import run_after, variable
+
+# Node type resources of the partitions, see pbs_node_resources in config.py
+NODE_RESOURCES = ('cpu_type', 'gpu_type', 'mem')
+
+
+class NodeTypeMixin(rfm.RegressionMixin):
+    """Request the declared node type from the scheduler"""
+
+    # Node type resources; None for the partition default
+    cpu_type = variable(str, type(None), value=None)
+    gpu_type = variable(str, type(None), value=None)
+    mem = variable(str, type(None), value=None)
+
+    # The requested node type, e.g. 'cpu_type=skylake,mem=100GB'
+    node_type = variable(str, value='')
+
+    @run_after('setup')
+    def request_node_type(self):
+        partition = self.current_partition
+        requested = dict(partition.extras.get('node_type', {}))
+        for name in NODE_RESOURCES:
+            if getattr(self, name) is not None:
+                requested[name] = getattr(self, name)
+
+        for name, value in requested.items():
+            self.skip_if(
+                not partition.get_resource(name, **{name: value}),
+                f'{partition.fullname} cannot request {name}={value}'
+            )
+            self.extra_resources.setdefault(name, {name: value})
+
+        self.node_type = ','.join(
+            f'{name}={value}' for name, value in sorted(requested.items())
+        )
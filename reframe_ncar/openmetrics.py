@@ -0,0 +1,223 @@
+"""
+OpenMetrics textfile exporter for performance variables
+
+Registers the ``openmetrics`` performance log handler type. Every
+performance variable is exported as a gauge, labelled with the system,
+partition, environment, test name and test parameters, into a textfile that
+node_exporter's textfile collector can scrape:
+
+    'handlers_perflog': [
+        {
+            'type': 'openmetrics',
+            'name': '/path/to/textfile_collector/reframe.prom',
+            'flush_interval': 10,
+            'max_age': 7 * 86400
+        }
+    ]
+
+Samples are collected in memory and the file is rewritten atomically (write
+to a temporary file, then rename) at most every ``flush_interval`` seconds
+and when ReFrame exits. Writers from concurrent sessions serialize on a
+lock file and merge their samples with the ones already in the file. The
+series of a test case are dropped when merging once its last completion is
+more than ``max_age`` seconds old (a week by default, 0 to keep them), so
+that renamed and removed tests do not linger in the file.
+"""
+
+import fcntl
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+
+from reframe.core.exceptions import LoggingError
+from reframe.core.logging import register_log_handler
+
+
+PREFIX = 'reframe'
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)$')
+
+# The unit label, which the performance series add last to the labels of
+# their test case
+_UNIT_RE = re.compile(r',unit="(?:[^"\\]|\\.)*"\}$')
+
+COMPLETION_METRIC = f'{PREFIX}_test_completion_timestamp_seconds'
+
+
+def _sanitize(name):
+    name = re.sub(r'[^a-zA-Z0-9_]', '_', str(name))
+    return name if re.match(r'[a-zA-Z_]', name) else f'_{name}'
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _labels(labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"'
+                          for k, v in labels) + '}'
+
+
+def _params(display_name):
+    """Parse the test parameters out of the display name"""
+    params = []
+    for item in display_name.split(' ')[1:]:
+        if item.startswith('%') and '=' in item:
+            name, value = item[1:].split('=', maxsplit=1)
+            params.append((_sanitize(name.replace('.', '_')), value))
+
+    return params
+
+
+class OpenMetricsHandler(logging.Handler):
+    """Collect performance records and write them as an OpenMetrics file"""
+
+    def __init__(self, filename, flush_interval=10, max_age=7 * 86400):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self._samples = {}
+        self._last_flush = 0
+        self._dirty = False
+
+    def _add_sample(self, metric, labels, value):
+        if value is None:
+            return
+
+        self._samples[(metric, _labels(labels))] = float(value)
+
+    def emit(self, record):
+        perfvalues = getattr(record, 'check_perfvalues', None)
+        display_name = getattr(record, 'check_display_name', None)
+        if not perfvalues or not display_name:
+            return
+
+        labels = [
+            ('system', getattr(record, 'check_system', '')),
+            ('partition', getattr(record, 'check_partition', '')),
+            ('environ', getattr(record, 'check_environ', '')),
+            ('test', display_name.split(' ')[0])
+        ] + _params(display_name)
+        for key, info in perfvalues.items():
+            value, ref, _, _, unit, _ = info
+            var = _sanitize(key.split(':')[-1])
+            var_labels = labels + [('unit', unit or '')]
+            self._add_sample(f'{PREFIX}_perf_{var}', var_labels, value)
+            self._add_sample(f'{PREFIX}_perf_{var}_reference',
+                             var_labels, ref)
+
+        result = getattr(record, 'check_result', None)
+        self._add_sample(f'{PREFIX}_test_success', labels,
+                         1 if result == 'pass' else 0)
+        self._add_sample(COMPLETION_METRIC, labels, time.time())
+        self._dirty = True
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _read_existing(self):
+        samples = {}
+        try:
+            with open(self.filename) as fp:
+                lines = fp.readlines()
+        except OSError:
+            return samples
+
+        for line in lines:
+            m = _SAMPLE_RE.match(line.strip())
+            if not m:
+                continue
+
+            # A bad line only loses its own sample
+            try:
+                samples[(m.group(1), m.group(2) or '')] = float(m.group(3))
+            except ValueError:
+                pass
+
+        return samples
+
+    def _expire(self, samples):
+        """The samples of the test cases completed within max_age"""
+        if not self.max_age:
+            return samples
+
+        completed = {labels: value
+                     for (metric, labels), value in samples.items()
+                     if metric == COMPLETION_METRIC}
+        oldest = time.time() - self.max_age
+
+        # Series of unknown age are kept
+        return {(metric, labels): value
+                for (metric, labels), value in samples.items()
+                if completed.get(_UNIT_RE.sub('}', labels), oldest) >= oldest}
+
+    def _write(self, samples):
+        families = {}
+        for (metric, labels), value in sorted(samples.items()):
+            families.setdefault(metric, []).append(f'{metric}{labels} '
+                                                   f'{value!r}')
+
+        dirname = os.path.dirname(self.filename)
+        fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.reframe-',
+                                       suffix='.prom.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                for metric, lines in families.items():
+                    fp.write(f'# TYPE {metric} gauge\n')
+                    fp.write('\n'.join(lines) + '\n')
+
+                fp.write('# EOF\n')
+
+            os.chmod(tmpname, 0o644)
+            os.replace(tmpname, self.filename)
+        except OSError:
+            os.unlink(tmpname)
+            raise
+
+    def flush(self):
+        if not self._dirty:
+            return
+
+        self.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(f'{self.filename}.lock', 'w') as lockfp:
+                fcntl.flock(lockfp, fcntl.LOCK_EX)
+                samples = self._read_existing()
+                samples.update(self._samples)
+                self._write(self._expire(samples))
+
+            self._dirty = False
+            self._last_flush = time.time()
+        except OSError as e:
+            raise LoggingError(f'could not write {self.filename!r}') from e
+        finally:
+            self.release()
+
+    def close(self):
+        try:
+            self.flush()
+        except LoggingError as e:
+            print(f'WARNING: {e}', file=sys.stderr)
+
+        super().close()
+
+
+@register_log_handler('openmetrics')
+def _create_openmetrics_handler(site_config, config_prefix):
+    filename = os.path.expandvars(
+        site_config.get(f'{config_prefix}/name') or 'perflogs/reframe.prom'
+    )
+    flush_interval = site_config.get(f'{config_prefix}/flush_interval')
+    if flush_interval is None:
+        flush_interval = 10
+
+    max_age = site_config.get(f'{config_prefix}/max_age')
+    if max_age is None:
+        max_age = 7 * 86400
+
+    return OpenMetricsHandler(filename, flush_interval, max_age)
@@ -0,0 +1,82 @@
+"""
+Runtime-aware ordering of test cases
+
+ReFrame submits test cases in the order of its dependency sort, which is
+essentially discovery order, so a two-hour benchmark found last starts last
+and stretches the whole session. This orders the test cases longest expected
+runtime first, using the history of each test case on its partition and
+falling back to its time limit. Since every partition has its own job slots,
+sorting all test cases this way orders each partition's queue.
+
+Dependencies are respected: a test case is never placed before the test
+cases it depends on, and a test case is prioritised by the longest chain of
+runtimes it heads, so that long dependency chains start early.
+"""
+
+import heapq
+
+from reframe.utility.typecheck import Duration
+
+
+def _seconds(value):
+    if value is None:
+        return None
+
+    return float(Duration(value)) if isinstance(value, str) else float(value)
+
+
+def estimate(case, history, default=0):
+    """The expected runtime of a test case in seconds
+
+    Uses the history of the test case on its partition, else the time limit
+    of the test or its partition, else default.
+    """
+    check, partition, environ = case
+    expected = None
+    if history is not None:
+        expected = history.expected(check.display_name, partition.fullname,
+                                    environ.name)
+
+    if expected is None:
+        expected = (_seconds(check.time_limit) or
+                    _seconds(partition.time_limit) or default)
+
+    return expected
+
+
+def order(testcases, history, default=0):
+    """Return testcases ordered longest expected runtime first
+
+    testcases must be topologically sorted, like the output of
+    reframe.frontend.dependencies.toposort(); their order is kept for
+    test cases with the same priority.
+    """
+    index = {case: i for i, case in enumerate(testcases)}
+    deps = {case: [d for d in case.deps if d in index] for case in testcases}
+    dependents = {case: [] for case in testcases}
+    for case in testcases:
+        for d in deps[case]:
+            dependents[d].append(case)
+
+    # Dependents always come after their dependencies, so visiting the
+    # test cases in reverse order ranks the dependents first
+    rank = {}
+    for case in reversed(testcases):
+        rank[case] = estimate(case, history, default) + max(
+            (rank[c] for c in dependents[case]), default=0
+        )
+
+    pending = {case: len(deps[case]) for case in testcases}
+    ready = [(-rank[c], index[c]) for c in testcases if not pending[c]]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, i = heapq.heappop(ready)
+        case = testcases[i]
+        ordered.append(case)
+        for c in dependents[case]:
+            pending[c] -= 1
+            if not pending[c]:
+                heapq.heappush(ready, (-rank[c], index[c]))
+
+    return ordered
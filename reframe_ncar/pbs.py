@@ -0,0 +1,75 @@
+"""
+PBS scheduler with adaptive polling
+
+ReFrame polls the outstanding jobs of every partition several times a
+second after each submission, running one qstat per partition each time.
+The 'pbs-adaptive' scheduler polls every job at an interval that grows with
+the age of the job: fast at first, so that short tests are noticed as soon
+as they finish, and backing off for long jobs. Whenever a job is due, a
+single qstat queries all outstanding jobs of all partitions using this
+scheduler. The intervals are partition sched_options:
+
+    'scheduler': 'pbs-adaptive',
+    'sched_options': {
+        'poll_min_interval': 1,     # seconds
+        'poll_max_interval': 60,
+        'poll_backoff': 0.1         # interval as a fraction of the job age
+    }
+
+Jobs are submitted without blocking; do not add -Wblock=true to the job
+options. Importing this module registers the scheduler.
+"""
+
+import time
+
+from reframe.core.backends import register_scheduler
+from reframe.core.schedulers.pbs import PbsProJobScheduler
+
+POLL_DEFAULTS = {
+    'poll_min_interval': 1,
+    'poll_max_interval': 60,
+    'poll_backoff': 0.1
+}
+
+
+@register_scheduler('pbs-adaptive')
+class AdaptivePbsScheduler(PbsProJobScheduler):
+    """PBS Pro scheduler polling jobs at intervals adapted to their age"""
+
+    # Outstanding jobs of all partitions by job id
+    _outstanding = {}
+
+    def __init__(self):
+        super().__init__()
+        for name, value in POLL_DEFAULTS.items():
+            setattr(self, f'_{name}', self.get_option(name) or value)
+
+        self.num_queries = 0
+
+    def poll_interval(self, job, now=None):
+        """The interval at which a job is polled"""
+        age = (now or time.time()) - (job.submit_time or 0)
+        return min(self._poll_max_interval,
+                   max(self._poll_min_interval, self._poll_backoff * age))
+
+    def poll(self, *jobs):
+        now = time.time()
+        for job in jobs:
+            if job is not None and job.jobid not in self._outstanding:
+                job._rfm_next_poll = now + self._poll_min_interval
+                self._outstanding[job.jobid] = job
+
+        outstanding = list(self._outstanding.values())
+        if not any(job._rfm_next_poll <= now for job in outstanding):
+            return
+
+        super().poll(*outstanding)
+        self.num_queries += 1
+        for job in outstanding:
+            if job.completed:
+                del self._outstanding[job.jobid]
+            else:
+                job._rfm_next_poll = now + self.poll_interval(job, now)
+
+        self.log(f'polled {len(outstanding)} job(s); '
+                 f'{len(self._outstanding)} outstanding')
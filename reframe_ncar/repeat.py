@@ -0,0 +1,241 @@
+"""
+Repeated runs and confidence intervals
+
+A single run of a benchmark is a single sample of a noisy measurement. With
+-S repeat=N, tests using RepeatMixin launch their executable N times within
+the same job, and therefore the same allocation:
+
+    reframe -C config.py -c tests/cm1/cm1_tests.py -n CM1SupercellBenchmark \\
+        -r -S repeat=5
+
+Every performance function of the test taking an output argument, the file
+to extract from instead of the stdout of the job, is evaluated on the output
+of each repetition:
+
+    @performance_function('s')
+    def walltime(self, output=None):
+        return sn.extractsingle(r'Total time:\\s+(\\S+)', output or self.stdout,
+                                1, float)
+
+It is reported as the median of the repetitions, together with
+
+    <name>_mean                 the mean of the repetitions
+    <name>_cv                   their coefficient of variation
+    <name>_ci_lower/_ci_upper   the bootstrap confidence interval of the
+                                median (repeat_confidence, by default 95%)
+
+With -S repeat_reject_outliers=1, repetitions outside the Tukey fences
+(1.5 interquartile ranges beyond the quartiles) are dropped first.
+
+The reference of a variable is checked against its interval rather than a
+single sample: the thresholds are widened by the width of the interval on
+either side of the median, so that a test fails only if the whole interval
+lies outside the reference bounds. Other performance variables, such as
+the job timings, are reported for the job as a whole.
+
+The time limit of the job, adapted from the history of single runs or
+declared, is multiplied by the number of repetitions, and the runtimes of
+repeated jobs are left out of the history.
+"""
+
+import inspect
+import os
+import random
+import statistics
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, run_before, variable
+
+from reframe_ncar.history import quantile
+from reframe_ncar.timing import TIMES_FILE, JobTimingMixin, _stamp
+
+# Line printed to the stdout before every repetition
+MARKER = '==> rfm repetition'
+
+# Per-repetition output files in the stage directory
+REPEAT_FILE = 'rfm_repeat_{}.out'
+
+
+def reject_outliers(values):
+    """The values within the Tukey fences of values"""
+    if len(values) < 4:
+        return list(values)
+
+    q1, q3 = quantile(values, 0.25), quantile(values, 0.75)
+    lower, upper = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    return [v for v in values if lower <= v <= upper]
+
+
+def bootstrap_interval(values, confidence=0.95, samples=1000, seed=0):
+    """The percentile bootstrap confidence interval of the median of values"""
+    if len(values) < 2:
+        return values[0], values[0]
+
+    rng = random.Random(seed)
+    medians = [statistics.median(rng.choices(values, k=len(values)))
+               for _ in range(samples)]
+    alpha = (1 - confidence) / 2
+    return quantile(medians, alpha), quantile(medians, 1 - alpha)
+
+
+def summarize(values, confidence=0.95, samples=1000):
+    """Mean, median, coefficient of variation and confidence interval of
+    values"""
+    mean = statistics.fmean(values)
+    cv = 0.0
+    if len(values) > 1 and mean:
+        cv = statistics.stdev(values) / abs(mean)
+
+    lower, upper = bootstrap_interval(values, confidence, samples)
+    return {'mean': mean, 'median': statistics.median(values), 'cv': cv,
+            'ci_lower': lower, 'ci_upper': upper}
+
+
+class RepeatMixin(rfm.RegressionMixin):
+    """Repeat the run within the job and report statistics of the
+    repetitions"""
+
+    # Runs of the executable per job
+    repeat = variable(int, value=1)
+
+    # Drop repetitions outside the Tukey fences
+    repeat_reject_outliers = variable(typ.Bool, value=False)
+
+    # Confidence level and bootstrap resamples of the intervals
+    repeat_confidence = variable(float, value=0.95)
+    repeat_bootstrap = variable(int, value=1000)
+
+    # Values of the repetitions by performance variable
+    repeat_values = variable(typ.Dict[str, typ.List[float]], value={})
+
+    @run_before('run')
+    def scale_time_limit(self):
+        if self.repeat <= 1:
+            return
+
+        time_limit = self.time_limit or typ.Duration(
+            self.current_partition.time_limit or 0
+        )
+        if time_limit:
+            self.time_limit = time_limit * self.repeat
+
+    @run_before('run', always_last=True)
+    def repeat_launch(self):
+        if self.repeat <= 1:
+            return
+
+        # The loop encloses only the launch, whichever hooks add commands
+        # before or after it
+        loop = [f'for rfm_repetition in $(seq {self.repeat}); do',
+                f'echo "{MARKER} $rfm_repetition"']
+        if isinstance(self, JobTimingMixin):
+            # The launch latency is that of the last repetition
+            loop.append(_stamp('launch',
+                               os.path.join(self.stagedir, TIMES_FILE)))
+
+        self.prerun_cmds = self.prerun_cmds + loop
+        self.postrun_cmds = ['done'] + self.postrun_cmds
+
+    @run_after('run')
+    def split_repetitions(self):
+        if self.repeat <= 1:
+            return
+
+        try:
+            with open(os.path.join(self.stagedir, self.job.stdout)) as fp:
+                lines = fp.readlines()
+        except OSError:
+            return
+
+        index, outputs = None, {}
+        for line in lines:
+            if line.startswith(MARKER):
+                index = int(line.split()[-1])
+                outputs[index] = []
+            elif index is not None:
+                outputs[index].append(line)
+
+        for index, output in outputs.items():
+            filename = os.path.join(self.stagedir, REPEAT_FILE.format(index))
+            with open(filename, 'w') as fp:
+                fp.writelines(output)
+
+    def _takes_output(self, name):
+        """Whether name is a performance function taking the output"""
+        try:
+            params = inspect.signature(getattr(self, name)).parameters
+        except (AttributeError, TypeError, ValueError):
+            return False
+
+        return 'output' in params
+
+    def _repetition_values(self, names):
+        values = {name: [] for name in names}
+        index = 1
+        while True:
+            output = os.path.join(self.stagedir, REPEAT_FILE.format(index))
+            if not os.path.exists(output):
+                return values
+
+            for name in names:
+                try:
+                    values[name].append(
+                        float(sn.evaluate(getattr(self, name)(output)))
+                    )
+                except Exception:
+                    # A failed repetition has no value
+                    pass
+
+            index += 1
+
+    def _widen_reference(self, name, stats):
+        key = f'{self.current_partition.fullname}:{name}'
+        try:
+            ref, lower, upper, *unit = self.reference[key]
+        except (KeyError, ValueError):
+            return
+
+        if ref <= 0:
+            return
+
+        # The median passes the widened thresholds if the interval
+        # overlaps the original bounds
+        median = stats['median']
+        if lower is not None:
+            lower = max(lower - (stats['ci_upper'] - median) / ref, -1)
+
+        if upper is not None:
+            upper += (median - stats['ci_lower']) / ref
+
+        self.reference[key] = (ref, lower, upper, *unit)
+
+    @run_before('performance')
+    def add_repeat_perf_variables(self):
+        if self.repeat <= 1:
+            return
+
+        names = [n for n in self.perf_variables if self._takes_output(n)]
+        for name, values in self._repetition_values(names).items():
+            if self.repeat_reject_outliers:
+                values = reject_outliers(values)
+
+            if not values:
+                continue
+
+            self.repeat_values[name] = values
+            stats = summarize(values, self.repeat_confidence,
+                              self.repeat_bootstrap)
+            unit = self.perf_variables[name].unit
+            self.perf_variables[name] = sn.make_performance_function(
+                sn.defer(stats['median']), unit
+            )
+            for stat in ('mean', 'cv', 'ci_lower', 'ci_upper'):
+                self.perf_variables[f'{name}_{stat}'] = (
+                    sn.make_performance_function(
+                        sn.defer(stats[stat]), '' if stat == 'cv' else unit
+                    )
+                )
+
+            self._widen_reference(name, stats)
@@ -0,0 +1,217 @@
+"""
+Compare performance between ReFrame sessions
+
+Usage:
+    python -m reframe_ncar.report_diff BASE.json NEW.json [NEW.json ...]
+
+Test cases are matched on test name and parameters, system:partition and
+environment. Every session after the first is compared against the first
+one. Changes beyond the threshold are flagged as regressions or
+improvements, based on the reference thresholds or, if not available, the
+unit of the performance variable.
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+from reframe_ncar.reports import Report
+
+
+RED, GREEN, RESET = '\033[31m', '\033[32m', '\033[0m'
+
+# Units where a larger value is better
+HIGHER_IS_BETTER = ('/s', '/h', 'x', '%', 'GFLOPS', 'flops')
+
+
+def higher_is_better(perf):
+    """Return True/False if higher/lower values are better, None if
+    unknown"""
+    lower, upper = perf.lower, perf.upper
+    if lower is None and upper is not None:
+        return False
+
+    if upper is None and lower is not None:
+        return True
+
+    unit = perf.unit or ''
+    if unit.endswith(HIGHER_IS_BETTER):
+        return True
+
+    if unit in ('s', 'ms', 'us', 'min', 'h'):
+        return False
+
+    return None
+
+
+def status(base, value, better_high, threshold):
+    if base is None:
+        return 'new'
+
+    if value is None:
+        return 'missing'
+
+    if base == 0 or better_high is None:
+        return 'changed' if value != base else 'same'
+
+    rel = (value - base) / abs(base)
+    if abs(rel) <= threshold:
+        return 'same'
+
+    return 'improvement' if (rel > 0) == better_high else 'regression'
+
+
+def diff(reports, threshold=0.05):
+    """Compare reports[1:] against reports[0]
+
+    :returns: a list of rows, one per test case and performance variable.
+    """
+    cases = [r.testcases() for r in reports]
+    keys = list(cases[0])
+    for other in cases[1:]:
+        keys += [k for k in other if k not in cases[0]]
+
+    keys = list(dict.fromkeys(keys))
+    rows = []
+    for key in keys:
+        base_case = cases[0].get(key)
+        metrics = {}
+        for session in cases:
+            if key in session:
+                metrics.update(session[key].perf)
+
+        for var, perf in metrics.items():
+            base = base_case.perf.get(var) if base_case else None
+            base_value = base.value if base else None
+            better_high = higher_is_better(base or perf)
+            row = {
+                'test': key[0],
+                'system': key[1],
+                'environ': key[2],
+                'metric': var,
+                'unit': perf.unit,
+                'baseline': base_value,
+                'sessions': []
+            }
+            for report, session in zip(reports[1:], cases[1:]):
+                case = session.get(key)
+                new = case.perf.get(var) if case else None
+                value = new.value if new else None
+                delta = rel_delta = None
+                if value is not None and base_value is not None:
+                    delta = value - base_value
+                    if base_value:
+                        rel_delta = delta / abs(base_value)
+
+                row['sessions'].append({
+                    'session': report.label,
+                    'value': value,
+                    'delta': delta,
+                    'rel_delta': rel_delta,
+                    'status': status(base_value, value, better_high,
+                                     threshold)
+                })
+
+            rows.append(row)
+
+    return rows
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+
+    return f'{value:.4g}'
+
+
+def print_table(rows, reports, color, only_changed, fp=sys.stdout):
+    header = ['test', 'system', 'environ', 'metric', 'unit',
+              reports[0].label] + [r.label for r in reports[1:]]
+    lines = []
+    colors = []
+    for row in rows:
+        if only_changed and all(s['status'] == 'same'
+                                for s in row['sessions']):
+            continue
+
+        cells = [row['test'], row['system'], row['environ'], row['metric'],
+                 row['unit'] or '', _fmt(row['baseline'])]
+        cell_colors = [None] * len(cells)
+        for s in row['sessions']:
+            cell = _fmt(s['value'])
+            if s['rel_delta'] is not None:
+                cell += f" ({100*s['rel_delta']:+.1f}%)"
+
+            cells.append(cell)
+            cell_colors.append({'regression': RED,
+                                'improvement': GREEN}.get(s['status']))
+
+        lines.append(cells)
+        colors.append(cell_colors)
+
+    widths = [max(len(str(c)) for c in col) for col in zip(header, *lines)]
+    print('  '.join(h.ljust(w) for h, w in zip(header, widths)), file=fp)
+    print('  '.join('-'*w for w in widths), file=fp)
+    for cells, cell_colors in zip(lines, colors):
+        out = []
+        for cell, width, c in zip(cells, widths, cell_colors):
+            cell = cell.ljust(width)
+            out.append(f'{c}{cell}{RESET}' if (c and color) else cell)
+
+        print('  '.join(out).rstrip(), file=fp)
+
+
+def print_csv(rows, fp=sys.stdout):
+    writer = csv.writer(fp)
+    writer.writerow(['test', 'system', 'environ', 'metric', 'unit',
+                     'baseline', 'session', 'value', 'delta', 'rel_delta',
+                     'status'])
+    for row in rows:
+        for s in row['sessions']:
+            writer.writerow([row['test'], row['system'], row['environ'],
+                             row['metric'], row['unit'], row['baseline'],
+                             s['session'], s['value'], s['delta'],
+                             s['rel_delta'], s['status']])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='report_diff',
+        description='Compare performance between ReFrame run reports'
+    )
+    parser.add_argument('reports', nargs='+', metavar='REPORT',
+                        help='run reports; the first one is the baseline')
+    parser.add_argument('-f', '--format', choices=['table', 'csv', 'json'],
+                        default='table', help='output format')
+    parser.add_argument('-t', '--threshold', type=float, default=0.05,
+                        help='relative change ignored as noise '
+                             '(default: 0.05)')
+    parser.add_argument('--only-changed', action='store_true',
+                        help='only show metrics that changed')
+    parser.add_argument('--no-color', action='store_true',
+                        help='do not colour regressions/improvements')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='exit with status 1 if there are regressions')
+    args = parser.parse_args(argv)
+    if len(args.reports) < 2:
+        parser.error('at least two reports are required')
+
+    reports = [Report(filename) for filename in args.reports]
+    rows = diff(reports, args.threshold)
+    if args.format == 'csv':
+        print_csv(rows)
+    elif args.format == 'json':
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    else:
+        color = not args.no_color and sys.stdout.isatty()
+        print_table(rows, reports, color, args.only_changed)
+
+    regressed = any(s['status'] == 'regression'
+                    for row in rows for s in row['sessions'])
+    return 1 if (regressed and args.fail_on_regression) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Access to ReFrame run reports
+
+Normalizes the test cases of the JSON run reports written to
+reports/run-report-{sessionid}.json, so that tools do not have to care about
+the report data version. Test cases are identified by their display name
+(test name plus parameters), system:partition and environment.
+
+Test cases skipped because their result was cached (see
+reframe_ncar/resultcache.py) are read as passed test cases with the stored
+performance values and the performance variable 'cached' set to 1.
+"""
+
+import collections
+import glob
+import json
+import os
+
+
+# A single performance value of a test case
+Perf = collections.namedtuple(
+    'Perf', ['value', 'reference', 'lower', 'upper', 'unit', 'result']
+)
+
+
+class TestCase:
+    """A test case record of a run report"""
+
+    def __init__(self, record, session):
+        self.record = record
+        self.session = session
+        self.name = record.get('display_name') or record['name']
+        self.result = record.get('result')
+        if 'partition' in record:
+            self.system = f"{record['system']}:{record['partition']}"
+            self.environ = record['environ']
+        else:
+            # Report data version 3.x
+            self.system = record['system']
+            self.environ = record['environment']
+
+        self.perf = self._perfvalues(record)
+        if self.result == 'skip' and record.get('result_cached'):
+            self.result = 'pass'
+            self.perf = {
+                name: Perf(value, None, None, None, unit, None)
+                for name, (value, unit) in
+                record.get('result_cached_perfvalues', {}).items()
+            }
+            self.perf['cached'] = Perf(1, None, None, None, '', None)
+
+    @staticmethod
+    def _perfvalues(record):
+        perf = {}
+        if 'perfvalues' in record:
+            for key, values in (record['perfvalues'] or {}).items():
+                var = key.split(':')[-1]
+                perf[var] = Perf(*values)
+        else:
+            for pv in record.get('perfvars') or []:
+                perf[pv['name']] = Perf(pv['value'], pv['reference'],
+                                        pv['thres_lower'], pv['thres_upper'],
+                                        pv['unit'], None)
+
+        return perf
+
+    @property
+    def key(self):
+        return (self.name, self.system, self.environ)
+
+    @property
+    def basename(self):
+        """The test class name without the parameters"""
+        return self.name.split(' ')[0]
+
+    @property
+    def params(self):
+        """The test parameters as parsed from the display name"""
+        params = {}
+        for item in self.name.split(' ')[1:]:
+            if item.startswith('%') and '=' in item:
+                name, value = item[1:].split('=', maxsplit=1)
+                params[name] = value
+
+        return params
+
+    def get(self, name, default=None):
+        return self.record.get(name, default)
+
+
+class Report:
+    """A ReFrame run report"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename) as fp:
+            self.data = json.load(fp)
+
+        self.session_info = self.data.get('session_info', {})
+        self.label = os.path.splitext(os.path.basename(filename))[0]
+        if self.label.startswith('run-report-'):
+            self.label = self.label[len('run-report-'):]
+
+    @property
+    def time_start(self):
+        return self.session_info.get('time_start_unix')
+
+    def testcases(self):
+        """Return the final test cases of the session by key
+
+        Later runs of the same session are retries, so they replace the
+        earlier entries.
+        """
+        cases = {}
+        for run in self.data.get('runs', []):
+            for record in run.get('testcases', []):
+                case = TestCase(record, self)
+                cases[case.key] = case
+
+        return cases
+
+
+def load_reports(paths, recursive=False):
+    """Load the reports found in paths, expanding directories, in time
+    order"""
+    pattern = os.path.join('**', '*.json') if recursive else '*.json'
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames += glob.glob(os.path.join(path, pattern),
+                                   recursive=recursive)
+        else:
+            filenames.append(path)
+
+    reports = []
+    for filename in filenames:
+        try:
+            reports.append(Report(filename))
+        except (OSError, ValueError, KeyError, AttributeError):
+            continue
+
+    return sorted(reports, key=lambda r: r.time_start or 0)
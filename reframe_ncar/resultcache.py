@@ -0,0 +1,192 @@
+"""
+Reuse of benchmark results
+
+A benchmark whose inputs did not change measures nothing new. With
+-S result_cache=1, every test case using ResultCacheMixin that passes
+stores its performance values and stdout under result_cache_dir, together
+with its fingerprint: the inputs of ChangeImpactMixin plus the hash of the
+binary and the processor and devices of the partition. A later test case
+with the same fingerprint, within result_cache_max_age, is skipped after
+its build instead of submitting its job. Its stored performance values are
+sent to the performance log handlers, such as the OpenMetrics exporter,
+with the performance variable 'cached' set to 1 (0 for test cases that
+ran). They are also recorded in the run report as result_cached_perfvalues,
+and the reports of reframe_ncar.reports turn the test case into a passed
+one with these values:
+
+    reframe -C config.py -c tests/cm1/cm1_tests.py -n CM1SupercellBenchmark \\
+        -r -S result_cache=1
+
+Any change of the fingerprint invalidates the stored result. The binary is
+result_cache_binary, relative to the stage directory or looked up in PATH,
+by default the executable of the test. Test cases whose binary cannot be
+found are always run. ReFrame itself lists cached test cases as skipped.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import reframe.utility.sanity as sn
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, run_before, variable
+from reframe.core.logging import getperflogger
+
+from reframe_ncar.history import history_paths
+from reframe_ncar.impact import ChangeImpactMixin, tree_hash
+
+RESULT_FILE = 'result.json'
+STDOUT_FILE = 'stdout'
+
+# Default age of the stored results that are reused
+MAX_AGE = 14 * 86400
+
+
+def default_cache_dir():
+    """The result cache next to the past run reports"""
+    return os.environ.get(
+        'RFM_NCAR_RESULT_CACHE',
+        os.path.join(history_paths()[0], 'result_cache')
+    )
+
+
+class ResultCacheMixin(ChangeImpactMixin):
+    """Report the stored results of unchanged benchmarks instead of running
+    them"""
+
+    # Reuse and store results
+    result_cache = variable(typ.Bool, value=False)
+
+    # Rerun test cases whose stored result is older than this
+    result_cache_max_age = variable(typ.Duration, value=MAX_AGE,
+                                    allow_implicit=True)
+
+    # Directory of the stored results (default: see default_cache_dir())
+    result_cache_dir = variable(str, value='')
+
+    # The binary of the test; None for the executable
+    result_cache_binary = variable(str, type(None), value=None)
+
+    # Whether the results of the test case were taken from the cache, and
+    # the stored performance values as [value, unit] by name
+    result_cached = variable(typ.Bool, value=False)
+    result_cached_perfvalues = variable(dict, value={})
+
+    def _cache_entry(self):
+        key = (f'{self.display_name}:{self.current_partition.fullname}:'
+               f'{self.current_environ.name}')
+        return os.path.join(
+            os.path.expandvars(self.result_cache_dir or default_cache_dir()),
+            hashlib.sha256(key.encode()).hexdigest()[:16]
+        )
+
+    def _binary(self):
+        binary = (self.result_cache_binary or
+                  getattr(self, 'executable', '').split(' ')[0])
+        if not binary:
+            return None
+
+        path = os.path.join(self.stagedir, binary)
+        if os.path.isfile(path):
+            return path
+
+        return shutil.which(binary)
+
+    def result_fingerprint(self):
+        """The fingerprint of the result, or None if the binary is not
+        found"""
+        binary = self._binary()
+        if binary is None:
+            return None
+
+        processor = self.current_partition.processor
+        devices = [(d.type, d.arch, d.num_devices)
+                   for d in self.current_partition.devices]
+        inputs = [self.change_fingerprint or self.fingerprint(),
+                  tree_hash(binary), processor.arch, processor.num_cpus,
+                  devices]
+        return hashlib.sha256(repr(inputs).encode()).hexdigest()
+
+    def _stored_result(self, fingerprint):
+        try:
+            with open(os.path.join(self._cache_entry(), RESULT_FILE)) as fp:
+                result = json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+        age = time.time() - result.get('time', 0)
+        if (result.get('fingerprint') != fingerprint or
+            age >= self.result_cache_max_age):
+            return None
+
+        return result
+
+    @run_after('compile', always_last=True)
+    def reuse_result(self):
+        """Skip the run of test cases with a stored result"""
+        if not self.result_cache:
+            return
+
+        self._rfm_result_fingerprint = self.result_fingerprint()
+        result = self._stored_result(self._rfm_result_fingerprint)
+        if result is None:
+            return
+
+        # The stored values are merged back into the test case when the
+        # report is read
+        self.result_cached = True
+        self.result_cached_perfvalues = result['perfvalues']
+        self.log_cached_result()
+        self.skip(f'reusing the result of {time.ctime(result["time"])}')
+
+    def log_cached_result(self):
+        """Send the stored performance values to the performance log
+        handlers, since ReFrame logs no performance of skipped test cases"""
+        partition = self.current_partition.fullname
+        perfvalues = {
+            f'{partition}:{name}': (value, None, None, None, unit, 'pass')
+            for name, (value, unit) in self.result_cached_perfvalues.items()
+        }
+        perfvalues[f'{partition}:cached'] = (1, None, None, None, '', 'pass')
+        getperflogger(self).log(logging.INFO, 'cached result', extra={
+            'check_partition': self.current_partition.name,
+            'check_environ': self.current_environ.name,
+            'check_result': 'pass',
+            'check_perfvalues': perfvalues
+        })
+
+    @run_before('performance', always_last=True)
+    def report_cached(self):
+        if not self.result_cache:
+            return
+
+        self.perf_variables['cached'] = sn.make_performance_function(
+            sn.defer(0), ''
+        )
+
+    @run_after('performance')
+    def store_result(self):
+        fingerprint = getattr(self, '_rfm_result_fingerprint', None)
+        if fingerprint is None:
+            return
+
+        perfvalues = {}
+        for key, (value, *_, unit, _) in self.perfvalues.items():
+            name = key.split(':')[-1]
+            if name != 'cached':
+                perfvalues[name] = [value, unit]
+
+        entry = self._cache_entry()
+        os.makedirs(entry, exist_ok=True)
+        shutil.copy(os.path.join(self.stagedir, self.stdout.evaluate()),
+                    os.path.join(entry, STDOUT_FILE))
+        result = {'fingerprint': fingerprint, 'time': time.time(),
+                  'test': self.display_name, 'perfvalues': perfvalues}
+        tmpfile = os.path.join(entry, f'{RESULT_FILE}.tmp')
+        with open(tmpfile, 'w') as fp:
+            json.dump(result, fp, indent=2)
+
+        os.replace(tmpfile, os.path.join(entry, RESULT_FILE))
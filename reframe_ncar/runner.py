@@ -0,0 +1,87 @@
+"""
+Run reframe with runtime-aware test ordering
+
+Runs the reframe command line with its test cases ordered longest expected
+runtime first (see reframe_ncar.ordering). Expected runtimes come from the
+run reports found under the history directories. All options other than the
+ones below are passed on to reframe.
+
+Usage:
+    python -m reframe_ncar.runner [--history DIR ...] -- -C config.py -c tests/ -r
+"""
+
+import argparse
+import os
+import sys
+
+
+def _use_reframe(path):
+    """Make the reframe installation of a bin/reframe script importable"""
+    prefix = os.path.dirname(os.path.dirname(os.path.realpath(path)))
+    if os.path.isdir(os.path.join(prefix, 'reframe')):
+        sys.path[:0] = [prefix, os.path.join(prefix, 'external')]
+
+
+def install(history, default=0):
+    """Order the test cases of reframe's dependency sort by runtime"""
+    import reframe.frontend.dependencies as dependencies
+    from reframe.core.logging import getlogger
+
+    from reframe_ncar import ordering
+
+    toposort = dependencies.toposort
+
+    def ordered_toposort(graph, is_subgraph=False):
+        testcases = ordering.order(toposort(graph, is_subgraph),
+                                   history, default)
+        for case in testcases:
+            getlogger().debug(
+                f'expected runtime of {case}: '
+                f'{ordering.estimate(case, history, default):.0f}s'
+            )
+
+        return testcases
+
+    dependencies.toposort = ordered_toposort
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run reframe ordering the tests by expected runtime',
+        usage='%(prog)s [options] -- REFRAME_OPTIONS'
+    )
+    parser.add_argument('--history', action='append', default=[],
+                        help='directory of past run reports '
+                             '(may be repeated; default: reports)')
+    parser.add_argument('--window', type=int, default=10,
+                        help='number of past sessions per test case '
+                             '(default: %(default)s)')
+    parser.add_argument('--default-runtime', default='10m',
+                        help='runtime of tests without history or time '
+                             'limit (default: %(default)s)')
+    parser.add_argument('--reframe',
+                        help='bin/reframe script of the installation to use')
+    args, rfm_args = parser.parse_known_args()
+    if rfm_args[:1] == ['--']:
+        rfm_args = rfm_args[1:]
+
+    if args.reframe:
+        _use_reframe(args.reframe)
+
+    from reframe.utility.typecheck import Duration
+
+    from reframe_ncar.history import load_history
+
+    # Tests adapting their time limits use the same history
+    paths = args.history or ['reports']
+    os.environ['RFM_NCAR_HISTORY'] = os.pathsep.join(paths)
+    history = load_history(paths, args.window)
+    install(history, Duration(args.default_runtime))
+    from reframe.frontend.cli import main as reframe_main
+
+    sys.argv = [args.reframe or 'reframe'] + rfm_args
+    return reframe_main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Sanity helpers for large application logs
+
+Drop-in replacements for the file based sn.assert_found, sn.assert_not_found
+and sn.extractsingle deferrables. Files are memory-mapped instead of read
+into memory, completion markers are searched from the end of the file
+backwards, and scan results are cached per file so that several sanity and
+performance functions on the same stdout/stderr only scan it once.
+"""
+
+import collections
+import mmap
+import os
+import re
+
+import reframe.utility.sanity as sn
+from reframe.core.exceptions import SanityError
+
+# Size of the first window searched at the end of a file; doubled until a
+# match is found or the whole file has been searched
+TAIL_WINDOW = 64 * 1024
+
+# Maximum number of files kept mapped at the same time
+CACHE_SIZE = 64
+
+
+def _format(s, *args):
+    try:
+        return s.format(*args)
+    except (IndexError, KeyError):
+        return s
+
+
+class _MappedLog:
+    """Read-only memory map of a log file with cached search results"""
+
+    def __init__(self, path):
+        self._fp = open(path, 'rb')
+        size = os.fstat(self._fp.fileno()).st_size
+        if size:
+            self.data = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # Empty files cannot be mapped
+            self.data = b''
+
+        self._results = {}
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+        self._fp.close()
+
+    def last_match(self, regex):
+        """Return the last match of regex, searching backwards in windows"""
+        key = ('last', regex.pattern)
+        if key in self._results:
+            return self._results[key]
+
+        match, size, window = None, len(self.data), TAIL_WINDOW
+        while True:
+            start = max(size - window, 0)
+            for m in regex.finditer(self.data, start):
+                match = m
+
+            if match is not None or start == 0:
+                break
+
+            window *= 2
+
+        self._results[key] = match
+        return match
+
+    def first_match(self, regex):
+        """Return the first match of regex, scanning from the start"""
+        key = ('first', regex.pattern)
+        if key not in self._results:
+            self._results[key] = regex.search(self.data)
+
+        return self._results[key]
+
+
+_cache = collections.OrderedDict()
+
+
+def _mapped(filename):
+    """Return the cached map of filename, remapping it if it has changed"""
+    path = os.path.abspath(filename)
+    try:
+        st = os.stat(path)
+        key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+        log = _MappedLog(path)
+    except OSError as e:
+        raise SanityError(f'{filename}: {e.strerror}')
+
+    # Drop stale maps of the same file and the least recently used ones
+    for k in [k for k in _cache if k[0] == path]:
+        _cache.pop(k).close()
+
+    _cache[key] = log
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)[1].close()
+
+    return log
+
+
+def _compile(patt, encoding):
+    return re.compile(patt.encode(encoding), re.MULTILINE)
+
+
+def clear_cache():
+    """Unmap all cached files"""
+    while _cache:
+        _cache.popitem()[1].close()
+
+
+def contains(patt, filename, encoding='utf-8'):
+    """Non-deferred version of found()"""
+    log = _mapped(filename)
+    return log.last_match(_compile(patt, encoding)) is not None
+
+
+@sn.deferrable
+def found(patt, filename, encoding='utf-8'):
+    """Return True if patt is found in filename, searching from the end"""
+    return contains(patt, filename, encoding)
+
+
+@sn.deferrable
+def assert_found(patt, filename, msg=None, encoding='utf-8'):
+    """Assert that patt is found in filename, searching from the end
+
+    Meant for completion markers and end-of-run summaries, which are
+    normally found in the last few kilobytes of the log.
+    """
+    if not contains(patt, filename, encoding):
+        error_msg = msg or 'pattern {0!r} not found in {1!r}'
+        raise SanityError(_format(error_msg, patt, filename))
+
+    return True
+
+
+@sn.deferrable
+def assert_not_found(patt, filename, msg=None, encoding='utf-8'):
+    """Assert that patt is not found anywhere in filename"""
+    log = _mapped(filename)
+    if log.first_match(_compile(patt, encoding)) is not None:
+        error_msg = msg or 'pattern {0!r} found in {1!r}'
+        raise SanityError(_format(error_msg, patt, filename))
+
+    return True
+
+
+@sn.deferrable
+def extractlast(patt, filename, tag=0, conv=None, encoding='utf-8'):
+    """Extract group tag of the last match of patt in filename
+
+    Equivalent to ``sn.extractsingle(patt, filename, tag, conv, item=-1)``
+    without reading the whole file.
+    """
+    match = _mapped(filename).last_match(_compile(patt, encoding))
+    if match is None:
+        raise SanityError(f'no matches found for {patt!r} in {filename!r}')
+
+    try:
+        value = match.group(tag)
+    except IndexError:
+        raise SanityError(f'no such group in pattern {patt!r}: {tag}')
+
+    if value is not None:
+        value = value.decode(encoding)
+
+    if conv is None:
+        return value
+
+    try:
+        return conv(value)
+    except ValueError:
+        raise SanityError(f'could not convert value {value!r} using {conv!r}')
@@ -0,0 +1,56 @@
+"""
+Rank scaling across nodes
+
+Scaling tests declare the number of MPI ranks as the num_ranks parameter.
+The ranks are placed on as few nodes as possible, at most ranks_per_node
+per node, by default the number of cores of the partition's nodes (36 on
+Casper, 128 on Derecho). Test cases needing more nodes than the partition
+allows with its 'max_nodes' extra are skipped, so the same parameter space
+can be used on every system:
+
+    class MyScalingTest(rfm.RegressionTest, RankScalingMixin):
+        num_ranks = parameter([128, 256, 512, 1024])
+
+Hooks of the test that depend on the task count should use num_ranks, since
+num_tasks is only set after the setup.
+"""
+
+import math
+
+import reframe as rfm
+from reframe.core.builtins import run_after, variable
+
+# Ranks per node on partitions without processor information
+DEFAULT_RANKS_PER_NODE = 36
+
+
+class RankScalingMixin(rfm.RegressionMixin):
+    """Spread the ranks of a scaling test over the nodes of the partition"""
+
+    # Ranks per node; None for the number of cores of the nodes
+    ranks_per_node = variable(int, type(None), value=None)
+
+    # Number of nodes the test case runs on
+    num_nodes = variable(int, value=0)
+
+    def node_ranks(self):
+        """The ranks that fit on a node of the current partition"""
+        if self.ranks_per_node:
+            return self.ranks_per_node
+
+        processor = self.current_partition.processor
+        return (processor.num_cores or processor.num_cpus or
+                DEFAULT_RANKS_PER_NODE)
+
+    @run_after('setup')
+    def place_ranks(self):
+        per_node = min(self.num_ranks, self.node_ranks())
+        self.num_nodes = math.ceil(self.num_ranks / per_node)
+        max_nodes = self.current_partition.extras.get('max_nodes')
+        self.skip_if(
+            max_nodes is not None and self.num_nodes > max_nodes,
+            f'{self.num_ranks} ranks need {self.num_nodes} nodes of '
+            f'{self.current_partition.fullname} (at most {max_nodes})'
+        )
+        self.num_tasks = self.num_ranks
+        self.num_tasks_per_node = per_node
@@ -0,0 +1,449 @@
+"""
+Fit scaling models to the points of scaling tests
+
+Usage:
+    python -m reframe_ncar.scaling_fit [-o DIR] [REPORT|DIR ...]
+
+Gathers the points of every scaling family, i.e. the test cases of one test
+that differ only in the rank count (the num_ranks parameter), from run
+reports or the directories holding them; without arguments the report
+directories of RFM_NCAR_HISTORY are used. Points measured in several
+sessions are merged by their median.
+
+The time per run T(p) on p ranks is fitted with
+
+    strong scaling  amdahl  T = a + b/p             serial fraction a/(a+b)
+                    comm    T = a + b/p + c*log2(p)
+    weak scaling    gustafson  scaled speedup n - alpha*(n - 1)
+                    comm    T = a + c*log2(p)
+
+where n = p/p0 is the number of times the smallest measured count p0. The
+table reports for each model the knee, the largest rank count with a
+parallel efficiency of at least --efficiency, and the rank count that
+maximizes the throughput per core-hour spent, work/(p*T^2). An SVG plot of
+the points and the fits of every family is written to the output directory.
+"""
+
+import argparse
+import collections
+import json
+import math
+import os
+import re
+import statistics
+import sys
+
+from reframe_ncar.reports import load_reports
+
+# Time metrics tried in order when --metric is not given
+TIME_METRICS = ('walltime', 'total_runtime', 'simulation_time',
+                'job_runtime')
+
+
+class Family:
+    """The points of one scaling test on one system and environment"""
+
+    def __init__(self, test, system, environ, metric, weak):
+        self.test = test
+        self.system = system
+        self.environ = environ
+        self.metric = metric
+        self.weak = weak
+        self.samples = collections.defaultdict(list)
+
+    @property
+    def name(self):
+        return f'{self.test} @{self.system}+{self.environ}'
+
+    def points(self):
+        """The (ranks, time) points, by increasing ranks"""
+        return sorted((p, statistics.median(t))
+                      for p, t in self.samples.items())
+
+
+def _time_metric(perf, metric):
+    if metric:
+        return metric if metric in perf else None
+
+    for name in TIME_METRICS:
+        if name in perf:
+            return name
+
+    for name, value in perf.items():
+        if value.unit == 's':
+            return name
+
+    return None
+
+
+def gather(reports, param='num_ranks', metric=None, mode='auto'):
+    """Collect the scaling families of the reports"""
+    families = {}
+    for report in reports:
+        for case in report.testcases().values():
+            params = case.params
+            if param not in params or case.result != 'pass':
+                continue
+
+            name = _time_metric(case.perf, metric)
+            if name is None or case.perf[name].value is None:
+                continue
+
+            others = ' '.join(f'%{k}={v}' for k, v in sorted(params.items())
+                              if k != param)
+            test = f'{case.basename} {others}'.strip()
+            key = (test, case.system, case.environ, name)
+            if key not in families:
+                weak = (mode == 'weak' or
+                        (mode == 'auto' and 'weak' in test.lower()))
+                families[key] = Family(test, case.system, case.environ,
+                                       name, weak)
+
+            families[key].samples[int(params[param])].append(
+                case.perf[name].value
+            )
+
+    return list(families.values())
+
+
+def lstsq(basis, xs, ys):
+    """Least squares coefficients of ys in the functions of basis, or None
+    if the points do not determine them"""
+    n = len(basis)
+    if len(xs) < n:
+        return None
+
+    rows = [[f(x) for f in basis] for x in xs]
+    a = [[sum(r[i] * r[j] for r in rows) for j in range(n)] +
+         [sum(r[i] * y for r, y in zip(rows, ys))] for i in range(n)]
+
+    # Gauss-Jordan elimination of the normal equations
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-12 * max(1.0, abs(a[col][col])):
+            return None
+
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(n):
+            if r != col:
+                factor = a[r][col] / a[col][col]
+                a[r] = [v - factor * w for v, w in zip(a[r], a[col])]
+
+    return [a[i][n] / a[i][i] for i in range(n)]
+
+
+def r_squared(model, xs, ys):
+    mean = statistics.fmean(ys)
+    total = sum((y - mean)**2 for y in ys)
+    residual = sum((y - model(x))**2 for x, y in zip(xs, ys))
+    return 1 - residual / total if total else 1.0
+
+
+class Fit:
+    """A scaling model fitted to the points of a family"""
+
+    def __init__(self, name, model, params, points, weak):
+        self.name = name
+        self.model = model
+        self.params = params
+        self.weak = weak
+        self.p0, self.t0 = points[0]
+        xs, ys = zip(*points)
+        self.r2 = r_squared(model, xs, ys)
+
+    def work(self, p):
+        """Work per run relative to the smallest measured count"""
+        return p / self.p0 if self.weak else 1.0
+
+    def efficiency(self, p):
+        """Predicted parallel efficiency relative to the smallest count"""
+        time = self.model(p)
+        if time <= 0:
+            return 0.0
+
+        if self.weak:
+            return self.t0 / time
+
+        return self.p0 * self.t0 / (p * time)
+
+    def knee(self, candidates, threshold):
+        """The largest candidate count with an efficiency >= threshold"""
+        good = [p for p in candidates if self.efficiency(p) >= threshold]
+        return max(good) if good else None
+
+    def optimum(self, candidates):
+        """The candidate count giving the most throughput per core-hour"""
+        valid = [p for p in candidates if 0 < self.model(p) < math.inf]
+        if not valid:
+            return None
+
+        return max(valid, key=lambda p: self.work(p) / (p * self.model(p)**2))
+
+
+def fit_family(family):
+    """Fit the scaling models of family"""
+    points = family.points()
+    xs, ys = zip(*points)
+    fits = []
+    if family.weak:
+        p0, t0 = points[0]
+        ns = [p / p0 for p in xs]
+        denom = sum((n - 1)**2 for n in ns)
+        if denom:
+            speedups = [n * t0 / t for n, t in zip(ns, ys)]
+            alpha = sum((n - s) * (n - 1)
+                        for n, s in zip(ns, speedups)) / denom
+
+            def gustafson(p):
+                n = p / p0
+                speedup = n - alpha * (n - 1)
+                return n * t0 / speedup if speedup > 0 else math.inf
+
+            fits.append(Fit('gustafson', gustafson, {'alpha': alpha},
+                            points, True))
+
+        coef = lstsq([lambda p: 1.0, math.log2], xs, ys)
+        if coef:
+            a, c = coef
+            fits.append(Fit('comm', lambda p, a=a, c=c: a + c * math.log2(p),
+                            {'a': a, 'c': c}, points, True))
+    else:
+        coef = lstsq([lambda p: 1.0, lambda p: 1 / p], xs, ys)
+        if coef:
+            a, b = coef
+            serial = a / (a + b) if a + b else None
+            fits.append(Fit('amdahl', lambda p, a=a, b=b: a + b / p,
+                            {'a': a, 'b': b, 'serial_fraction': serial},
+                            points, False))
+
+        # Three coefficients need more than three points to mean anything
+        coef = len(points) > 3 and lstsq(
+            [lambda p: 1.0, lambda p: 1 / p, math.log2], xs, ys
+        )
+        if coef:
+            a, b, c = coef
+            fits.append(Fit('comm',
+                            lambda p, a=a, b=b, c=c: (a + b / p +
+                                                      c * math.log2(p)),
+                            {'a': a, 'b': b, 'c': c}, points, False))
+
+    return fits
+
+
+def candidates(points, extrapolate=4):
+    """Rank counts to evaluate: the measured ones and the powers of two up
+    to extrapolate times the largest one"""
+    xs = [p for p, _ in points]
+    counts = set(xs)
+    p = 2**math.floor(math.log2(xs[0]))
+    while p <= xs[-1] * extrapolate:
+        if p >= xs[0]:
+            counts.add(p)
+
+        p *= 2
+
+    return sorted(counts)
+
+
+def analyze(families, threshold=0.5, extrapolate=4):
+    """Fit every family with enough points
+
+    :returns: a list of rows, one per family and model.
+    """
+    rows = []
+    for family in families:
+        points = family.points()
+        if len(points) < 2:
+            continue
+
+        counts = candidates(points, extrapolate)
+        for fit in fit_family(family):
+            rows.append({
+                'test': family.test,
+                'system': family.system,
+                'environ': family.environ,
+                'metric': family.metric,
+                'scaling': 'weak' if family.weak else 'strong',
+                'model': fit.name,
+                'params': fit.params,
+                'r2': fit.r2,
+                'knee': fit.knee(counts, threshold),
+                'optimum': fit.optimum(counts),
+                'points': points,
+                'fit': fit
+            })
+
+    return rows
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+
+    if isinstance(value, float):
+        return f'{value:.4g}'
+
+    return str(value)
+
+
+def print_table(rows, fp=sys.stdout):
+    header = ['test', 'system', 'environ', 'scaling', 'model', 'params',
+              'r2', 'knee', 'optimum']
+    lines = []
+    for row in rows:
+        params = ' '.join(f'{k}={_fmt(v)}' for k, v in row['params'].items())
+        lines.append([row['test'], row['system'], row['environ'],
+                      row['scaling'], row['model'], params, _fmt(row['r2']),
+                      _fmt(row['knee']), _fmt(row['optimum'])])
+
+    widths = [max(len(str(c)) for c in col) for col in zip(header, *lines)]
+    print('  '.join(h.ljust(w) for h, w in zip(header, widths)), file=fp)
+    print('  '.join('-'*w for w in widths), file=fp)
+    for cells in lines:
+        print('  '.join(c.ljust(w) for c, w in zip(cells, widths)).rstrip(),
+              file=fp)
+
+
+COLORS = ('#1f77b4', '#d62728', '#2ca02c', '#9467bd')
+
+
+def plot_svg(family_rows, filename, width=640, height=420):
+    """Write the points and the fitted curves of a family as a log-log SVG
+    plot"""
+    points = family_rows[0]['points']
+    xs = [p for p, _ in points]
+    counts = candidates(points)
+    curves = [(row['model'], [(p, row['fit'].model(p)) for p in counts
+                              if 0 < row['fit'].model(p) < math.inf])
+              for row in family_rows]
+    values = [t for _, t in points] + [t for _, curve in curves
+                                       for _, t in curve]
+    x_lo, x_hi = math.log2(min(xs)), math.log2(max(counts))
+    y_lo, y_hi = math.log10(min(values)), math.log10(max(values))
+    x_hi = x_hi if x_hi > x_lo else x_lo + 1
+    y_hi = y_hi if y_hi > y_lo else y_lo + 1
+    left, right, top, bottom = 70, 20, 40, 50
+
+    def sx(p):
+        return left + (math.log2(p) - x_lo) / (x_hi - x_lo) * (
+            width - left - right)
+
+    def sy(t):
+        return height - bottom - (math.log10(t) - y_lo) / (y_hi - y_lo) * (
+            height - top - bottom)
+
+    row = family_rows[0]
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+        f'height="{height}" font-family="sans-serif" font-size="12">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{width / 2}" y="20" text-anchor="middle">'
+        f'{_escape(row["test"])} @{row["system"]}+{row["environ"]}</text>',
+        f'<line x1="{left}" y1="{height - bottom}" x2="{width - right}" '
+        f'y2="{height - bottom}" stroke="black"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{height - bottom}" '
+        f'stroke="black"/>',
+        f'<text x="{width / 2}" y="{height - 10}" text-anchor="middle">'
+        f'ranks</text>',
+        f'<text x="15" y="{height / 2}" text-anchor="middle" '
+        f'transform="rotate(-90 15 {height / 2})">'
+        f'{_escape(row["metric"])} [s]</text>'
+    ]
+    for p in counts:
+        out.append(f'<text x="{sx(p):.1f}" y="{height - bottom + 15}" '
+                   f'text-anchor="middle">{p}</text>')
+
+    for exp in range(math.floor(y_lo), math.ceil(y_hi) + 1):
+        if y_lo <= exp <= y_hi:
+            out.append(f'<text x="{left - 5}" y="{sy(10**exp):.1f}" '
+                       f'text-anchor="end">1e{exp}</text>')
+
+    for i, (model, curve) in enumerate(curves):
+        color = COLORS[(i + 1) % len(COLORS)]
+        coords = ' '.join(f'{sx(p):.1f},{sy(t):.1f}' for p, t in curve)
+        out.append(f'<polyline points="{coords}" fill="none" '
+                   f'stroke="{color}" stroke-width="1.5"/>')
+        out.append(f'<text x="{width - right - 100}" y="{top + 15 * i}" '
+                   f'fill="{color}">{model}</text>')
+
+    for p, t in points:
+        out.append(f'<circle cx="{sx(p):.1f}" cy="{sy(t):.1f}" r="4" '
+                   f'fill="{COLORS[0]}"/>')
+
+    out.append('</svg>')
+    with open(filename, 'w') as fp:
+        fp.write('\n'.join(out) + '\n')
+
+
+def _escape(text):
+    return (text.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('>', '&gt;'))
+
+
+def plot_filename(row):
+    name = f'{row["test"]}_{row["system"]}_{row["environ"]}_{row["metric"]}'
+    return re.sub(r'[^\w.-]+', '_', name) + '.svg'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='scaling_fit',
+        description='Fit scaling models to the points of scaling tests'
+    )
+    parser.add_argument('reports', nargs='*', metavar='REPORT',
+                        help='run reports or directories of them '
+                             '(default: $RFM_NCAR_HISTORY)')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='directory of the plots (default: .)')
+    parser.add_argument('-m', '--metric',
+                        help='time metric to fit (default: the first of '
+                             f'{", ".join(TIME_METRICS)})')
+    parser.add_argument('-p', '--param', default='num_ranks',
+                        help='parameter holding the rank count '
+                             '(default: num_ranks)')
+    parser.add_argument('--scaling', choices=['auto', 'strong', 'weak'],
+                        default='auto',
+                        help='scaling of the families; auto takes tests '
+                             'named weak as weak scaling (default: auto)')
+    parser.add_argument('-e', '--efficiency', type=float, default=0.5,
+                        help='parallel efficiency of the knee '
+                             '(default: 0.5)')
+    parser.add_argument('-f', '--format', choices=['table', 'json'],
+                        default='table', help='output format')
+    args = parser.parse_args(argv)
+
+    paths = args.reports or [
+        p for p in os.environ.get('RFM_NCAR_HISTORY', '').split(os.pathsep)
+        if p
+    ]
+    if not paths:
+        parser.error('no reports given and RFM_NCAR_HISTORY is not set')
+
+    reports = load_reports(paths, recursive=True)
+    families = gather(reports, args.param, args.metric, args.scaling)
+    rows = analyze(families, args.efficiency)
+    if not rows:
+        print('no scaling family with two or more points found',
+              file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    by_family = collections.defaultdict(list)
+    for row in rows:
+        by_family[plot_filename(row)].append(row)
+
+    for filename, family_rows in by_family.items():
+        plot_svg(family_rows, os.path.join(args.output_dir, filename))
+
+    if args.format == 'json':
+        json.dump([{k: v for k, v in row.items() if k != 'fit'}
+                   for row in rows], sys.stdout, indent=2)
+        print()
+    else:
+        print_table(rows)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
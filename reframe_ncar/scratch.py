@@ -0,0 +1,102 @@
+"""
+Node-local scratch staging
+
+With use_node_local set, the build and the run happen in a temporary
+directory under node_local_root instead of the stage directory on GLADE.
+Only the declared artifacts are copied back to the stage directory, so
+object files and bulky model output never touch the parallel filesystem.
+
+    class MyTest(rfm.RegressionTest, NodeLocalStageMixin):
+        build_artifacts = ['run']          # copied back after the build
+        run_inputs = ['run']               # copied to scratch before the run
+        run_artifacts = ['run/out*.nc']    # copied back after the run
+
+All paths are relative to the stage directory. The job's stdout and stderr
+are written by the scheduler to the stage directory as usual.
+
+The scratch directory is created by the job script, on the first node of
+the job only, so test cases whose tasks span several nodes are skipped.
+"""
+
+import reframe as rfm
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, run_before, variable
+
+
+def _copy_back(patterns, dest):
+    """Shell commands copying patterns, relative to the current directory,
+    to dest keeping their relative paths"""
+    return [
+        f'for f in {" ".join(patterns)}; do '
+        f'if [ -e "$f" ]; then cp -rp --parents "$f" {dest}/; fi; done'
+    ]
+
+
+class NodeLocalStageMixin(rfm.RegressionMixin):
+    """Build and run in node-local scratch with selective copy-back"""
+
+    # Build and run in node-local scratch instead of the stage directory
+    use_node_local = variable(bool, value=False)
+
+    # Scratch root on the node running the build or the job
+    node_local_root = variable(str, value='${TMPDIR:-/tmp}')
+
+    # Build products copied back to the stage directory after the build
+    build_artifacts = variable(typ.List[str], value=[])
+
+    # Files copied from the stage directory to scratch before the run
+    run_inputs = variable(typ.List[str], value=['.'])
+
+    # Run products copied back to the stage directory after the run
+    run_artifacts = variable(typ.List[str], value=[])
+
+    @run_after('setup', always_last=True)
+    def check_single_node(self):
+        """Skip test cases whose ranks would not see the scratch"""
+        if not self.use_node_local or not self.num_tasks:
+            return
+
+        num_nodes = -(-self.num_tasks // (self.num_tasks_per_node or 1))
+        self.skip_if(num_nodes > 1,
+                     f'node-local scratch is only created on the first of '
+                     f'{num_nodes} nodes')
+
+    def _enter_scratch(self, kind):
+        return [
+            f'RFM_LOCAL_STAGE=$(mktemp -d {self.node_local_root}/'
+            f'rfm-{kind}.XXXXXX)',
+            'echo "Node-local stage: $RFM_LOCAL_STAGE"'
+        ]
+
+    def _leave_scratch(self, artifacts):
+        return (['cd $RFM_LOCAL_STAGE'] +
+                _copy_back(artifacts, self.stagedir) +
+                [f'cd {self.stagedir}', 'rm -rf $RFM_LOCAL_STAGE'])
+
+    @run_before('compile', always_last=True)
+    def build_in_node_local(self):
+        """Wrap the build commands to run in node-local scratch"""
+        if not self.use_node_local:
+            return
+
+        # The sources are copied into the stage directory by ReFrame; bring
+        # them along so that relative paths in the build commands still work
+        self.prebuild_cmds = (self._enter_scratch('build') +
+                              [f'cp -rp {self.stagedir}/. $RFM_LOCAL_STAGE/',
+                               'cd $RFM_LOCAL_STAGE'] +
+                              self.prebuild_cmds)
+        self.postbuild_cmds = (self.postbuild_cmds +
+                               self._leave_scratch(self.build_artifacts))
+
+    @run_before('run', always_last=True)
+    def run_in_node_local(self):
+        """Wrap the run commands to run in node-local scratch"""
+        if not self.use_node_local:
+            return
+
+        copy_in = [f'(cd {self.stagedir} && cp -rp --parents '
+                   f'{" ".join(self.run_inputs)} $RFM_LOCAL_STAGE/)']
+        self.prerun_cmds = (self._enter_scratch('run') + copy_in +
+                            ['cd $RFM_LOCAL_STAGE'] + self.prerun_cmds)
+        self.postrun_cmds = (self.postrun_cmds +
+                             self._leave_scratch(self.run_artifacts))
@@ -0,0 +1,75 @@
+"""
+Adaptive time limits
+
+Oversized walltime requests keep jobs out of the PBS backfill windows. With
+enough history, the time limit of a test is set to a high quantile of its
+past runtimes for the same parameters, partition and environment, plus a
+safety margin. The declared time limit stays the upper bound and is used
+as is when there is not enough history.
+
+    class MyTest(rfm.RegressionTest, AdaptiveTimeLimitMixin):
+        time_limit = '1h'
+
+Runtimes are the job script wall clock times recorded by JobTimingMixin.
+Disable with -S adaptive_time_limit=0.
+"""
+
+import math
+
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, variable
+
+from reframe_ncar.history import session_history
+from reframe_ncar.timing import JobTimingMixin
+
+
+class AdaptiveTimeLimitMixin(JobTimingMixin):
+    """Derive the time limit from the runtime history of the test"""
+
+    adaptive_time_limit = variable(typ.Bool, value=True)
+
+    # Quantile of the past runtimes and relative margin added to it
+    time_limit_quantile = variable(float, value=0.95)
+    time_limit_margin = variable(float, value=0.25)
+
+    # Number of past runs needed to adapt the time limit
+    time_limit_min_samples = variable(int, value=3)
+
+    # Lower bound of the adapted time limit
+    time_limit_min = variable(typ.Duration, value='5m', allow_implicit=True)
+
+    # Directories of past run reports (default: see session_history())
+    time_limit_history = variable(typ.List[str], value=[])
+
+    @run_after('setup', always_last=True)
+    def adapt_time_limit(self):
+        if not self.adaptive_time_limit:
+            return
+
+        history = session_history(self.time_limit_history)
+        samples = history.samples(self.display_name,
+                                  self.current_partition.fullname,
+                                  self.current_environ.name)
+        if len(samples) < self.time_limit_min_samples:
+            return
+
+        expected = history.expected(self.display_name,
+                                    self.current_partition.fullname,
+                                    self.current_environ.name,
+                                    self.time_limit_quantile)
+
+        # Whole minutes, as PBS would round up anyway
+        limit = max(expected * (1 + self.time_limit_margin),
+                    self.time_limit_min)
+        limit = 60 * math.ceil(limit / 60)
+        declared = self.time_limit or typ.Duration(
+            self.current_partition.time_limit or 0
+        )
+        if declared:
+            limit = min(limit, declared)
+
+        self.logger.debug(
+            f'{self.display_name}: time limit {limit:.0f}s from '
+            f'{len(samples)} past runs (declared: {declared or "none"})'
+        )
+        self.time_limit = limit
@@ -0,0 +1,152 @@
+"""
+Job timestamps
+
+The job script records in rfm_job_times.txt in the stage directory when it
+started, when it launched the executable, when every launched process
+started, when the launcher returned and when the script ended. Together
+with the submission time this tells the time a job waited in the queue and
+the startup of the run apart from the time the test ran:
+
+    queue_wait          job start - submission
+    module_load_time    start of the prerun commands - job start
+    prerun_time         launch - start of the prerun commands
+    launch_latency      start of the last launched process - launch
+    first_step_time     first time step - launch
+    time_to_first_step  first time step - job start
+    job_runtime         job script end - job start
+
+The job start is stamped by JOB_START_CMD, which the partitions of config.py
+run before loading the modules of the test; without it, the start of the
+prerun commands is taken. The first time step is stamped by the watchdog of
+tests following their progress, when it runs (see reframe_ncar/monitor.py). The timings
+are stored in variables, and thereby in the run report where the history of
+past runtimes is taken from, and reported as performance variables. Clocks
+of the login and compute nodes are assumed to agree.
+"""
+
+import os
+import shlex
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+import reframe.utility.typecheck as typ
+from reframe.core.builtins import run_after, run_before, variable
+
+TIMES_FILE = 'rfm_job_times.txt'
+
+# Events recorded once per launch
+REPEATED_EVENTS = ('launch', 'process', 'first_step')
+
+# Timings reported as performance variables
+TIMING_VARIABLES = ('queue_wait', 'module_load_time', 'prerun_time',
+                    'launch_latency', 'first_step_time', 'time_to_first_step',
+                    'job_runtime')
+
+
+def _stamp(event, filename):
+    return f'echo "{event} $(date +%s.%N)" >> {filename}'
+
+
+# Partition prepare command stamping the job start; job scripts run in the
+# stage directory at that point
+JOB_START_CMD = _stamp('job_start', TIMES_FILE)
+
+
+def read_times(filename):
+    """The timestamps of a job times file by event
+
+    The REPEATED_EVENTS, like the start of the launched processes, are
+    returned as lists.
+    """
+    times = {}
+    try:
+        with open(filename) as fp:
+            for line in fp:
+                event, _, value = line.partition(' ')
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+
+                if event in REPEATED_EVENTS:
+                    times.setdefault(event, []).append(value)
+                else:
+                    times[event] = value
+    except OSError:
+        pass
+
+    return times
+
+
+class JobTimingMixin(rfm.RegressionMixin):
+    """Record the timestamps of the job"""
+
+    # Time stamp the start of every launched process
+    measure_launch = variable(typ.Bool, value=True)
+
+    # Report the timings as performance variables
+    timing_perf_variables = variable(typ.Bool, value=True)
+
+    # Timings of the job in seconds
+    queue_wait = variable(float, type(None), value=None)
+    module_load_time = variable(float, type(None), value=None)
+    prerun_time = variable(float, type(None), value=None)
+    launch_latency = variable(float, type(None), value=None)
+    first_step_time = variable(float, type(None), value=None)
+    time_to_first_step = variable(float, type(None), value=None)
+    job_runtime = variable(float, type(None), value=None)
+
+    @run_before('run', always_last=True)
+    def add_timestamps(self):
+        # Absolute paths, since the run commands may change directory
+        filename = os.path.join(self.stagedir, TIMES_FILE)
+        self.prerun_cmds = ([_stamp('start', filename)] + self.prerun_cmds +
+                            [_stamp('launch', filename)])
+        self.postrun_cmds = ([_stamp('exited', filename)] +
+                             self.postrun_cmds + [_stamp('end', filename)])
+        if self.measure_launch:
+            # Every launched process stamps its start and execs the
+            # executable, which may be a wrapper followed by the program.
+            # Like the launchers, find executables in the working directory
+            wrapper = (f'{_stamp("process", filename)}; cmd=$0; '
+                       f'case $cmd in */*) ;; *) [ -x "$cmd" ] && '
+                       f'cmd=./$cmd;; esac; exec "$cmd" "$@"')
+            self.executable_opts = [shlex.quote(wrapper), self.executable,
+                                    *self.executable_opts]
+            self.executable = 'bash -c'
+
+    @run_after('run')
+    def read_timestamps(self):
+        times = read_times(os.path.join(self.stagedir, TIMES_FILE))
+        begin = times.get('job_start', times.get('start'))
+        if 'job_start' in times and 'start' in times:
+            self.module_load_time = times['start'] - times['job_start']
+
+        if begin is not None and self.job.submit_time:
+            self.queue_wait = max(begin - self.job.submit_time, 0)
+
+        if 'start' in times and 'launch' in times:
+            self.prerun_time = times['launch'][0] - times['start']
+
+        if 'launch' in times and 'process' in times:
+            self.launch_latency = max(times['process']) - times['launch'][-1]
+
+        if 'launch' in times and 'first_step' in times:
+            self.first_step_time = times['first_step'][0] - times['launch'][0]
+            if begin is not None:
+                self.time_to_first_step = times['first_step'][0] - begin
+
+        if begin is not None and 'end' in times:
+            self.job_runtime = times['end'] - begin
+
+    @run_before('performance')
+    def add_timing_perf_variables(self):
+        if not self.timing_perf_variables:
+            return
+
+        for name in TIMING_VARIABLES:
+            value = getattr(self, name)
+            if value is not None:
+                self.perf_variables[name] = sn.make_performance_function(
+                    sn.defer(value), 's'
+                )
@@ -0,0 +1,223 @@
+"""
+Early abort of regressing runs and short-window runs
+
+Runs a launch command, passing its stdout through, and follows the progress
+the application prints: the model time or time step matched by group 1 of a
+pattern. Once a fraction of the run is done, past the warmup, the final
+runtime is extrapolated from the rate of progress since the first progress
+line. If the projection exceeds the limit, the launch is killed and a line
+starting with MARKER is printed.
+
+With --window, the run is only followed until the time per step is steady:
+the warmup ends when the last --stable-steps steps vary by at most
+--stable-cv (or at --max-warmup of the run). The next --window steps are
+timed, the full runtime is extrapolated from them and the launch is
+stopped, printing a line starting with WINDOW_MARKER. With --calibrate, the
+run continues to its end instead and FINISHED_MARKER reports its runtime, so
+that the extrapolation can be checked.
+
+With --times, the time of the first progress line is appended to the job
+times file as the first_step event (see reframe_ncar/timing.py).
+
+Usage:
+    python3 -m reframe_ncar.watchdog --pattern REGEX [--times FILE] \\
+        [--total VALUE [--limit SECONDS] [--min-progress FRACTION] \\
+        [--window STEPS [--calibrate]]] -- COMMAND...
+
+The command is usually the launcher followed by the executable (see
+RunMonitorMixin in reframe_ncar/monitor.py). The exit code is that of the
+command, 0 if it was stopped after the window or EXIT_ABORTED if it was
+killed.
+"""
+
+import argparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+MARKER = '==> rfm watchdog: projected regression'
+WINDOW_MARKER = '==> rfm watchdog: window'
+FINISHED_MARKER = '==> rfm watchdog: finished'
+
+EXIT_ABORTED = 3
+
+# Seconds between terminating the launch and killing it
+KILL_GRACE = 10
+
+
+def projection(elapsed, first, current, total):
+    """The projected runtime of a run
+
+    :arg elapsed: seconds since the start of the run
+    :arg first: (seconds since the start, progress) of the first progress
+        line
+    :arg current: the same for the last progress line
+    :arg total: the progress at the end of the run
+    """
+    (t0, p0), (t, p) = first, current
+    if p <= p0:
+        return None
+
+    return elapsed + (total - p) * (t - t0) / (p - p0)
+
+
+def _kill(proc):
+    """Terminate the process group of proc, then kill it"""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+
+        try:
+            proc.wait(KILL_GRACE)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def steady(intervals, steps, cv):
+    """Whether the last steps intervals vary by at most cv"""
+    if len(intervals) < steps:
+        return False
+
+    last = intervals[-steps:]
+    mean = sum(last) / steps
+    if mean <= 0:
+        return False
+
+    var = sum((t - mean)**2 for t in last) / steps
+    return var**0.5 / mean <= cv
+
+
+def watch(cmd, pattern, total=None, limit=None, min_progress=0.05,
+          window=None, calibrate=False, stable_steps=10, stable_cv=0.05,
+          max_warmup=0.25, times=None, out=sys.stdout.buffer):
+    """Run cmd until it exits, its projected runtime exceeds limit or, with
+    window, the window steps after the warmup were timed
+
+    :returns: the exit code of cmd, 0 if it was stopped after the window or
+        EXIT_ABORTED
+    """
+    pattern = re.compile(pattern)
+
+    def report(line):
+        out.write(f'{line}\n'.encode())
+        out.flush()
+
+    # Fortran runtimes buffer the output to pipes otherwise
+    env = dict(os.environ, GFORTRAN_UNBUFFERED_PRECONNECTED='y')
+    start = time.monotonic()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env,
+                            start_new_session=True)
+    first, last, intervals = None, None, []
+    warm, measured = None, False
+    try:
+        for line in proc.stdout:
+            out.write(line)
+            out.flush()
+            match = pattern.search(line.decode(errors='replace'))
+            if not match:
+                continue
+
+            try:
+                progress = float(match.group(1))
+            except ValueError:
+                continue
+
+            now = time.monotonic() - start
+            if first is None:
+                first = last = (now, progress)
+                if times:
+                    with open(times, 'a') as fp:
+                        fp.write(f'first_step {time.time():.6f}\n')
+
+                continue
+
+            if total is None:
+                continue
+
+            intervals.append(now - last[0])
+            last = (now, progress)
+            if window and not measured:
+                if warm is None:
+                    if (steady(intervals, stable_steps, stable_cv) or
+                        progress >= max_warmup * total):
+                        warm = (now, progress, len(intervals))
+                elif len(intervals) - warm[2] >= window:
+                    # The window is timed from the end of the warmup
+                    step = (now - warm[0]) / (len(intervals) - warm[2])
+                    projected = projection(now, warm[:2], last, total)
+                    report(f'{WINDOW_MARKER}: warmup={warm[0]:.3f} '
+                           f'step={step:.6g} projected={projected:.3f}')
+                    measured = True
+                    if not calibrate:
+                        _kill(proc)
+                        return 0
+
+            if limit is None or progress < min_progress * total:
+                continue
+
+            projected = projection(now, first, last, total)
+            if projected is not None and projected > limit:
+                _kill(proc)
+                report(f'{MARKER}: projected {projected:.0f} s > limit '
+                       f'{limit:.0f} s at {progress:g} of {total:g} after '
+                       f'{now:.0f} s')
+                return EXIT_ABORTED
+    except BaseException:
+        _kill(proc)
+        raise
+
+    returncode = proc.wait()
+    if calibrate:
+        report(f'{FINISHED_MARKER}: elapsed={time.monotonic() - start:.3f}')
+
+    return returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run a command, aborting it if its projected runtime '
+                    'exceeds a limit or stopping it after a window of steps'
+    )
+    parser.add_argument('--pattern', required=True,
+                        help='regex matching the progress in group 1')
+    parser.add_argument('--total', type=float,
+                        help='progress at the end of the run')
+    parser.add_argument('--limit', type=float,
+                        help='largest projected runtime in seconds')
+    parser.add_argument('--min-progress', type=float, default=0.05,
+                        help='fraction of the run before projecting')
+    parser.add_argument('--window', type=int,
+                        help='steps timed after the warmup')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='run to the end after the window')
+    parser.add_argument('--stable-steps', type=int, default=10,
+                        help='steps whose variation ends the warmup')
+    parser.add_argument('--stable-cv', type=float, default=0.05,
+                        help='largest variation of a steady step time')
+    parser.add_argument('--max-warmup', type=float, default=0.25,
+                        help='fraction of the run the warmup ends at')
+    parser.add_argument('--times',
+                        help='job times file to stamp the first step in')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    cmd = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not cmd:
+        parser.error('no command given')
+
+    if args.total is None and (args.limit or args.window):
+        parser.error('--limit and --window need --total')
+
+    return watch(cmd, args.pattern, args.total, args.limit,
+                 args.min_progress, args.window, args.calibrate,
+                 args.stable_steps, args.stable_cv, args.max_warmup,
+                 args.times)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,8 +6,19 @@ This simplified test suite contains just two tests:
 2. CM1QuickTest - Quick validation run with basic checks
 """
 
+import os
+import sys
+
 import reframe as rfm
-import reframe.utility.sanity as sn
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+import reframe_ncar.sanity as nsn
+from reframe_ncar.barrier import CompletionBarrierMixin
+from reframe_ncar.impact import ChangeImpactMixin
+from reframe_ncar.nodetype import NodeTypeMixin
+from reframe_ncar.repeat import RepeatMixin
+from reframe_ncar.scratch import NodeLocalStageMixin
+from reframe_ncar.timelimit import AdaptiveTimeLimitMixin
 
 cm1_base_dir = '/glade/work/bneuman/reframe_apps/cm1/'
 
@@ -15,7 +26,9 @@ cm1_base_dir = '/glade/work/bneuman/reframe_apps/cm1/'
 # BASE TEST CLASS
 # ============================================================================
 
-class CM1BaseTest(rfm.RegressionTest):
+class CM1BaseTest(rfm.RegressionTest, NodeLocalStageMixin,
+                  AdaptiveTimeLimitMixin, ChangeImpactMixin,
+                  NodeTypeMixin):
     """ Base class for CM1 tests with common configuration
         Works across all nodes of each system
         Compiles and runs the application
@@ -30,6 +43,12 @@ class CM1BaseTest(rfm.RegressionTest):
     
     # Build configuration
     build_system = 'Make'
+
+    # Files kept when building and running in node-local scratch
+    # (enable with -S use_node_local=1)
+    build_artifacts = ['run']
+    run_inputs = ['run']
+    run_artifacts = ['run/cm1out*']
     
     # @run_before('run')
     # def setup_run_environment(self):
@@ -51,7 +70,7 @@ class CM1BaseTest(rfm.RegressionTest):
 # COMPILE AND RUN TEST
 # ============================================================================
 @rfm.simple_test
-class CM1FullTest(CM1BaseTest):
+class CM1FullTest(CM1BaseTest, CompletionBarrierMixin, RepeatMixin):
     """Test that CM1 compiles and runs successfully"""
     
     descr = 'CM1 compile and run test'
@@ -67,6 +86,10 @@ class CM1FullTest(CM1BaseTest):
     num_tasks = 8
     num_tasks_per_node = 8
     time_limit = '15m'
+
+    # Wait for the output to appear on GLADE before checking it
+    completion_markers = [r'approximate core-hours']
+    completion_files = ['run/cm1out_*.nc']
     
     @run_before('compile')
     def setup_build_environment(self):
@@ -114,7 +137,7 @@ class CM1FullTest(CM1BaseTest):
         # Modify namelist.input for a quick 2D test
         self.prerun_cmds = [
             # Nav to run dir with exe and namelist
-            f'cd {self.stagedir}/run'
+            'cd run'
             #f'cp ./run/cm1.exe .',
             #f'cp ./run/config_files/squall_line/namelist.input .'
         ]
@@ -124,26 +147,21 @@ class CM1FullTest(CM1BaseTest):
     #         f'cd run'
     #     ])
 
-    @run_after('run')
-    def wait_for_completion(self):
-        import time
-        time.sleep(20)
-
     @sanity_function
     def validate_output(self):
         """Check that simulation completed successfully"""
-        return sn.assert_found(
+        return nsn.assert_found(
             r'approximate core-hours',
             self.stdout,
             msg='CM1 did not terminate normally'
         )
     
     @performance_function('s')
-    def total_time(self):
+    def total_time(self, output=None):
         """Extract total simulation time in seconds"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Total time:\s+(\S+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
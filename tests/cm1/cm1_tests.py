@@ -11,15 +11,31 @@ This test suite covers:
 - Scaling studies
 """
 
+import os
+import sys
+
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+import reframe_ncar.sanity as nsn
+from reframe_ncar.cost import SimulationCostMixin
+from reframe_ncar.monitor import RunMonitorMixin
+from reframe_ncar.nodetype import NodeTypeMixin
+from reframe_ncar.repeat import RepeatMixin
+from reframe_ncar.resultcache import ResultCacheMixin
+from reframe_ncar.scaling import RankScalingMixin
+from reframe_ncar.scratch import NodeLocalStageMixin
+from reframe_ncar.timelimit import AdaptiveTimeLimitMixin
+
 
 # ============================================================================
 # BASE TEST CLASS
 # ============================================================================
 
-class CM1BaseTest(rfm.RegressionTest):
+class CM1BaseTest(rfm.RegressionTest, NodeLocalStageMixin,
+                  AdaptiveTimeLimitMixin, ResultCacheMixin,
+                  NodeTypeMixin, SimulationCostMixin, RunMonitorMixin):
     """Base class for all CM1 tests with common configuration"""
     
     # Valid systems and environments
@@ -31,6 +47,23 @@ class CM1BaseTest(rfm.RegressionTest):
     
     # Build configuration
     build_system = 'Make'
+
+    # Files kept when building and running in node-local scratch
+    # (enable with -S use_node_local=1); CM1CompileTest checks src/cm1.exe
+    build_artifacts = ['run', 'src/cm1.exe']
+    run_inputs = ['run']
+    run_artifacts = ['cm1out*']
+
+    # Binary fingerprinted for reusing results (enable with -S result_cache=1)
+    result_cache_binary = 'run/cm1.exe'
+
+    # Time steps of a run for the cost metrics; each test declares the
+    # simulated_time of its namelist and sets grid_points from its grid
+    time_steps_pattern = r'Total time steps:\s+(\d+)'
+
+    # Model time printed every step; runs projected to take more than
+    # monitor_factor times their past runtimes are aborted
+    monitor_pattern = r'mtime\s*[=:]\s*(\d+\.?\d*)'
     
     # Note: num_tasks, num_tasks_per_node, and time_limit are NOT set here
     # Each derived class must set these to avoid conflicts
@@ -55,7 +88,7 @@ class CM1BaseTest(rfm.RegressionTest):
         """Set up runtime environment"""
         # Copy necessary input files
         self.prerun_cmds = [
-            'cp ../src/cm1.exe .',
+            'cp run/cm1.exe .',
             'cp run/namelist.input .',
             'ls -lh'
         ]
@@ -118,7 +151,7 @@ class CM1CompileTest(CM1BaseTest):
 # ============================================================================
 
 @rfm.simple_test
-class CM1QuickTest(CM1BaseTest):
+class CM1QuickTest(CM1BaseTest, RepeatMixin):
     """Quick validation run with minimal configuration"""
     
     descr = 'CM1 quick validation test (2D squall line)'
@@ -130,19 +163,24 @@ class CM1QuickTest(CM1BaseTest):
     num_tasks = 4
     num_tasks_per_node = 4
     time_limit = '10m'
+
+    simulated_time = 300.0
     
     @run_before('run')
     def setup_namelist(self):
         """Configure namelist for quick test"""
+        nx, ny, nz = 128, 2, 32
+        self.grid_points = nx * ny * nz
+
         # Modify namelist.input for a quick 2D test
         self.prerun_cmds.extend([
             # Copy base namelist
             f'cp {self.cm1_source_dir}/run/config_files/squall_line/namelist.input .',
             # Modify for quick run
-            "sed -i 's/run_time.*/run_time = 300.0/' namelist.input",
-            "sed -i 's/nx.*/nx = 128/' namelist.input",
-            "sed -i 's/ny.*/ny = 2/' namelist.input",
-            "sed -i 's/nz.*/nz = 32/' namelist.input",
+            f"sed -i 's/run_time.*/run_time = {self.simulated_time}/' namelist.input",
+            f"sed -i 's/nx.*/nx = {nx}/' namelist.input",
+            f"sed -i 's/ny.*/ny = {ny}/' namelist.input",
+            f"sed -i 's/nz.*/nz = {nz}/' namelist.input",
             "sed -i 's/output_format.*/output_format = 2/' namelist.input",
             'cat namelist.input | grep -E "(run_time|nx|ny|nz)"'
         ])
@@ -152,7 +190,7 @@ class CM1QuickTest(CM1BaseTest):
         """Check that simulation completed successfully"""
         checks = [
             # Check for successful completion message
-            sn.assert_found(
+            nsn.assert_found(
                 r'cm1 completed successfully',
                 self.stdout,
                 msg='CM1 did not complete successfully'
@@ -163,30 +201,30 @@ class CM1QuickTest(CM1BaseTest):
                 msg='No output files found'
             ),
             # Check for no fatal errors
-            sn.assert_not_found(
+            nsn.assert_not_found(
                 r'FATAL|ERROR',
                 self.stderr,
                 msg='Fatal error found in stderr'
             )
         ]
-        return sn.all(checks)
+        return self.short_window_sanity(sn.all(checks))
     
     @performance_function('s')
-    def simulation_time(self):
+    def simulation_time(self, output=None):
         """Extract total simulation time"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Total time:\s+(\S+)\s+s',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('s')
-    def time_per_timestep(self):
+    def time_per_timestep(self, output=None):
         """Extract average time per timestep"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Time per time step:\s+(\S+)\s+s',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
@@ -197,7 +235,7 @@ class CM1QuickTest(CM1BaseTest):
 # ============================================================================
 
 @rfm.simple_test
-class CM1SupercellBenchmark(CM1BaseTest):
+class CM1SupercellBenchmark(CM1BaseTest, RankScalingMixin, RepeatMixin):
     """
     Standard supercell benchmark simulation
     This is a common test case for CM1 performance evaluation
@@ -209,17 +247,18 @@ class CM1SupercellBenchmark(CM1BaseTest):
     sourcesdir = '.'
     executable = './cm1.exe'
     
-    # Use parameter for num_tasks - this is allowed
-    num_tasks = parameter([4, 8, 16, 32, 64])
-    num_tasks_per_node = 36
+    # Ranks placed on the nodes by RankScalingMixin
+    num_ranks = parameter([4, 8, 16, 32, 64])
     time_limit = '2h'
+
+    simulated_time = 7200.0
     
     @run_after('setup')
     def set_time_limit_based_on_tasks(self):
-        """Adjust time limit based on task count"""
-        if self.num_tasks <= 8:
+        """Adjust the upper bound of the time limit to the task count"""
+        if self.num_ranks <= 8:
             self.time_limit = '2h'
-        elif self.num_tasks <= 32:
+        elif self.num_ranks <= 32:
             self.time_limit = '1h'
         else:
             self.time_limit = '30m'
@@ -227,13 +266,16 @@ class CM1SupercellBenchmark(CM1BaseTest):
     @run_before('run')
     def setup_supercell_namelist(self):
         """Configure namelist for supercell simulation"""
+        nx, ny, nz = 256, 256, 64
+        self.grid_points = nx * ny * nz
+
         self.prerun_cmds.extend([
             f'cp {self.cm1_source_dir}/run/config_files/supercell/namelist.input .',
             # Standard supercell configuration
-            "sed -i 's/run_time.*/run_time = 7200.0/' namelist.input",  # 2 hours
-            "sed -i 's/nx.*/nx = 256/' namelist.input",
-            "sed -i 's/ny.*/ny = 256/' namelist.input",
-            "sed -i 's/nz.*/nz = 64/' namelist.input",
+            f"sed -i 's/run_time.*/run_time = {self.simulated_time}/' namelist.input",  # 2 hours
+            f"sed -i 's/nx.*/nx = {nx}/' namelist.input",
+            f"sed -i 's/ny.*/ny = {ny}/' namelist.input",
+            f"sed -i 's/nz.*/nz = {nz}/' namelist.input",
             "sed -i 's/dx.*/dx = 250.0/' namelist.input",
             "sed -i 's/dy.*/dy = 250.0/' namelist.input",
             "sed -i 's/dz.*/dz = 250.0/' namelist.input",
@@ -247,13 +289,13 @@ class CM1SupercellBenchmark(CM1BaseTest):
     def validate_supercell(self):
         """Validate supercell simulation output"""
         checks = [
-            sn.assert_found(
+            nsn.assert_found(
                 r'cm1 completed successfully',
                 self.stdout,
                 msg='CM1 supercell run did not complete'
             ),
             # Check for updraft development (typical of supercells)
-            sn.assert_found(
+            nsn.assert_found(
                 r'Maximum vertical velocity.*\d+',
                 self.stdout,
                 msg='No vertical velocity output found'
@@ -264,35 +306,35 @@ class CM1SupercellBenchmark(CM1BaseTest):
                 msg='NetCDF output file not created'
             )
         ]
-        return sn.all(checks)
+        return self.short_window_sanity(sn.all(checks))
     
     @performance_function('s')
-    def total_runtime(self):
+    def total_runtime(self, output=None):
         """Total wall-clock time for simulation"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Total time:\s+(\S+)\s+s',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('s')
-    def avg_timestep_time(self):
+    def avg_timestep_time(self, output=None):
         """Average time per timestep"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Time per time step:\s+(\S+)\s+s',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('timesteps/s')
-    def throughput(self):
+    def throughput(self, output=None):
         """Timesteps per second (higher is better)"""
-        total_time = self.total_runtime()
-        total_steps = sn.extractsingle(
+        total_time = self.total_runtime(output)
+        total_steps = nsn.extractlast(
             r'Total time steps:\s+(\d+)',
-            self.stdout,
+            output or self.stdout,
             1,
             int
         )
@@ -313,7 +355,7 @@ class CM1SupercellBenchmark(CM1BaseTest):
 # ============================================================================
 
 @rfm.simple_test
-class CM1WeakScalingTest(CM1BaseTest):
+class CM1WeakScalingTest(CM1BaseTest, RankScalingMixin, RepeatMixin):
     """
     Weak scaling test - problem size scales with processor count
     Tests parallel efficiency as resources increase
@@ -322,13 +364,18 @@ class CM1WeakScalingTest(CM1BaseTest):
     descr = 'CM1 weak scaling test'
     tags = {'performance', 'scaling', 'weak-scaling'}
     
+    valid_systems = ['casper:compute', 'derecho:compute']
+    
     sourcesdir = '.'
     executable = './cm1.exe'
     
-    # Parameter for different task counts
-    num_tasks = parameter([4, 8, 16, 32, 64])
-    num_tasks_per_node = 36
+    # Rank counts up to 64 Derecho nodes; cases beyond the node limit of a
+    # partition are skipped
+    num_ranks = parameter([4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048,
+                           4096, 8192])
     time_limit = '1h'
+
+    simulated_time = 1800.0
     
     @run_before('run')
     def setup_weak_scaling(self):
@@ -340,10 +387,11 @@ class CM1WeakScalingTest(CM1BaseTest):
         nx = int(128 * scale_factor)
         ny = int(128 * scale_factor)
         nz = 32  # Keep vertical resolution constant
+        self.grid_points = nx * ny * nz
         
         self.prerun_cmds.extend([
             f'cp {self.cm1_source_dir}/run/config_files/squall_line/namelist.input .',
-            f"sed -i 's/run_time.*/run_time = 1800.0/' namelist.input",
+            f"sed -i 's/run_time.*/run_time = {self.simulated_time}/' namelist.input",
             f"sed -i 's/nx.*/nx = {nx}/' namelist.input",
             f"sed -i 's/ny.*/ny = {ny}/' namelist.input",
             f"sed -i 's/nz.*/nz = {nz}/' namelist.input",
@@ -352,23 +400,25 @@ class CM1WeakScalingTest(CM1BaseTest):
     
     @sanity_function
     def validate_scaling(self):
-        return sn.assert_found(r'cm1 completed successfully', self.stdout)
+        return self.short_window_sanity(
+            sn.assert_found(r'cm1 completed successfully', self.stdout)
+        )
     
     @performance_function('s')
-    def walltime(self):
+    def walltime(self, output=None):
         """Wall time should remain relatively constant for good scaling"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Total time:\s+(\S+)\s+s',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('%')
-    def parallel_efficiency(self):
+    def parallel_efficiency(self, output=None):
         """Calculate parallel efficiency relative to baseline"""
         baseline_time = 600.0  # Reference time for 4 tasks (adjust)
-        current_time = self.walltime()
+        current_time = self.walltime(output)
         return (baseline_time / current_time) * 100
 
 
@@ -377,7 +427,7 @@ class CM1WeakScalingTest(CM1BaseTest):
 # ============================================================================
 
 @rfm.simple_test
-class CM1StrongScalingTest(CM1BaseTest):
+class CM1StrongScalingTest(CM1BaseTest, RankScalingMixin, RepeatMixin):
     """
     Strong scaling test - fixed problem size, varying processor count
     Tests speedup as resources increase
@@ -386,52 +436,62 @@ class CM1StrongScalingTest(CM1BaseTest):
     descr = 'CM1 strong scaling test'
     tags = {'performance', 'scaling', 'strong-scaling'}
     
+    valid_systems = ['casper:compute', 'derecho:compute']
+    
     sourcesdir = '.'
     executable = './cm1.exe'
     
-    # Parameter for different task counts
-    num_tasks = parameter([4, 8, 16, 32, 64, 128])
-    num_tasks_per_node = 36
+    # Rank counts up to 16 Derecho nodes, where 32 columns of the 256x256
+    # grid are left per rank; cases beyond the node limit of a partition
+    # are skipped
+    num_ranks = parameter([4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048])
     time_limit = '1h'
+
+    simulated_time = 3600.0
     
     @run_before('run')
     def setup_strong_scaling(self):
         """Fixed problem size for all processor counts"""
         # Fixed grid: 256x256x64
+        nx, ny, nz = 256, 256, 64
+        self.grid_points = nx * ny * nz
+
         self.prerun_cmds.extend([
             f'cp {self.cm1_source_dir}/run/config_files/supercell/namelist.input .',
-            "sed -i 's/run_time.*/run_time = 3600.0/' namelist.input",
-            "sed -i 's/nx.*/nx = 256/' namelist.input",
-            "sed -i 's/ny.*/ny = 256/' namelist.input",
-            "sed -i 's/nz.*/nz = 64/' namelist.input",
-            f'echo "Strong scaling: {self.num_tasks} tasks, fixed grid 256x256x64"'
+            f"sed -i 's/run_time.*/run_time = {self.simulated_time}/' namelist.input",
+            f"sed -i 's/nx.*/nx = {nx}/' namelist.input",
+            f"sed -i 's/ny.*/ny = {ny}/' namelist.input",
+            f"sed -i 's/nz.*/nz = {nz}/' namelist.input",
+            f'echo "Strong scaling: {self.num_tasks} tasks, fixed grid {nx}x{ny}x{nz}"'
         ])
     
     @sanity_function
     def validate_scaling(self):
-        return sn.assert_found(r'cm1 completed successfully', self.stdout)
+        return self.short_window_sanity(
+            sn.assert_found(r'cm1 completed successfully', self.stdout)
+        )
     
     @performance_function('s')
-    def walltime(self):
+    def walltime(self, output=None):
         """Wall time should decrease with more processors"""
-        return sn.extractsingle(
+        return nsn.extractlast(
             r'Total time:\s+(\S+)\s+s',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('x')
-    def speedup(self):
+    def speedup(self, output=None):
         """Speedup relative to baseline (4 tasks)"""
         baseline_time = 3600.0  # Reference time for 4 tasks (adjust)
-        current_time = self.walltime()
+        current_time = self.walltime(output)
         return baseline_time / current_time
     
     @performance_function('%')
-    def efficiency(self):
+    def efficiency(self, output=None):
         """Parallel efficiency percentage"""
-        speedup = self.speedup()
+        speedup = self.speedup(output)
         return (speedup / (self.num_tasks / 4)) * 100
 
 
@@ -455,16 +515,21 @@ class CM1OutputVerificationTest(CM1BaseTest):
     num_tasks = 4
     num_tasks_per_node = 4
     time_limit = '15m'
+
+    simulated_time = 600.0
     
     @run_before('run')
     def setup_output_test(self):
         """Configure for various output formats"""
+        nx, ny, nz = 64, 2, 32
+        self.grid_points = nx * ny * nz
+
         self.prerun_cmds.extend([
             f'cp {self.cm1_source_dir}/run/config_files/squall_line/namelist.input .',
-            "sed -i 's/run_time.*/run_time = 600.0/' namelist.input",
-            "sed -i 's/nx.*/nx = 64/' namelist.input",
-            "sed -i 's/ny.*/ny = 2/' namelist.input",
-            "sed -i 's/nz.*/nz = 32/' namelist.input",
+            f"sed -i 's/run_time.*/run_time = {self.simulated_time}/' namelist.input",
+            f"sed -i 's/nx.*/nx = {nx}/' namelist.input",
+            f"sed -i 's/ny.*/ny = {ny}/' namelist.input",
+            f"sed -i 's/nz.*/nz = {nz}/' namelist.input",
             "sed -i 's/output_format.*/output_format = 2/' namelist.input",
             "sed -i 's/output_filetype.*/output_filetype = 2/' namelist.input",
             "sed -i 's/stat_out.*/stat_out = 60.0/' namelist.input"
@@ -490,7 +555,7 @@ class CM1OutputVerificationTest(CM1BaseTest):
                 msg='Statistics file not found'
             )
         ]
-        return sn.all(checks)
+        return self.short_window_sanity(sn.all(checks))
     
     @run_after('run')
     def verify_netcdf_content(self):
@@ -521,18 +586,23 @@ class CM1RestartTest(CM1BaseTest):
     num_tasks = 4
     num_tasks_per_node = 4
     time_limit = '20m'
+
+    simulated_time = 300.0
     
     @run_before('run')
     def setup_restart_test(self):
         """Configure for restart test"""
+        nx, ny, nz = 64, 2, 32
+        self.grid_points = nx * ny * nz
+
         self.prerun_cmds.extend([
             f'cp {self.cm1_source_dir}/run/config_files/squall_line/namelist.input .',
             # First run: 300 seconds with restart output
-            "sed -i 's/run_time.*/run_time = 300.0/' namelist.input",
-            "sed -i 's/rstfrq.*/rstfrq = 300.0/' namelist.input",  # Write restart at end
-            "sed -i 's/nx.*/nx = 64/' namelist.input",
-            "sed -i 's/ny.*/ny = 2/' namelist.input",
-            "sed -i 's/nz.*/nz = 32/' namelist.input"
+            f"sed -i 's/run_time.*/run_time = {self.simulated_time}/' namelist.input",
+            f"sed -i 's/rstfrq.*/rstfrq = {self.simulated_time}/' namelist.input",  # Write restart at end
+            f"sed -i 's/nx.*/nx = {nx}/' namelist.input",
+            f"sed -i 's/ny.*/ny = {ny}/' namelist.input",
+            f"sed -i 's/nz.*/nz = {nz}/' namelist.input"
         ])
     
     @sanity_function
@@ -550,7 +620,7 @@ class CM1RestartTest(CM1BaseTest):
                 msg='No restart write message found'
             )
         ]
-        return sn.all(checks)
+        return self.short_window_sanity(sn.all(checks))
 
 
 # ============================================================================
@@ -6,14 +6,28 @@ This test suite contains two tests:
 2. FasteddyQuickTest - Quick validation run with basic checks
 """
 
+import os
+import re
+import sys
+
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from reframe_ncar.cost import SimulationCostMixin
+from reframe_ncar.impact import ChangeImpactMixin
+from reframe_ncar.nodetype import NodeTypeMixin
+from reframe_ncar.repeat import RepeatMixin
+from reframe_ncar.scratch import NodeLocalStageMixin
+from reframe_ncar.timelimit import AdaptiveTimeLimitMixin
+
 # ============================================================================
 # BASE TEST CLASS
 # ============================================================================
 
-class FastEddyBaseTest(rfm.RegressionTest):
+class FastEddyBaseTest(rfm.RegressionTest, NodeLocalStageMixin,
+                       AdaptiveTimeLimitMixin, ChangeImpactMixin,
+                       NodeTypeMixin, SimulationCostMixin, RepeatMixin):
     """Base class for Fasteddy tests with common configuration"""
     
     # Valid systems and environments
@@ -24,19 +38,30 @@ class FastEddyBaseTest(rfm.RegressionTest):
     fasteddy_source_dir = variable(str, value='/glade/work/bneuman/reframe_apps/fasteddy/fasteddy_a100')
     exe_dir = 'SRC/FEMAIN'
     data_dir = 'tutorials/examples'
+    input_file = 'Example02_CBL_veryshort.in'
     
     # Build configuration
     build_system = 'Make'
+
+    # Files kept when building and running in node-local scratch
+    # (enable with -S use_node_local=1)
+    build_artifacts = ['fasteddy_a100/SRC/FEMAIN/FastEddy',
+                       'fasteddy_a100/tutorials/examples']
+    run_inputs = ['fasteddy_a100/SRC/FEMAIN/FastEddy',
+                  'fasteddy_a100/tutorials/examples']
     
     sourcesdir = '.'
     executable = 'set_gpu_rank ./FastEddy'
-    executable_opts = ['Example02_CBL_veryshort.in']
+    executable_opts = [input_file]
 
     num_tasks = 4
     num_tasks_per_node = 4
     time_limit = '20m'
 
+    # Node type requested from PBS, together with the GPUs
     num_gpus_per_node = 4
+    gpu_type = 'a100'
+    mem = '100gb'
 
     @run_before('compile')
     def setup_build_environment(self):
@@ -74,20 +99,40 @@ class FastEddyBaseTest(rfm.RegressionTest):
         # Copy the exe and input file
         self.prerun_cmds = [
             f'cp -r fasteddy_a100/{self.exe_dir}/FastEddy .',
-            f'cp -r fasteddy_a100/{self.data_dir}/Example02_CBL_veryshort.in .',
+            f'cp -r fasteddy_a100/{self.data_dir}/{self.input_file} .',
             'module list'
             #'module --force purge',
             #'module load ncarenv/24.12 nvhpc/24.11 cuda/12.3.2 ncarcompilers/1.0.0 openmpi/5.0.6 -netcdf netcdf-mpi/4.9.2 parallel-netcdf/1.14.0 parallelio/2.6.5 hdf5-mpi/1.12.3 ucx/1.17.0'
         ]
 
-        # self.extra_resources ={
-        #     'gpu_type': 'a100'
-        # }
-        self.job.options = [
-            f'ngpus={self.num_tasks}',
-            'gpu_type=a100',
-            'mem=100gb'
-        ]
+    @run_before('performance')
+    def read_simulation_size(self):
+        """Grid, time steps and simulated time of the input file for the
+        cost metrics"""
+        params = {}
+        filename = os.path.join(self.stagedir, 'fasteddy_a100',
+                                self.data_dir, self.input_file)
+        try:
+            with open(filename) as fp:
+                for line in fp:
+                    match = re.match(r'\s*(\w+)\s*=\s*([^\s#]+)', line)
+                    if match:
+                        params[match.group(1)] = match.group(2)
+        except OSError:
+            return
+
+        try:
+            if all(n in params for n in ('Nx', 'Ny', 'Nz')):
+                self.grid_points = (int(params['Nx']) * int(params['Ny']) *
+                                    int(params['Nz']))
+
+            if 'Nt' in params:
+                self.time_steps = int(params['Nt'])
+                if 'dt' in params:
+                    self.simulated_time = (int(params['Nt']) *
+                                           float(params['dt']))
+        except ValueError:
+            pass
 
 @rfm.simple_test
 class FastEddyFullTest(FastEddyBaseTest):
@@ -104,21 +149,21 @@ class FastEddyFullTest(FastEddyBaseTest):
         )
     
     @performance_function('s')
-    def total_time(self):
+    def total_time(self, output=None):
         """Extract total test time in seconds"""
         return sn.extractsingle(
             r'^\s*(\d+\.\d+)\s+\|\s+\d+\s+\|',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('s')
-    def time_per_step(self):
+    def time_per_step(self, output=None):
         """Extract Time/step (s) - third column"""
         return sn.extractsingle(
             r'^\s*\d+\.\d+\s+\|\s+\d+\s+\|\s+(\d+\.\d+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
@@ -250,21 +295,21 @@ class FastEddySWStackTest(FastEddyBaseTest):
         )
     
     @performance_function('s')
-    def total_time(self):
+    def total_time(self, output=None):
         """Extract total test time in seconds"""
         return sn.extractsingle(
             r'^\s*(\d+\.\d+)\s+\|\s+\d+\s+\|',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
     
     @performance_function('s')
-    def time_per_step(self):
+    def time_per_step(self, output=None):
         """Extract Time/step (s) - third column"""
         return sn.extractsingle(
             r'^\s*\d+\.\d+\s+\|\s+\d+\s+\|\s+(\d+\.\d+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
\ No newline at end of file
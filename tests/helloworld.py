@@ -1,19 +1,37 @@
+import os
+import sys
+
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from reframe_ncar.nodetype import NodeTypeMixin
+from reframe_ncar.timing import JobTimingMixin
+
 @rfm.simple_test
-class HelloTest(rfm.RegressionTest):
+class HelloTest(rfm.RegressionTest, JobTimingMixin, NodeTypeMixin):
     # Describe what the test does
-    descr = 'Simple hello world test'
+    descr = ('Launch overhead probe: queue wait and launcher startup of a '
+             'trivial program')
     
-    # Valid systems and programming environments
-    valid_systems = ['*']
-    valid_prog_environs = ['*']
+    # Valid systems and programming environments; one environment per
+    # partition is enough to probe its scheduler and launcher
+    valid_systems = ['casper', 'derecho', 'mockpbs']
+    valid_prog_environs = ['gnu', 'gnu-serial', 'cuda', 'builtin']
+    tags = {'probe'}
     
     # Source files to compile
     sourcepath = 'hello.c'
+
+    time_limit = '5m'
+
+    # GPU partitions only schedule jobs requesting a GPU
+    @run_after('setup')
+    def request_gpu(self):
+        if self.current_environ.name.startswith('cuda'):
+            self.num_gpus_per_node = 1
     
     # How to check if test passed
     @sanity_function
     def validate(self):
-        return sn.assert_found(r'Hello, World!', self.stdout)
\ No newline at end of file
+        return sn.assert_found(r'Hello, World!', self.stdout)
@@ -6,8 +6,24 @@ This test suite contains two tests:
 2. mg2QuickTest - Quick validation run with basic checks
 """
 
+import itertools
+import json
+import os
+import re
+import sys
+
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.backends import getlauncher
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from reframe_ncar import autotune
+from reframe_ncar.impact import ChangeImpactMixin
+from reframe_ncar.nodetype import NodeTypeMixin
+from reframe_ncar.repeat import RepeatMixin
+from reframe_ncar.scaling import RankScalingMixin
+from reframe_ncar.scratch import NodeLocalStageMixin
+from reframe_ncar.timelimit import AdaptiveTimeLimitMixin
 
 # ============================================================================
 # Parameter Example
@@ -15,13 +31,54 @@ import reframe.utility.sanity as sn
 # ============================================================================
 
 class ElemTypeParam(rfm.RegressionMixin):
+    """Build the kernel in float and in double precision"""
     elem_type = parameter(['float', 'double'])
 
+    # Flags selecting the precision per compiler; the float build demotes
+    # the real(8) variables of the kernel
+    precision_fflags = variable(dict, value={
+        'float':  {'gnu': ['-freal-8-real-4'], 'intel': []},
+        'double': {'gnu': [], 'intel': []}
+    })
+
+    # Commands run in the kernel directory before a float build, for
+    # compilers without a demotion flag: ifort cannot demote explicitly
+    # sized reals, so the kind parameter of the kernel (shr_kind_r8 of
+    # CESM's shr_kind_mod) is set to single precision instead
+    float_kind_cmds = variable(dict, value={
+        'intel': [
+            r"sed -i -E 's/(shr_kind_r8 *= *)selected_real_kind *\( *12 *\)"
+            r"/\1selected_real_kind(6)/I' $(grep -rliE --include='*.[fF]90' "
+            r"'shr_kind_r8 *=' .)",
+            r"grep -rqiE --include='*.[fF]90' "
+            r"'shr_kind_r8 *= *selected_real_kind\(6\)' ."
+        ]
+    })
+
+    @run_after('setup')
+    def check_precision(self):
+        environ = self.current_environ.name
+        self.skip_if(environ not in self.precision_fflags[self.elem_type],
+                     f'no {self.elem_type} build declared for {environ}')
+
+    @run_before('compile', always_last=True)
+    def set_precision_flags(self):
+        environ = self.current_environ.name
+        self.build_system.fflags = (
+            self.build_system.fflags +
+            self.precision_fflags[self.elem_type][environ]
+        )
+        if self.elem_type == 'float':
+            self.prebuild_cmds = (self.prebuild_cmds +
+                                  self.float_kind_cmds.get(environ, []))
+
 # ============================================================================
 # BASE TEST CLASS
 # ============================================================================
 
-class Mg2BaseTest(rfm.RegressionTest):
+class Mg2BaseTest(rfm.RegressionTest, NodeLocalStageMixin,
+                  AdaptiveTimeLimitMixin, ChangeImpactMixin,
+                  NodeTypeMixin):
     """Base class for mg2 tests with common configuration"""
     
     # Valid systems and environments
@@ -33,14 +90,23 @@ class Mg2BaseTest(rfm.RegressionTest):
     
     # Build configuration
     build_system = 'Make'
+
+    # Files kept when building and running in node-local scratch
+    # (enable with -S use_node_local=1)
+    build_artifacts = ['mg2/v14']
+    run_inputs = ['mg2/v14']
     
     num_tasks = 16
     num_tasks_per_node = 16
     time_limit = '10m'
 
+    # Columns per chunk, the cache blocking of the kernel; independent of
+    # the task count (-S pcols=64)
+    pcols = variable(int, value=16)
+
     fflags = variable(dict, value={
-        'intel': ['-O1 -ffp-contract=fast -ffree-form -ffree-line-length-none', '-D_MPI'],
-        'gnu':   ['-g -O3 -fp-model fast -ftz', '-D_MPI']
+        'intel': ['-g -O3 -fp-model fast -ftz', '-D_MPI'],
+        'gnu':   ['-O1 -ffp-contract=fast -ffree-form -ffree-line-length-none', '-D_MPI']
     })
 
     @run_after('init')
@@ -52,22 +118,18 @@ class Mg2BaseTest(rfm.RegressionTest):
             'cd mg2/v14',
             'make clean'
         ]
-        
-        # Adding required values to make command
-        self.build_system.options = [f'pcols={self.num_tasks}', f'COMPILER={self.current_environ.name}']
 
         # Load and link the mkl module
         self.modules = ['mkl']
 
     @run_before('compile')
     def set_compiler_flags(self):
-        self.build_system.ldflags = ['${MKLROOT}/lib/intel64 -lmkl_rt']
-        self.build_system.fflags = self.fflags.get(environ, [])
+        # Adding required values to make command; the environment is only
+        # known after the setup
+        self.build_system.options = [f'pcols={self.pcols}', f'COMPILER={self.current_environ.name}']
 
-        if self.current_environ.name == 'gnu':
-            self.build_system.fflags = ['-O1 -ffp-contract=fast -ffree-form -ffree-line-length-none', '-D_MPI']
-        if self.current_environ.name == 'intel':      
-            self.build_system.fflags = ['-g -O3 -fp-model fast -ftz', '-D_MPI']
+        self.build_system.ldflags = ['${MKLROOT}/lib/intel64 -lmkl_rt']
+        self.build_system.fflags = self.fflags.get(self.current_environ.name, [])
 
     @run_before('run')
     def setup_run_environment(self):
@@ -118,7 +180,7 @@ class Mg2CompileTest(rfm.CompileOnlyRegressionTest):
 # ============================================================================
 
 @rfm.simple_test
-class Mg2ProdTest(Mg2BaseTest):
+class Mg2ProdTest(Mg2BaseTest, ElemTypeParam, RepeatMixin):
     """Quick validation run with minimal configuration"""
     
     descr = 'mg2 validation test on production modules'
@@ -133,10 +195,38 @@ class Mg2ProdTest(Mg2BaseTest):
     # num_tasks = 16
     # num_tasks_per_node = 16
     # time_limit = '10m'
+
+    # Output values of the kernel, as name = value lines; the float run is
+    # checked against them by Mg2PrecisionTest
+    output_values_pattern = variable(
+        str, value=r'(?m)^\s*(\w+)\s*[:=]\s*([-+]?\d+\.?\d*(?:[eEdD][-+]?\d+)?)\s*$'
+    )
     
     @sanity_function
     def validate_output(self):
         """Check that simulation completed successfully"""
+        # Float builds are not expected to pass the verification against
+        # the double precision reference; their error against the double
+        # run is bounded by Mg2PrecisionTest instead
+        if self.elem_type == 'float':
+            return sn.all([
+                sn.assert_found(
+                    r'Average columns per sec',
+                    self.stdout,
+                    msg='mg2 did not terminate normally'
+                ),
+                sn.assert_found(
+                    self.output_values_pattern,
+                    self.stdout,
+                    msg='mg2 printed no output values'
+                ),
+                sn.assert_not_found(
+                    r'(?i)\b(?:nan|infinity)\b',
+                    self.stdout,
+                    msg='mg2 computed non-finite values'
+                )
+            ])
+
         return sn.assert_found(
             r'CESM2_MG2: PASSED verification',
             self.stdout,
@@ -144,30 +234,37 @@ class Mg2ProdTest(Mg2BaseTest):
         )
     
     @performance_function('columns/s')
-    def columns_per_second(self):
+    def columns_per_second(self, output=None):
         return sn.extractsingle(
             r'Average columns per sec :\s+(\S+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
 
+    @performance_function('')
+    def verified(self, output=None):
+        return sn.count(
+            sn.findall(r'CESM2_MG2: PASSED verification',
+                       output or self.stdout)
+        )
+
 @rfm.simple_test
-class Mg2ProdScalingTest(Mg2BaseTest):
-    """Quick validation run with minimal configuration"""
+class Mg2ProdScalingTest(Mg2BaseTest, RankScalingMixin, RepeatMixin):
+    """Scaling of the validation run over ranks and nodes"""
     
-    descr = 'mg2 validation test on production modules'
-    tags = {'production', 'validation', 'quick'}
+    descr = 'mg2 scaling test on production modules'
+    tags = {'production', 'scaling'}
 
-    valid_systems = ['casper:compute']
+    valid_systems = ['casper:compute', 'derecho:compute']
     valid_prog_environs = ['intel', 'gnu']
     
     sourcesdir = '.'
     executable = 'kernel.exe'
     
-    # num_tasks = 16
-    # num_tasks_per_node = 16
-    # time_limit = '10m'
+    # Rank counts up to 8 Derecho nodes; cases beyond the node limit of a
+    # partition are skipped
+    num_ranks = parameter([16, 32, 64, 128, 256, 512, 1024])
     
     @sanity_function
     def validate_output(self):
@@ -179,16 +276,347 @@ class Mg2ProdScalingTest(Mg2BaseTest):
         )
     
     @performance_function('columns/s')
-    def columns_per_second(self):
+    def columns_per_second(self, output=None):
         return sn.extractsingle(
             r'Average columns per sec :\s+(\S+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
 
+# ============================================================================
+# CHUNK SIZE (PCOLS) SWEEP
+# ============================================================================
+
+class Mg2PcolsBuild(Mg2BaseTest):
+    """Build of the kernel for one chunk size, shared by its runs"""
+
+    chunk_columns = parameter([8, 16, 32, 64, 128, 256, 512])
+
+    sourcesdir = '.'
+
+    # Nothing to run; the kernel is run by Mg2PcolsTest
+    local = True
+    executable = 'true'
+
+    @run_after('init')
+    def set_pcols(self):
+        self.pcols = self.chunk_columns
+
+    @sanity_function
+    def validate_build(self):
+        return sn.assert_true(
+            sn.os.path.exists('mg2/v14/kernel.exe'),
+            msg='kernel.exe not found after compilation'
+        )
+
+@rfm.simple_test
+class Mg2PcolsTest(rfm.RunOnlyRegressionTest, AdaptiveTimeLimitMixin,
+                   ChangeImpactMixin, NodeTypeMixin):
+    """Columns per second of the kernel per chunk size"""
+
+    descr = 'mg2 chunk size (pcols) sweep'
+    tags = {'performance', 'pcols'}
+
+    valid_systems = ['casper:compute']
+    valid_prog_environs = ['intel', 'gnu']
+
+    # One build per chunk size and environment
+    build = fixture(Mg2PcolsBuild, scope='environment')
+
+    executable = './kernel.exe'
+
+    num_tasks = 16
+    num_tasks_per_node = 16
+    time_limit = '10m'
+
+    @run_before('run')
+    def copy_build(self):
+        """Run in a copy of the built kernel directory"""
+        self.modules = ['mkl']
+        self.prerun_cmds = [f'cp -r {self.build.stagedir}/mg2/v14/. .']
+
+    @sanity_function
+    def validate_output(self):
+        return sn.assert_found(r'CESM2_MG2: PASSED verification',
+                               self.stdout)
+
+    @performance_function('columns/s')
+    def columns_per_second(self):
+        return sn.extractsingle(
+            r'Average columns per sec :\s+(\S+)', self.stdout, 1, float
+        )
+
+@rfm.simple_test
+class Mg2PcolsSummaryTest(rfm.RunOnlyRegressionTest):
+    """Best chunk size of the sweep per compiler"""
+
+    descr = 'mg2 chunk size (pcols) optimum'
+    tags = {'performance', 'pcols'}
+
+    valid_systems = ['casper:compute']
+    valid_prog_environs = ['intel', 'gnu']
+
+    # Only compares the results of Mg2PcolsTest
+    local = True
+    executable = 'true'
+
+    @run_after('init')
+    def set_dependencies(self):
+        """Depend on every chunk size of the sweep"""
+        for num in Mg2PcolsTest.get_variant_nums():
+            self.depends_on(Mg2PcolsTest.variant_name(num))
+
+    def sweep(self):
+        """Columns per second by chunk size"""
+        results = {}
+        for num in Mg2PcolsTest.get_variant_nums():
+            dep = self.getdep(Mg2PcolsTest.variant_name(num))
+            for key, (value, *_) in dep.perfvalues.items():
+                if key.endswith(':columns_per_second'):
+                    results[dep.build.pcols] = value
+
+        return results
+
+    @sanity_function
+    def validate_output(self):
+        return sn.assert_true(self.sweep(), msg='no chunk size was measured')
+
+    @performance_function('columns')
+    def best_pcols(self):
+        results = self.sweep()
+        return max(results, key=results.get)
+
+    @performance_function('columns/s')
+    def best_columns_per_second(self):
+        return max(self.sweep().values())
+
+# ============================================================================
+# PRECISION COMPARISON TEST
+# ============================================================================
+
+@rfm.simple_test
+class Mg2PrecisionTest(rfm.RunOnlyRegressionTest):
+    """Speed and accuracy of the float over the double build"""
+
+    descr = 'mg2 float vs double precision comparison'
+    tags = {'production', 'performance'}
+
+    valid_systems = ['casper:compute']
+    valid_prog_environs = ['intel', 'gnu']
+
+    # Only compares the results of Mg2ProdTest
+    local = True
+    executable = 'true'
+
+    # Largest relative error of the float outputs against the double ones
+    float_tolerance = variable(float, value=1e-3)
+
+    @run_after('init')
+    def set_dependencies(self):
+        """Depend on both precisions of the validation run"""
+        for num in Mg2ProdTest.get_variant_nums():
+            self.depends_on(Mg2ProdTest.variant_name(num))
+
+    def precision_value(self, elem_type, name):
+        """Performance value name of the elem_type validation run"""
+        num, = Mg2ProdTest.get_variant_nums(elem_type=elem_type)
+        dep = self.getdep(Mg2ProdTest.variant_name(num))
+        for key, (value, *_) in dep.perfvalues.items():
+            if key.endswith(f':{name}'):
+                return value
+
+    def output_values(self, elem_type):
+        """Output values of the elem_type validation run by name"""
+        num, = Mg2ProdTest.get_variant_nums(elem_type=elem_type)
+        dep = self.getdep(Mg2ProdTest.variant_name(num))
+        try:
+            with open(os.path.join(dep.stagedir, dep.job.stdout)) as fp:
+                found = re.findall(dep.output_values_pattern, fp.read())
+        except OSError:
+            return {}
+
+        return {name: float(re.sub('[dD]', 'e', value))
+                for name, value in found}
+
+    def float_error(self):
+        """Largest relative error of the float outputs against the double
+        ones, or None if they have no output in common"""
+        floats = self.output_values('float')
+        errors = [abs(floats[name] - value) / (abs(value) or 1)
+                  for name, value in self.output_values('double').items()
+                  if name in floats]
+        return max(errors, default=None)
+
+    @sanity_function
+    def validate_output(self):
+        error = self.float_error()
+        return sn.all([
+            sn.assert_ne(error, None,
+                         msg='no output values of the float and double '
+                             'runs to compare'),
+            sn.assert_le(error or 0, self.float_tolerance,
+                         msg='float error {0} above the tolerance {1}')
+        ])
+
+    @performance_function('columns/s')
+    def float_columns_per_second(self):
+        return self.precision_value('float', 'columns_per_second')
+
+    @performance_function('columns/s')
+    def double_columns_per_second(self):
+        return self.precision_value('double', 'columns_per_second')
+
+    @performance_function('')
+    def float_verification_error(self):
+        return self.float_error()
+
+    @performance_function('')
+    def float_speedup(self):
+        return (self.float_columns_per_second() /
+                self.double_columns_per_second())
+
+# ============================================================================
+# COMPILER FLAG AUTOTUNING TEST
+# ============================================================================
+
+@rfm.simple_test
+class Mg2AutotuneTest(Mg2BaseTest):
+    """Search the compiler flags giving the most columns per second"""
+
+    descr = 'mg2 compiler flag autotuning'
+    tags = {'autotune', 'performance'}
+
+    valid_systems = ['casper:compute']
+    valid_prog_environs = ['intel', 'gnu']
+
+    sourcesdir = '.'
+    executable = 'python3'
+    time_limit = '1h'
+
+    # Flag space per compiler: every combination of one choice per entry is
+    # built; the fflags of the compiler are tuned as the 'baseline'
+    flag_space = variable(dict, value={
+        'intel': {
+            'opt': ['-O2', '-O3'],
+            'fma': ['-no-fma', '-fma'],
+            'isa': ['-xCORE-AVX2', '-xCORE-AVX512', '-xHost'],
+            'ftz': ['-no-ftz', '-ftz'],
+            'inline': ['-inline-level=1', '-inline-level=2']
+        },
+        # gfortran has no -ftz; -Ofast flushes denormals to zero
+        'gnu': {
+            'opt': ['-O2', '-O3', '-Ofast'],
+            'fma': ['-ffp-contract=off', '-ffp-contract=fast'],
+            'isa': ['-march=x86-64-v3', '-march=native'],
+            'inline': ['', '-finline-functions']
+        }
+    })
+
+    # Flags every configuration needs
+    required_fflags = variable(dict, value={
+        'intel': ['-fp-model fast', '-D_MPI'],
+        'gnu':   ['-ffree-form -ffree-line-length-none', '-D_MPI']
+    })
+
+    # Successive halving: every round keeps the best 1/eta of the
+    # configurations and runs them eta times as often, up to max_runs
+    autotune_eta = variable(int, value=3)
+    autotune_max_runs = variable(int, value=9)
+
+    # The best flags found
+    best_fflags = variable(str, value='')
+
+    # Build and run products of every configuration
+    run_artifacts = ['mg2/autotune/results.json',
+                     'mg2/autotune/*/autotune_*.out']
+
+    def autotune_configs(self):
+        """The flags of every configuration by name"""
+        environ = self.current_environ.name
+        space = self.flag_space.get(environ, {})
+        required = self.required_fflags.get(environ, [])
+        configs = {'baseline': ' '.join(self.fflags.get(environ, []))}
+        for i, choice in enumerate(itertools.product(*space.values())):
+            configs[f'c{i:03d}'] = ' '.join(
+                flag for flag in (*choice, *required) if flag
+            )
+
+        return configs
+
+    @run_before('run')
+    def write_autotune_spec(self):
+        """Run the autotuning driver in place of the kernel"""
+        # The driver launches every run of the kernel itself; the task
+        # layout of the job is only set on submission, so set it for the
+        # launch command here
+        self.job.num_tasks = self.num_tasks
+        self.job.num_tasks_per_node = self.num_tasks_per_node
+        self.job.num_cpus_per_task = self.num_cpus_per_task
+        launch = self.job.launcher.run_command(self.job)
+        self.job.launcher = getlauncher('local')()
+
+        # The variants are built like the Make build system builds the
+        # baseline
+        environ = self.current_environ
+        options = ' '.join(self.build_system.options)
+        spec = {
+            'configs': self.autotune_configs(),
+            'source': '.',
+            'workdir': '../autotune',
+            'build': (f'make clean && make FC="{environ.ftn}" '
+                      f'FCFLAGS="{{flags}}" '
+                      f'LDFLAGS="{" ".join(self.build_system.ldflags)}" '
+                      f'{options}'),
+            'run': f'{launch} ./kernel.exe',
+            'verify': r'CESM2_MG2: PASSED verification',
+            'metric': r'Average columns per sec :\s+(\S+)',
+            'eta': self.autotune_eta,
+            'min_runs': 1,
+            'max_runs': self.autotune_max_runs,
+            'jobs': self.num_tasks
+        }
+        spec_file = os.path.join(self.stagedir, 'autotune.json')
+        with open(spec_file, 'w') as fp:
+            json.dump(spec, fp, indent=2)
+
+        self.executable_opts = [autotune.__file__, spec_file]
+
+    @sanity_function
+    def validate_output(self):
+        """Check that a configuration passed verification"""
+        return sn.assert_found(
+            r'^best configuration:',
+            self.stdout,
+            msg='no mg2 configuration passed verification'
+        )
+
+    @run_before('performance')
+    def record_best_fflags(self):
+        if self.is_dry_run():
+            # No job ran, so there is no result
+            return
+
+        stdout = os.path.join(self.stagedir, self.job.stdout)
+        self.best_fflags = sn.evaluate(
+            sn.extractsingle(r'^best: \S+: (.*)$', stdout, 1)
+        )
+
+    @performance_function('columns/s')
+    def best_columns_per_second(self):
+        return sn.extractsingle(r'^best: (\S+):', self.stdout, 1, float)
+
+    @performance_function('columns/s')
+    def baseline_columns_per_second(self):
+        return sn.extractsingle(r'^baseline: (\S+):', self.stdout, 1, float)
+
+    @performance_function('')
+    def speedup(self):
+        return (self.best_columns_per_second() /
+                self.baseline_columns_per_second())
+
 @rfm.simple_test
-class Mg2SWStackTest(Mg2BaseTest):
+class Mg2SWStackTest(Mg2BaseTest, RepeatMixin):
     """Quick validation run with minimal configuration"""
     
     descr = 'mg2 validation test'
@@ -217,16 +645,6 @@ class Mg2SWStackTest(Mg2BaseTest):
             "pwd"
         ])
     
-    @run_before('run')
-    def configure_job(self):
-        """Configure job submission and environment"""
-        
-        # Configure PBS to wait
-        self.job.options = ['-Wblock=true']
-        
-        # Set poll interval
-        self.job.poll_interval = 30
-
     @sanity_function
     def validate_output(self):
         """Check that simulation completed successfully"""
@@ -237,11 +655,11 @@ class Mg2SWStackTest(Mg2BaseTest):
         )
     
     @performance_function('MB/s')
-    def copy_time(self):
+    def copy_time(self, output=None):
         """Extract copy test time in seconds"""
         return sn.extractsingle(
             r'Copy:\s+(\S+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
         )
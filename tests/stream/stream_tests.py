@@ -1,23 +1,36 @@
 """
 Simple STREAM Test Suite - Compilation and Quick Validation Only
 
-This test suite contains two tests:
+This test suite contains three tests:
 1. STREAMCompileTest - Verify STREAM compiles successfully
 2. STREAMQuickTest - Quick validation run with basic checks
+3. STREAMScalingTest - Bandwidth over the OpenMP threads of a node
 """
 
+import os
+import sys
+
 import reframe as rfm
 import reframe.utility.sanity as sn
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from reframe_ncar.impact import ChangeImpactMixin
+from reframe_ncar.nodetype import NodeTypeMixin
+from reframe_ncar.repeat import RepeatMixin
+from reframe_ncar.scratch import NodeLocalStageMixin
+from reframe_ncar.timelimit import AdaptiveTimeLimitMixin
+
 # ============================================================================
 # BASE TEST CLASS
 # ============================================================================
 
-class STREAMBaseTest(rfm.RegressionTest):
+class STREAMBaseTest(rfm.RegressionTest, NodeLocalStageMixin,
+                     AdaptiveTimeLimitMixin, ChangeImpactMixin,
+                     NodeTypeMixin):
     """Base class for STREAM tests with common configuration"""
     
     # Valid systems and environments
-    valid_systems = ['casper:compute']
+    valid_systems = ['casper:compute', 'derecho:compute']
     valid_prog_environs = ['gnu-serial']
     
     # STREAM source directory
@@ -25,6 +38,11 @@ class STREAMBaseTest(rfm.RegressionTest):
     
     # Build configuration
     build_system = 'Make'
+
+    # Files kept when building and running in node-local scratch
+    # (enable with -S use_node_local=1)
+    build_artifacts = ['STREAM/stream_c.exe']
+    run_inputs = ['STREAM/stream_c.exe']
     
     num_tasks = 4
     num_tasks_per_node = 4
@@ -46,7 +64,7 @@ class STREAMBaseTest(rfm.RegressionTest):
         #FC = gfortran
         #FFLAGS = -O2 -fopenmp
         # Environment specific Makefileet netCDF paths based on environment
-        if self.current_environ.name == 'gnu':
+        if self.current_environ.name.startswith('gnu'):
             #'cp -f Makefile.gnu Makefile'
             self.build_system.cflags = ['-O2','-fopenmp']
             self.build_system.fflags = ['-O2','-fopenmp']
@@ -93,13 +111,13 @@ class STREAMCompileTest(STREAMBaseTest):
 # ============================================================================
 
 @rfm.simple_test
-class STREAMQuickTest(rfm.RunOnlyRegressionTest):
+class STREAMQuickTest(rfm.RunOnlyRegressionTest, RepeatMixin):
     """Quick validation run with minimal configuration"""
     
     descr = 'STREAM validation test'
     tags = {'production', 'validation', 'quick', 'memory'}
 
-    valid_systems = ['casper:compute']
+    valid_systems = ['casper:compute', 'derecho:compute']
     valid_prog_environs = ['gnu-serial']
     
     sourcesdir = '.'
@@ -126,16 +144,6 @@ class STREAMQuickTest(rfm.RunOnlyRegressionTest):
             "pwd"
         ])
     
-    @run_before('run')
-    def configure_job(self):
-        """Configure job submission and environment"""
-        
-        # Configure PBS to wait
-        self.job.options = ['-Wblock=true']
-        
-        # Set poll interval
-        self.job.poll_interval = 30
-
     @sanity_function
     def validate_output(self):
         """Check that simulation completed successfully"""
@@ -146,11 +154,70 @@ class STREAMQuickTest(rfm.RunOnlyRegressionTest):
         )
     
     @performance_function('MB/s')
-    def copy_time(self):
+    def copy_time(self, output=None):
         """Extract copy test time in seconds"""
         return sn.extractsingle(
             r'Copy:\s+(\S+)',
-            self.stdout,
+            output or self.stdout,
             1,
             float
-        )
\ No newline at end of file
+        )
+
+# ============================================================================
+# THREAD SCALING TEST
+# ============================================================================
+
+@rfm.simple_test
+class STREAMScalingTest(rfm.RunOnlyRegressionTest, RepeatMixin):
+    """Memory bandwidth over the number of OpenMP threads of a node"""
+    
+    descr = 'STREAM thread scaling test'
+    tags = {'performance', 'scaling', 'memory'}
+
+    valid_systems = ['casper:compute', 'derecho:compute']
+    valid_prog_environs = ['gnu-serial']
+    
+    sourcesdir = '.'
+    executable = './stream_c.exe'
+    
+    # Threads up to a full Derecho node; cases beyond the cores of a node
+    # are skipped
+    num_threads = parameter([1, 2, 4, 8, 16, 32, 64, 128])
+    
+    num_tasks = 1
+    time_limit = '10m'
+    
+    @run_after('init')
+    def set_dependencies(self):
+        """Depend on compilation test"""
+        self.depends_on('STREAMCompileTest')
+
+    @run_after('setup')
+    def set_threads(self):
+        """Bind one thread per core"""
+        num_cores = self.current_partition.processor.num_cores
+        self.skip_if(num_cores and self.num_threads > num_cores,
+                     f'{self.num_threads} threads exceed the {num_cores} '
+                     f'cores of {self.current_partition.fullname}')
+        self.num_cpus_per_task = self.num_threads
+        self.env_vars = {
+            'OMP_NUM_THREADS': str(self.num_threads),
+            'OMP_PROC_BIND': 'spread',
+            'OMP_PLACES': 'cores'
+        }
+
+    @require_deps
+    def setup_from_compile(self, STREAMCompileTest):
+        """Copy executable from compile test"""
+        compile_dir = STREAMCompileTest().stagedir
+        self.prerun_cmds = [f'cp {compile_dir}/STREAM/stream_c.exe .']
+    
+    @sanity_function
+    def validate_output(self):
+        return sn.assert_found(r'Solution Validates:', self.stdout)
+    
+    @performance_function('MB/s')
+    def triad_bandwidth(self, output=None):
+        """Best rate of the triad kernel"""
+        return sn.extractsingle(r'Triad:\s+(\S+)', output or self.stdout, 1,
+                                float)
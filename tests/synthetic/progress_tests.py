@@ -0,0 +1,123 @@
+"""
+Synthetic Progress Tests
+
+Tests that print progress lines like a model, for trying out the watchdog of
+reframe_ncar.monitor with the local scheduler of the generic system:
+
+    reframe -c tests/synthetic/progress_tests.py -r
+
+ProgressTest %regressed=False runs to completion within the limit of the
+watchdog, while ProgressTest %regressed=True slows down and has to be
+aborted with a projected regression. ShortWindowTest steps at a steady
+rate, so the runtime extrapolated from its window has to match the actual
+runtime of its calibration run and the step time of its stopped run.
+"""
+
+import os
+import shlex
+import sys
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+from reframe.core.exceptions import PerformanceError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from reframe_ncar import watchdog
+from reframe_ncar.monitor import RunMonitorMixin
+
+
+@rfm.simple_test
+class ProgressTest(rfm.RunOnlyRegressionTest, RunMonitorMixin):
+    """Print a progress line every step"""
+
+    descr = 'Synthetic test that prints its progress'
+    valid_systems = ['generic', 'mockpbs']
+    valid_prog_environs = ['builtin']
+    tags = {'synthetic'}
+
+    # Whether the steps take ten times longer than the limit allows
+    regressed = parameter([False, True])
+
+    steps = variable(int, value=100)
+    step_time = variable(float, value=0.02)
+
+    executable = 'bash'
+    time_limit = '5m'
+
+    monitor_pattern = r'^step (\d+)'
+    monitor_limit = 10.0
+
+    # The error of the watchdog, if it aborted the run
+    regression_error = variable(str, value='')
+
+    @run_after('init')
+    def set_steps(self):
+        step_time = self.step_time * (10 if self.regressed else 1)
+        self.monitor_total = float(self.steps)
+        self.executable_opts = ['-c', shlex.quote(
+            f'for i in $(seq {self.steps}); do '
+            f'echo "step $i"; sleep {step_time}; done; echo done'
+        )]
+
+    @run_after('run')
+    def check_projected_regression(self):
+        # The aborted run is checked by the sanity instead of failing
+        try:
+            super().check_projected_regression()
+        except PerformanceError as err:
+            self.regression_error = str(err)
+
+    @sanity_function
+    def validate(self):
+        if self.regressed:
+            return sn.all([
+                sn.assert_ne(self.regression_error, '',
+                             msg='the regressed run was not aborted'),
+                sn.assert_eq(self.job.exitcode, watchdog.EXIT_ABORTED),
+                sn.assert_not_found(r'^done', self.stdout)
+            ])
+
+        return sn.all([
+            sn.assert_eq(self.regression_error, '',
+                         msg='the run was aborted'),
+            sn.assert_found(r'^done', self.stdout)
+        ])
+
+
+@rfm.simple_test
+class ShortWindowTest(rfm.RunOnlyRegressionTest, RunMonitorMixin):
+    """Print a progress line every step at a steady rate"""
+
+    descr = 'Synthetic test of the short-window runs'
+    valid_systems = ['generic', 'mockpbs']
+    valid_prog_environs = ['builtin']
+    tags = {'synthetic'}
+
+    # Run to completion after the window, checking the extrapolation
+    calibrate = parameter([False, True])
+
+    steps = variable(int, value=100)
+    step_time = variable(float, value=0.05)
+
+    executable = 'bash'
+    time_limit = '5m'
+
+    monitor_pattern = r'^step (\d+)'
+    short_window = True
+    short_window_steps = 20
+
+    @run_after('init')
+    def set_steps(self):
+        self.monitor_total = float(self.steps)
+        self.short_window_calibrate = self.calibrate
+        self.reference = {
+            '*': {'window_step_time': (self.step_time, -0.2, 0.2, 's')}
+        }
+        self.executable_opts = ['-c', shlex.quote(
+            f'for i in $(seq {self.steps}); do '
+            f'echo "step $i"; sleep {self.step_time}; done; echo done'
+        )]
+
+    @sanity_function
+    def validate(self):
+        return self.short_window_sanity(sn.assert_found(r'^done', self.stdout))
@@ -0,0 +1,53 @@
+"""
+Synthetic Sleep Tests
+
+Tests that only sleep, for trying out session-level features such as the
+runtime-aware ordering of reframe_ncar.runner and the adaptive time limits
+with the local scheduler of the generic system:
+
+    reframe -c tests/synthetic -r
+    python -m reframe_ncar.runner -- -c tests/synthetic -r
+"""
+
+import os
+import sys
+
+import reframe as rfm
+import reframe.utility.sanity as sn
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from reframe_ncar.resultcache import ResultCacheMixin
+from reframe_ncar.timelimit import AdaptiveTimeLimitMixin
+
+
+@rfm.simple_test
+class SleepTest(rfm.RunOnlyRegressionTest, AdaptiveTimeLimitMixin,
+                ResultCacheMixin):
+    """Sleep for a fixed duration"""
+
+    descr = 'Synthetic test that sleeps'
+    valid_systems = ['generic', 'mockpbs']
+    valid_prog_environs = ['builtin']
+    tags = {'synthetic'}
+
+    # Listed shortest first, so that discovery order is the worst order
+    duration = parameter([1, 2, 5, 10, 20])
+
+    executable = 'sleep'
+    time_limit = '10m'
+
+    # Adapt the time limits after a single run
+    time_limit_min_samples = 1
+    time_limit_min = 0
+
+    @run_after('init')
+    def set_duration(self):
+        self.executable_opts = [str(self.duration)]
+
+    @run_before('run')
+    def print_done(self):
+        self.postrun_cmds = ['echo "slept $SECONDS"']
+
+    @sanity_function
+    def validate(self):
+        return sn.assert_found(r'slept', self.stdout)